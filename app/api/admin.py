@@ -0,0 +1,136 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+import os
+
+from app.api.routes import cache_warmer, chat_service, vector_store
+from app.db.interaction_store import get_interaction_store
+from app.models.admin import IndexRebuildRequest
+from app.utils.logging_config import logger
+from app.utils.profiling import get_profile_path, list_profiles
+from app.utils.security import is_valid_admin_token
+
+INDEX_DATA_DIR = os.getenv("INDEX_DATA_DIR", "data")  # Rebuilds may only read CSVs under this directory
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Reject requests that do not carry a valid X-Admin-Token header."""
+    if not is_valid_admin_token(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="A valid admin token is required"
+        )
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/profiles")
+async def get_profiles():
+    """List recently captured request profiles, newest first."""
+    logger.info("Listing request profiles")
+    return {"profiles": list_profiles()}
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str):
+    """
+    Download a captured request profile.
+
+    The file is a pstats dump and can be opened with ``python -m pstats``
+    or visualised with snakeviz.
+    """
+    path = get_profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Profile not found: {name}")
+
+    logger.info(f"Downloading request profile {name}")
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
+
+
+@router.get("/interactions/export")
+async def export_interactions(format: str = "jsonl"):
+    """
+    Stream every stored interaction.
+
+    Args:
+        format: "jsonl" for JSON lines or "csv" for the chat_history.csv layout
+    """
+    if format not in ("jsonl", "csv"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="format must be jsonl or csv")
+
+    store = get_interaction_store()
+    if store is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Interaction store is disabled")
+
+    logger.info(f"Exporting interactions as {format}")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(store.export(format), media_type=media_type)
+
+
+@router.post("/index/rebuild", status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_index(rebuild_request: IndexRebuildRequest):
+    """
+    Start building a new index version in the background.
+
+    Searches keep using the current version until the new one is ready,
+    then switch to it atomically. Poll ``GET /api/admin/index/status`` for
+    progress.
+    """
+    data_dir = os.path.realpath(INDEX_DATA_DIR)
+    csv_path = os.path.realpath(os.path.join(data_dir, rebuild_request.csv_path))
+    if os.path.commonpath([data_dir, csv_path]) != data_dir or not os.path.isfile(csv_path):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"CSV not found in {INDEX_DATA_DIR}: {rebuild_request.csv_path}")
+
+    try:
+        logger.info(f"Starting index rebuild from {csv_path} (incremental={rebuild_request.incremental})")
+        return vector_store.start_rebuild(csv_path, incremental=rebuild_request.incremental)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.get("/index/status")
+async def get_index_status():
+    """Get the serving index version and the state of the last rebuild."""
+    return vector_store.rebuild_status()
+
+
+@router.post("/index/rollback")
+async def rollback_index():
+    """Swap back to the index version that was serving before the last swap."""
+    try:
+        version = await run_in_threadpool(vector_store.rollback)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    logger.info(f"Rolled back index to version {version}")
+    return vector_store.rebuild_status()
+
+
+@router.post("/cache/warm", status_code=status.HTTP_202_ACCEPTED)
+async def warm_cache():
+    """
+    Warm this worker's caches with the most frequent past queries in the background.
+
+    Poll ``GET /api/admin/cache/warm/status`` for progress.
+    """
+    try:
+        logger.info("Starting cache warming")
+        return cache_warmer.start(delay=0)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.get("/cache/warm/status")
+async def get_cache_warm_status():
+    """Get the state of the last cache warming run and the size of the response cache."""
+    return {**cache_warmer.status(), "response_cache_entries": len(chat_service.response_cache)}
+
+
+@router.get("/llm/endpoints")
+async def get_llm_endpoints():
+    """Get the routing state (latency, outstanding calls, breaker state) of each LLM endpoint."""
+    endpoints = chat_service.llm_manager.get_endpoint_status()
+    if endpoints is None:
+        endpoints = [{"url": chat_service.llm_manager.endpoint_url, "state": "closed"}]
+    return {"endpoints": endpoints}
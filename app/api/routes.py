@@ -1,18 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+import time
 import uuid
 from pydantic import BaseModel
 import chromadb
 from sentence_transformers import SentenceTransformer
 import os
 from typing import List, Optional
-from app.db.vector_store import VectorStore
 from app.core.llm import LLMManager
 from app.core.session_manager import SessionManager
+from app.core.admission import AdmissionController, AdmissionRejected
+from app.core.health import HealthProber
+from app.db.embeddings import EMBEDDING_SERVER_SOCKET
+from app.db.interaction_store import get_interaction_store
 # from app.utils.cache_utils import cache_result
 from app.utils.logging_config import logger
+from app.utils.metrics import metrics
+from app.utils.profiling import run_profiled, save_profile, should_profile
+from app.utils.tracing import TRACE_HEADER, span, start_trace
 
-from app.models.chat import ChatRequest, ChatResponse, SimilarityScore
-from app.services.chat_service import ChatService
+from app.models.chat import BatchChatRequest, BatchChatResult, ChatRequest, ChatResponse, ContextStats, GenerationStats, PrefetchRequest, PrefetchResponse, SimilarityScore
+from app.services.cache_warmer import CACHE_WARM_CONCURRENCY, CacheWarmer
+from app.services.chat_service import BATCH_MAX_CONCURRENCY, ChatService
 
 
 
@@ -26,8 +36,31 @@ chat_service = ChatService()
 logger.info("Creating LLM instance...")
 llm_manager = LLMManager()  # Using the correct LLMManager from llm.py
 
-logger.info("Creating Vector Store instance...")
-vector_store = VectorStore()
+# Share the chat service's vector store so index swaps apply to every endpoint
+vector_store = chat_service.vector_store
+
+# Bound the number of chat requests in flight and shed load beyond the wait queue
+logger.info("Initializing admission controller...")
+admission_controller = AdmissionController()
+
+# Answer frequent past queries ahead of time, yielding the LLM to live traffic
+cache_warmer = CacheWarmer(
+    chat_service,
+    busy=lambda: not admission_controller.has_spare_capacity(),
+    concurrency=min(CACHE_WARM_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+)
+
+# Probe dependencies in the background so health endpoints answer from cache
+logger.info("Initializing health prober...")
+health_prober = HealthProber()
+health_prober.register("llm", chat_service.llm_manager.health_check)
+health_prober.register("index", vector_store.health_check)
+if EMBEDDING_SERVER_SOCKET:
+    # Embedding falls back to an in-process model, so the server does not gate readiness
+    health_prober.register("embedding_server", vector_store.embedding_model.embeddings.health_check, critical=False)
+if get_interaction_store() is not None:
+    # Sessions still work from memory without the store, so it does not gate readiness
+    health_prober.register("session_store", get_interaction_store().health_check, critical=False)
 
 # Initialize managers
 logger.info("Initializing session manager...")
@@ -38,12 +71,13 @@ session_manager = SessionManager(
 
 @router.post("/chat", response_model=ChatResponse)
 # @cache_result(ttl=600)  # Cache for 10 minutes
-async def chat(chat_request: ChatRequest):
+async def chat(chat_request: ChatRequest, request: Request):
     """
     Process a chat message and return a response.
     
     Args:
         chat_request: The chat request containing the input and optional session ID
+        request: The raw request, used to opt into profiling via headers
         
     Returns:
         ChatResponse: The response from the chatbot
@@ -51,45 +85,142 @@ async def chat(chat_request: ChatRequest):
     logger.info(f"Received chat request - Session ID: {chat_request.session_id}")
     logger.info(f"Message: {chat_request.input}")
     
-    try:
-        # Use the chat service to handle the request
-        session_id, response = chat_service.handle_query(
-            query=chat_request.input,
-            session_id=chat_request.session_id
-        )
-        
-        logger.info(f"Generated response for session {session_id}")
-        
-        # Get similarity scores from the session manager
-        session_data = chat_service.session_manager.get_history(session_id)
-        last_interaction = session_data[-1] if session_data else None
-        
-        similarity_scores = []
-        sources = []
+    # Sampled requests record a span tree; X-Trace forces one
+    with start_trace("chat", force=bool(request.headers.get(TRACE_HEADER)), session_id=chat_request.session_id) as trace:
+        try:
+            # Use the chat service to handle the request off the event loop, once admitted
+            queued_at = time.perf_counter()
+            profile = None
+            async with admission_controller.admit():
+                trace.set(admission_wait_ms=round((time.perf_counter() - queued_at) * 1000, 3))
+                if should_profile(request.headers):
+                    # The profiler is enabled on the worker thread, which hands it on to the search threads
+                    (session_id, response), profile = await run_in_threadpool(
+                        run_profiled,
+                        chat_service.handle_query,
+                        query=chat_request.input,
+                        session_id=chat_request.session_id
+                    )
+                else:
+                    session_id, response = await run_in_threadpool(
+                        chat_service.handle_query,
+                        query=chat_request.input,
+                        session_id=chat_request.session_id
+                    )
+            
+            if profile is not None:
+                # Writing and pruning profiles is file I/O, kept off the event loop and out of the admission slot
+                await run_in_threadpool(save_profile, profile, session_id)
+            
+            logger.info(f"Generated response for session {session_id}")
+            trace.set(session_id=session_id, response_chars=len(response))
+            
+            # Get similarity scores from the session manager
+            last_interaction = chat_service.session_manager.get_last_turn(session_id)
+            
+            similarity_scores = []
+            sources = []
+            
+            if last_interaction:
+                # Documents are materialised from their ids only here, at the API boundary
+                with span("response_build"):
+                    for score_data in chat_service.session_manager.get_similarity_scores(last_interaction):
+                        similarity_scores.append(SimilarityScore(
+                            content=score_data["content"],
+                            score=score_data["score"],
+                            relevance=score_data.get("relevance"),
+                            source="customer_support_responses",
+                            answer=score_data.get("answer", None)  # Try to get answer from metadata
+                        ))
+                        sources.append("customer_support_responses")
+            
+            context_stats = None
+            if last_interaction and "context_stats" in last_interaction:
+                context_stats = ContextStats(**last_interaction["context_stats"])
+            
+            generation_stats = None
+            if last_interaction and "generation_stats" in last_interaction:
+                generation_stats = GenerationStats(**last_interaction["generation_stats"])
+            
+            logger.info(f"Returning response with {len(similarity_scores)} similarity scores")
+            return ChatResponse(
+                session_id=session_id,
+                response=response,
+                similarity_scores=similarity_scores,
+                sources=sources,
+                context_stats=context_stats,
+                generation_stats=generation_stats,
+                fast_path=bool(last_interaction and last_interaction.get("fast_path"))
+            )
+        except AdmissionRejected as e:
+            logger.warning(f"Shedding chat request: {e.reason}")
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=e.reason,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except Exception as e:
+            logger.error(f"Error processing chat request: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error processing chat: {str(e)}"
+            )
+
+@router.post("/prefetch", response_model=PrefetchResponse, status_code=status.HTTP_202_ACCEPTED)
+async def prefetch(prefetch_request: PrefetchRequest):
+    """
+    Start retrieval for a message the user is still typing.
+    
+    The result is kept for the session and reused by /chat if the sent
+    message matches or closely extends the prefetched text. Prefetches are
+    refused while chat requests are queueing for admission.
+    
+    Args:
+        prefetch_request: The partial message and its session ID
         
-        if last_interaction and "similarity_scores" in last_interaction:
-            for score_data in last_interaction["similarity_scores"]:
-                similarity_scores.append(SimilarityScore(
-                    content=score_data["content"],
-                    score=score_data["score"],
-                    source="customer_support_responses",
-                    answer=score_data.get("answer", None)  # Try to get answer from metadata
-                ))
-                sources.append("customer_support_responses")
+    Returns:
+        PrefetchResponse: Whether the prefetch was queued
+    """
+    if not admission_controller.has_spare_capacity():
+        metrics.increment("prefetch_busy")
+        return PrefetchResponse(status="busy")
+    return PrefetchResponse(status=chat_service.prefetcher.submit(prefetch_request.session_id, prefetch_request.input))
+
+@router.post("/chat/batch")
+async def chat_batch(batch_request: BatchChatRequest):
+    """
+    Answer many chat messages in one request.
+    
+    Results are streamed back as newline-delimited JSON (one BatchChatResult
+    per line) in completion order, so clients should use the ``index`` field
+    to match them to their inputs.
+    
+    Args:
+        batch_request: The inputs, optional session IDs and batch options
         
-        logger.info(f"Returning response with {len(similarity_scores)} similarity scores")
-        return ChatResponse(
-            session_id=session_id,
-            response=response,
-            similarity_scores=similarity_scores,
-            sources=sources
-        )
-    except Exception as e:
-        logger.error(f"Error processing chat request: {str(e)}")
+    Returns:
+        StreamingResponse: NDJSON stream of BatchChatResult objects
+    """
+    logger.info(f"Received batch chat request with {len(batch_request.inputs)} inputs")
+    
+    if batch_request.session_ids is not None and len(batch_request.session_ids) != len(batch_request.inputs):
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing chat: {str(e)}"
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="session_ids must have the same length as inputs"
         )
+    
+    max_concurrency = max(1, min(batch_request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    
+    def stream_results():
+        for result in chat_service.handle_batch(
+            batch_request.inputs,
+            session_ids=batch_request.session_ids,
+            store_sessions=batch_request.store_sessions,
+            max_concurrency=max_concurrency
+        ):
+            yield BatchChatResult(**result).model_dump_json() + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
 @router.post("/generate_response", response_model=ChatResponse)
 # @cache_result(ttl=1800)  # Cache for 30 minutes
@@ -187,20 +318,15 @@ async def new_session():
             detail=f"Error creating new session: {str(e)}"
         )
 
+@router.get("/metrics")
+async def get_metrics():
+    """Get in-process service metrics (counters, gauges and latency summaries)."""
+    return metrics.snapshot()
+
 @router.get("/health")
 async def health_check():
-    """Check if the API is healthy"""
-    logger.info("API health check requested")
-    try:
-        logger.info("Checking LLM health...")
-        llm_manager.health_check()  # Using LLMManager health check
-        logger.info("LLM is healthy")
-        
-        logger.info("Checking Vector Store health...")
-        vector_store.health_check()
-        logger.info("Vector Store is healthy")
-        
-        return {"status": "healthy"}
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+    """Check if the API is healthy, using the cached results of the background prober"""
+    readiness = health_prober.ready()
+    if not readiness["ready"]:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=readiness)
+    return {"status": "healthy", **readiness} 
\ No newline at end of file
@@ -0,0 +1,167 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+import logging
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Admission control configuration from environment variables
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 16))  # Upper bound on concurrent requests
+ADMISSION_MIN_CONCURRENCY = int(os.getenv("ADMISSION_MIN_CONCURRENCY", 2))  # Lower bound when adapting
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 32))  # Requests allowed to wait for a slot
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))  # Seconds a request may wait
+ADMISSION_TARGET_LATENCY = float(os.getenv("ADMISSION_TARGET_LATENCY", 8))  # Seconds per request we aim to stay under
+ADMISSION_ADAPT_EVERY = 20  # Completed requests between limit adjustments
+ADMISSION_EWMA_ALPHA = 0.1
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of admitted."""
+
+    def __init__(self, status_code: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Bounded-concurrency gate with a bounded wait queue and adaptive limit.
+
+    Requests beyond the concurrency limit wait in a FIFO queue. When the
+    queue is full they are rejected immediately with 429, and when they
+    wait longer than the queue timeout they are rejected with 503, both
+    with a Retry-After estimate. The limit moves between the configured
+    bounds: it shrinks multiplicatively while the moving average of request
+    latency is above target and grows by one while it is comfortably below.
+
+    All methods must be called from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        min_concurrency: int = ADMISSION_MIN_CONCURRENCY,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        target_latency: float = ADMISSION_TARGET_LATENCY,
+    ):
+        """Initialize the controller with the given bounds."""
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.target_latency = target_latency
+
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.waiters = deque()
+        self.latency_ewma = None
+        self._completed_since_adapt = 0
+        self._export_gauges()
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a concurrency slot for the duration of the block, or raise AdmissionRejected."""
+        await self._acquire()
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start_time)
+
+    def has_spare_capacity(self) -> bool:
+        """Whether a request arriving now would be admitted without waiting."""
+        return self.in_flight < self.limit and not self.waiters
+
+    async def _acquire(self):
+        """Take a slot, waiting in the queue if necessary."""
+        if self.in_flight < self.limit and not self.waiters:
+            self.in_flight += 1
+            metrics.increment("admission_admitted")
+            metrics.observe("admission_wait_seconds", 0.0)
+            self._export_gauges()
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            metrics.increment("admission_shed_queue_full")
+            raise AdmissionRejected(429, self._retry_after(), "Server is busy, please retry later")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self._export_gauges()
+        wait_start = time.monotonic()
+
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics.increment("admission_shed_timeout")
+            raise AdmissionRejected(503, self._retry_after(), "Timed out waiting for capacity, please retry later")
+        except asyncio.CancelledError:
+            # The client went away; hand over the slot if it was granted meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self._release(None)
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            self._export_gauges()
+
+        metrics.increment("admission_admitted")
+        metrics.observe("admission_wait_seconds", time.monotonic() - wait_start)
+
+    def _release(self, latency):
+        """Free a slot, adapt the limit and wake queued requests."""
+        self.in_flight -= 1
+        if latency is not None:
+            self._observe_latency(latency)
+
+        while self.waiters and self.in_flight < self.limit:
+            waiter = self.waiters.popleft()
+            if waiter.done():
+                continue
+            waiter.set_result(True)
+            self.in_flight += 1
+
+        self._export_gauges()
+
+    def _observe_latency(self, latency: float):
+        """Fold a request latency into the moving average and adjust the limit."""
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += ADMISSION_EWMA_ALPHA * (latency - self.latency_ewma)
+
+        self._completed_since_adapt += 1
+        if self._completed_since_adapt < ADMISSION_ADAPT_EVERY:
+            return
+        self._completed_since_adapt = 0
+
+        previous = self.limit
+        if self.latency_ewma > self.target_latency:
+            self.limit = max(self.min_concurrency, int(self.limit * 0.8))
+        elif self.latency_ewma < self.target_latency * 0.8:
+            self.limit = min(self.max_concurrency, self.limit + 1)
+
+        if self.limit != previous:
+            logger.info(
+                f"Admission limit {previous} -> {self.limit} "
+                f"(latency ewma {self.latency_ewma:.2f}s, target {self.target_latency:.2f}s)"
+            )
+
+    def _retry_after(self) -> int:
+        """Estimate how many seconds until a slot is likely to be free."""
+        latency = self.latency_ewma or self.target_latency
+        return max(1, math.ceil((len(self.waiters) + 1) * latency / max(self.limit, 1)))
+
+    def _export_gauges(self):
+        """Publish the controller state to the metrics registry."""
+        metrics.set_gauge("admission_in_flight", self.in_flight)
+        metrics.set_gauge("admission_queue_depth", len(self.waiters))
+        metrics.set_gauge("admission_limit", self.limit)
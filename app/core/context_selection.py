@@ -0,0 +1,183 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import logging
+
+from langchain.schema import Document
+
+from app.db.doc_table import Hit, doc_table
+
+logger = logging.getLogger(__name__)
+
+# Context selection configuration from environment variables
+CONTEXT_CANDIDATE_K = int(os.getenv("CONTEXT_CANDIDATE_K", 8))  # Candidates fetched from the vector store
+CONTEXT_MAX_DOCS = int(os.getenv("CONTEXT_MAX_DOCS", 5))  # Upper bound on documents placed in the prompt
+CONTEXT_MIN_DOCS = int(os.getenv("CONTEXT_MIN_DOCS", 1))  # Always keep at least this many of the best candidates
+CONTEXT_MAX_DISTANCE = float(os.getenv("CONTEXT_MAX_DISTANCE", 1.2))  # Absolute distance cutoff
+CONTEXT_MAX_SCORE_GAP = float(os.getenv("CONTEXT_MAX_SCORE_GAP", 0.35))  # Max distance from the best candidate
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", 0.8))  # Token Jaccard for near-duplicates
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 300))  # Token budget for the context block
+
+# Tokens taken by the template scaffolding around each document
+# ('- Similar question: "..."' and 'Provided answer: "..."')
+PER_DOCUMENT_OVERHEAD_TOKENS = 12
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass
+class ContextSelection:
+    """Documents chosen for the prompt together with pruning statistics."""
+    documents: List[Hit] = field(default_factory=list)
+    candidates: int = 0
+    dropped_by_distance: int = 0
+    dropped_as_duplicate: int = 0
+    dropped_by_budget: int = 0
+    baseline_tokens: int = 0
+    context_tokens: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        """Prompt tokens saved compared to stuffing the top CONTEXT_MAX_DOCS candidates."""
+        return max(self.baseline_tokens - self.context_tokens, 0)
+
+    def get_documents(self) -> List[Document]:
+        """Materialise the selected documents, without their scores, for the prompt."""
+        return [doc_table.prompt_document(hit.doc_id) for hit in self.documents]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the selection statistics as a plain dict."""
+        return {
+            "candidates": self.candidates,
+            "selected": len(self.documents),
+            "dropped_by_distance": self.dropped_by_distance,
+            "dropped_as_duplicate": self.dropped_as_duplicate,
+            "dropped_by_budget": self.dropped_by_budget,
+            "baseline_tokens": self.baseline_tokens,
+            "context_tokens": self.context_tokens,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Estimate the number of tokens in a piece of text.
+
+    Uses the usual ~4 characters per token rule of thumb, which is close
+    enough for budgeting short tweets without running a tokenizer.
+    """
+    if not text:
+        return 0
+    return max(1, (len(text) + 3) // 4)
+
+
+def document_tokens(doc_id: int) -> int:
+    """
+    Get the tokens a document occupies in the rendered context block.
+
+    Uses the counts stored at ingestion (see app.core.token_counts), so no
+    text is tokenized per request; documents indexed without counts fall
+    back to estimates.
+    """
+    content_tokens = doc_table.content_tokens(doc_id)
+    if content_tokens is None:
+        content_tokens = estimate_tokens(doc_table.content(doc_id))
+    answer, answer_tokens = doc_table.prompt_answer(doc_id)
+    if answer_tokens is None:
+        answer_tokens = estimate_tokens(answer)
+    return content_tokens + answer_tokens + PER_DOCUMENT_OVERHEAD_TOKENS
+
+
+def _word_set(text: str) -> frozenset:
+    """Get the lower-cased word set of a text."""
+    return frozenset(_WORD_RE.findall(text.lower()))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    """Jaccard similarity of two word sets."""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def select_context(
+    docs_and_scores: List[Hit],
+    max_docs: int = CONTEXT_MAX_DOCS,
+    min_docs: int = CONTEXT_MIN_DOCS,
+    max_distance: float = CONTEXT_MAX_DISTANCE,
+    max_score_gap: float = CONTEXT_MAX_SCORE_GAP,
+    dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+) -> ContextSelection:
+    """
+    Choose which retrieved documents go into the RAG prompt.
+
+    Candidates are walked in retrieval order (which, for hybrid retrieval,
+    is the fused rank rather than raw distance). A candidate is
+    dropped when it is beyond the distance cutoff or too far behind the
+    best match, when it repeats the question or answer of a document
+    already selected, or when it would push the context over the token
+    budget. Candidates found only by BM25 have no distance and are kept
+    or dropped by rank, duplicates and budget alone. The best
+    ``min_docs`` candidates are only subject to deduplication.
+
+    Args:
+        docs_and_scores: Hits from the vector store
+        max_docs: Maximum number of documents to keep
+        min_docs: Number of best candidates kept regardless of distance and budget
+        max_distance: Absolute distance cutoff
+        max_score_gap: Maximum allowed distance from the best candidate
+        dedup_threshold: Word Jaccard similarity above which questions count as duplicates
+        token_budget: Token budget for the whole context block
+
+    Returns:
+        ContextSelection: The selected documents and pruning statistics
+    """
+    ranked = list(docs_and_scores)
+    selection = ContextSelection(candidates=len(ranked))
+    selection.baseline_tokens = sum(document_tokens(hit.doc_id) for hit in ranked[:max_docs])
+
+    if not ranked:
+        return selection
+
+    distances = [hit.distance for hit in ranked if hit.distance is not None]
+    best_distance = min(distances) if distances else None
+    seen_answers = set()
+    seen_words: List[frozenset] = []
+
+    for hit in ranked:
+        if len(selection.documents) >= max_docs:
+            break
+
+        doc_id, distance = hit.doc_id, hit.distance
+        forced = len(selection.documents) < min_docs
+
+        if not forced and distance is not None and (distance > max_distance or distance - best_distance > max_score_gap):
+            selection.dropped_by_distance += 1
+            continue
+
+        answer = (doc_table.answer(doc_id) or "").strip().lower()
+        words = _word_set(doc_table.content(doc_id))
+        if (answer and answer in seen_answers) or any(
+            _jaccard(words, other) >= dedup_threshold for other in seen_words
+        ):
+            selection.dropped_as_duplicate += 1
+            continue
+
+        tokens = document_tokens(doc_id)
+        if not forced and selection.context_tokens + tokens > token_budget:
+            selection.dropped_by_budget += 1
+            continue
+
+        selection.documents.append(hit)
+        selection.context_tokens += tokens
+        seen_words.append(words)
+        if answer:
+            seen_answers.add(answer)
+
+    logger.info(
+        f"Selected {len(selection.documents)}/{selection.candidates} context documents "
+        f"({selection.context_tokens} tokens, {selection.tokens_saved} saved)"
+    )
+    return selection
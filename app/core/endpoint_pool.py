@@ -0,0 +1,243 @@
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import logging
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+from app.utils.metrics import metrics
+from app.utils.tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+# Endpoint pool configuration from environment variables
+LLM_ROUTING_POLICY = os.getenv("LLM_ROUTING_POLICY", "ewma")  # "ewma" or "least_outstanding"
+LLM_LATENCY_ALPHA = float(os.getenv("LLM_LATENCY_ALPHA", 0.3))  # Smoothing of per-endpoint latency
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 3))  # Consecutive failures that eject an endpoint
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))  # Seconds before an ejected endpoint is probed
+LLM_POOL_RETRIES = int(os.getenv("LLM_POOL_RETRIES", 1))  # Other endpoints tried after a failure
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+@dataclass(eq=False)
+class Endpoint:
+    """One LLM endpoint in the pool and its routing state."""
+    url: str
+    llm: Any
+    weight: float = 1.0
+    latency_ewma: Optional[float] = None
+    outstanding: int = 0
+    state: str = CLOSED
+    consecutive_failures: int = 0
+    open_until: float = 0.0
+    probing: bool = False
+    requests: int = 0
+    failures: int = 0
+
+    def status(self) -> Dict[str, Any]:
+        """Get the routing state of the endpoint."""
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "state": self.state,
+            "latency_ewma_seconds": self.latency_ewma,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class EndpointPool:
+    """
+    Routes LLM calls across several endpoints.
+
+    With the "ewma" policy each call goes to the endpoint with the lowest
+    moving-average latency scaled by its outstanding requests and divided by
+    its weight; with "least_outstanding" it goes to the endpoint with the
+    fewest in-flight calls per unit of weight. Endpoints that have never
+    answered score zero so they are tried early.
+
+    A circuit breaker ejects an endpoint after LLM_BREAKER_FAILURES
+    consecutive failures. After LLM_BREAKER_COOLDOWN seconds one call is let
+    through as a probe: success re-admits the endpoint, failure ejects it
+    again. If every endpoint is ejected, the one that has been ejected the
+    longest is used rather than failing the request outright.
+    """
+
+    def __init__(self, endpoints: List[Endpoint], policy: str = LLM_ROUTING_POLICY):
+        """
+        Initialize the pool.
+
+        Args:
+            endpoints: The endpoints to route across
+            policy: "ewma" or "least_outstanding"
+        """
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.policy = policy
+        self._lock = threading.Lock()
+
+    def _score(self, endpoint: Endpoint) -> float:
+        """Lower is better."""
+        if self.policy == "least_outstanding":
+            return endpoint.outstanding / endpoint.weight
+        latency = endpoint.latency_ewma or 0.0
+        return latency * (endpoint.outstanding + 1) / endpoint.weight
+
+    def acquire(self, exclude: tuple = ()) -> Endpoint:
+        """Pick an endpoint for one call and count it as outstanding."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude] or list(self.endpoints)
+
+            available = []
+            for endpoint in candidates:
+                if endpoint.state == OPEN and now >= endpoint.open_until:
+                    endpoint.state = HALF_OPEN
+                    logger.info(f"Probing LLM endpoint {endpoint.url}")
+                if endpoint.state == CLOSED or (endpoint.state == HALF_OPEN and not endpoint.probing):
+                    available.append(endpoint)
+
+            if available:
+                best_score = min(self._score(e) for e in available)
+                chosen = random.choice([e for e in available if self._score(e) == best_score])
+            else:
+                chosen = min(candidates, key=lambda e: e.open_until)
+                logger.warning(f"All LLM endpoints are ejected, using {chosen.url}")
+
+            if chosen.state == HALF_OPEN:
+                chosen.probing = True
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen
+
+    def release(self, endpoint: Endpoint, elapsed: float, error: Optional[BaseException] = None):
+        """Record the outcome of a call on an endpoint."""
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.probing = False
+            if error is None:
+                if endpoint.latency_ewma is None:
+                    endpoint.latency_ewma = elapsed
+                else:
+                    endpoint.latency_ewma += LLM_LATENCY_ALPHA * (elapsed - endpoint.latency_ewma)
+                if endpoint.state != CLOSED:
+                    logger.info(f"LLM endpoint {endpoint.url} re-admitted")
+                endpoint.state = CLOSED
+                endpoint.consecutive_failures = 0
+            else:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                metrics.increment("llm_endpoint_failures")
+                if endpoint.state == HALF_OPEN or endpoint.consecutive_failures >= LLM_BREAKER_FAILURES:
+                    if endpoint.state != OPEN:
+                        metrics.increment("llm_breaker_opens")
+                    logger.warning(f"Ejecting LLM endpoint {endpoint.url} for {LLM_BREAKER_COOLDOWN}s: {str(error)}")
+                    endpoint.state = OPEN
+                    endpoint.open_until = time.monotonic() + LLM_BREAKER_COOLDOWN
+            metrics.set_gauge("llm_endpoints_available", sum(1 for e in self.endpoints if e.state == CLOSED))
+
+    def call(self, func: Callable[[Any], Any]) -> Any:
+        """
+        Run func with an endpoint's LLM, failing over to other endpoints.
+
+        Args:
+            func: Callable taking the endpoint's LLM
+
+        Returns:
+            The result of func
+        """
+        tried = []
+        while True:
+            endpoint = self.acquire(exclude=tuple(tried))
+            annotate(endpoint=endpoint.url, endpoint_attempts=len(tried) + 1)
+            start = time.perf_counter()
+            try:
+                result = func(endpoint.llm)
+            except Exception as e:
+                self.release(endpoint, time.perf_counter() - start, e)
+                tried.append(endpoint)
+                if len(tried) > LLM_POOL_RETRIES or len(tried) >= len(self.endpoints):
+                    raise
+                logger.warning(f"LLM endpoint {endpoint.url} failed, retrying on another endpoint: {str(e)}")
+                continue
+            self.release(endpoint, time.perf_counter() - start)
+            return result
+
+    def stream(self, func: Callable[[Any], Iterator[Any]]) -> Iterator[Any]:
+        """
+        Stream from an endpoint's LLM, failing over only before the first chunk.
+
+        The endpoint's latency is recorded as the time to the first chunk, so
+        streams closed early by the caller still count as successes.
+        """
+        tried = []
+        while True:
+            endpoint = self.acquire(exclude=tuple(tried))
+            annotate(endpoint=endpoint.url, endpoint_attempts=len(tried) + 1)
+            start = time.perf_counter()
+            first_chunk_seconds = None
+            try:
+                for chunk in func(endpoint.llm):
+                    if first_chunk_seconds is None:
+                        first_chunk_seconds = time.perf_counter() - start
+                    yield chunk
+            except Exception as e:
+                self.release(endpoint, time.perf_counter() - start, e)
+                tried.append(endpoint)
+                if first_chunk_seconds is not None or len(tried) > LLM_POOL_RETRIES or len(tried) >= len(self.endpoints):
+                    raise
+                logger.warning(f"LLM endpoint {endpoint.url} failed, retrying on another endpoint: {str(e)}")
+                continue
+            except GeneratorExit:
+                self.release(endpoint, first_chunk_seconds or time.perf_counter() - start)
+                raise
+            self.release(endpoint, first_chunk_seconds or time.perf_counter() - start)
+            return
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Get the routing state of every endpoint."""
+        with self._lock:
+            return [endpoint.status() for endpoint in self.endpoints]
+
+
+class PooledLLM(LLM):
+    """LangChain LLM that sends each call to an endpoint chosen by an EndpointPool."""
+
+    pool: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "endpoint_pool"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        return self.pool.call(lambda llm: llm.invoke(prompt, stop=stop, **kwargs))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        for text in self.pool.stream(lambda llm: llm.stream(prompt, stop=stop, **kwargs)):
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+
+def parse_endpoint_config(urls: str, weights: str = "") -> List[tuple]:
+    """
+    Parse comma-separated endpoint URLs and optional weights.
+
+    Returns:
+        List of (url, weight) tuples
+    """
+    url_list = [url.strip() for url in urls.split(",") if url.strip()]
+    weight_list = [float(weight) for weight in weights.split(",") if weight.strip()]
+    if weight_list and len(weight_list) != len(url_list):
+        raise ValueError("HUGGINGFACE_ENDPOINT_WEIGHTS must have one weight per endpoint URL")
+    if any(weight <= 0 for weight in weight_list):
+        raise ValueError("Endpoint weights must be positive")
+    return list(zip(url_list, weight_list or [1.0] * len(url_list)))
@@ -0,0 +1,67 @@
+import os
+import re
+from typing import List, Optional, Tuple
+import logging
+
+from app.db.doc_table import Hit, doc_table
+
+logger = logging.getLogger(__name__)
+
+# Fast path configuration from environment variables
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "false").lower() == "true"
+FAST_PATH_MAX_DISTANCE = float(os.getenv("FAST_PATH_MAX_DISTANCE", 0.15))  # Best distance needed to skip the LLM
+
+_HANDLE_RE = re.compile(r"@\w+")
+# Agent signatures such as "^JK", "-AB" or "*TS" at the end of support replies
+_SIGNATURE_RE = re.compile(r"\s*[\^\-*~]\s?[A-Z]{1,3}\s*$")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def render_stored_answer(answer: str) -> str:
+    """
+    Adapt a stored agent reply so it can be sent to a new user.
+
+    Removes @handles addressed to the original customer and agent
+    signatures, and tidies whitespace.
+
+    Args:
+        answer: The stored answer from the document metadata
+
+    Returns:
+        str: The cleaned answer
+    """
+    cleaned = _HANDLE_RE.sub("", answer)
+    cleaned = _SIGNATURE_RE.sub("", cleaned)
+    cleaned = _WHITESPACE_RE.sub(" ", cleaned).strip()
+    return re.sub(r"\s+([,.!?])", r"\1", cleaned)
+
+
+def find_fast_path_answer(
+    docs_and_scores: List[Hit],
+    max_distance: float = FAST_PATH_MAX_DISTANCE,
+) -> Optional[Tuple[int, float, str]]:
+    """
+    Look for a stored answer that can be served without calling the LLM.
+
+    Args:
+        docs_and_scores: Hits from the vector store; only those with an embedding distance qualify
+        max_distance: The best match must be closer than this distance
+
+    Returns:
+        (doc id, distance, answer) for the best match, or None if the
+        fast path does not apply
+    """
+    candidates = [hit for hit in docs_and_scores if hit.distance is not None]
+    if not candidates:
+        return None
+
+    doc_id, distance, _ = min(candidates, key=lambda hit: hit.distance)
+    if distance >= max_distance:
+        return None
+
+    answer = render_stored_answer(doc_table.answer(doc_id) or "")
+    if not answer:
+        return None
+
+    logger.info(f"Fast path hit with distance {distance:.4f}")
+    return doc_id, distance, answer
@@ -0,0 +1,154 @@
+import math
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from app.core.context_selection import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Response length configuration from environment variables
+TWEET_MAX_CHARS = int(os.getenv("TWEET_MAX_CHARS", 280))
+RESPONSE_CHARS_PER_TOKEN = float(os.getenv("RESPONSE_CHARS_PER_TOKEN", 3.0))  # Conservative; English averages ~4
+RESPONSE_PREFIX_TOKENS = 8  # Room for a "**Response:**" style prefix the model tends to emit
+LLM_STREAMING = os.getenv("LLM_STREAMING", "false").lower() == "true"  # Stream and cut off early on the client
+
+# Markers that end an answer: the Mistral end-of-sequence and turn markers, plus
+# chat-template artifacts seen in stored responses
+STOP_SEQUENCES = [
+    "</s>",
+    "[INST]",
+    "[/INST]",
+    "<|endassistantoutput|>",
+    "<|end|>",
+    "<|system|>",
+    "<|user|>",
+    "<|assistant|>",
+    "\nUser:",
+]
+
+_SENTENCE_END = (".", "!", "?")
+
+
+def response_token_budget(
+    max_chars: int = TWEET_MAX_CHARS,
+    chars_per_token: float = RESPONSE_CHARS_PER_TOKEN,
+    prefix_tokens: int = RESPONSE_PREFIX_TOKENS,
+) -> int:
+    """Get the max_new_tokens needed for one tweet-sized response."""
+    return math.ceil(max_chars / chars_per_token) + prefix_tokens
+
+
+RESPONSE_MAX_NEW_TOKENS = int(os.getenv("RESPONSE_MAX_NEW_TOKENS", response_token_budget()))
+
+
+@dataclass
+class GenerationResult:
+    """A generated response and how much of the generation it used."""
+    text: str
+    tokens_generated: int
+    tokens_used: int
+    stop_reason: str  # "stop_sequence", "complete", "max_tokens" or "eos"
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the generation statistics for the response."""
+        return {
+            "tokens_generated": self.tokens_generated,
+            "tokens_used": self.tokens_used,
+            "tokens_wasted": max(self.tokens_generated - self.tokens_used, 0),
+            "stop_reason": self.stop_reason,
+        }
+
+
+def truncate_at_stop(text: str, stop_sequences: List[str] = STOP_SEQUENCES) -> Tuple[str, Optional[str]]:
+    """
+    Cut text at the earliest stop sequence.
+
+    Returns:
+        tuple: (text before the stop sequence, the stop sequence found or None)
+    """
+    cut, found = len(text), None
+    for marker in stop_sequences:
+        index = text.find(marker)
+        if index != -1 and index < cut:
+            cut, found = index, marker
+    return text[:cut], found
+
+
+def _is_complete(text: str, max_chars: int) -> bool:
+    """A response is complete once it fills a tweet and ends on a sentence boundary."""
+    stripped = text.rstrip()
+    return len(stripped) >= max_chars and stripped.endswith(_SENTENCE_END)
+
+
+def collect_stream(
+    chunks: Iterable[str],
+    max_chars: int = TWEET_MAX_CHARS,
+    max_new_tokens: int = RESPONSE_MAX_NEW_TOKENS,
+) -> GenerationResult:
+    """
+    Consume a token stream until the answer is done.
+
+    Reading stops as soon as a stop sequence appears or the answer fills a
+    tweet on a sentence boundary; closing the stream then drops the
+    connection so the endpoint stops generating.
+
+    Args:
+        chunks: Streamed text chunks, one per generated token
+        max_chars: Length of a complete answer
+        max_new_tokens: Token limit the request was sent with
+
+    Returns:
+        GenerationResult: The answer and its token accounting
+    """
+    text = ""
+    offsets = []  # Start offset of each chunk in text
+    stop_reason = "eos"
+    iterator = iter(chunks)
+    try:
+        for chunk in iterator:
+            offsets.append(len(text))
+            text += chunk
+
+            text_before_stop, marker = truncate_at_stop(text)
+            if marker is not None:
+                text = text_before_stop
+                stop_reason = "stop_sequence"
+                break
+            if _is_complete(text, max_chars):
+                stop_reason = "complete"
+                break
+        else:
+            if len(offsets) >= max_new_tokens:
+                stop_reason = "max_tokens"
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+    tokens_used = sum(1 for offset in offsets if offset < len(text))
+    return GenerationResult(text=text.strip(), tokens_generated=len(offsets), tokens_used=tokens_used, stop_reason=stop_reason)
+
+
+def finalize_response(raw: str, max_new_tokens: int = RESPONSE_MAX_NEW_TOKENS) -> GenerationResult:
+    """
+    Trim a non-streamed response at its first stop sequence.
+
+    Token counts are estimated from the text, since the endpoint does not
+    report them.
+    """
+    text, marker = truncate_at_stop(raw)
+    tokens_generated = estimate_tokens(raw)
+    if marker is not None:
+        stop_reason = "stop_sequence"
+    elif tokens_generated >= max_new_tokens:
+        stop_reason = "max_tokens"
+    else:
+        stop_reason = "eos"
+    return GenerationResult(
+        text=text.strip(),
+        tokens_generated=tokens_generated,
+        tokens_used=estimate_tokens(text),
+        stop_reason=stop_reason
+    )
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+import logging
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Health probing configuration from environment variables
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", 15))  # Seconds between probe rounds
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", 5))  # Seconds before a probe counts as failed
+# A check whose last success is older than this many probe intervals counts as unhealthy
+HEALTH_STALE_INTERVALS = 3
+
+
+@dataclass
+class CheckStatus:
+    """The cached result of one dependency check."""
+    name: str
+    critical: bool
+    healthy: bool = False
+    last_checked: Optional[str] = None
+    last_success: Optional[str] = None
+    last_success_monotonic: Optional[float] = None
+    latency_ms: Optional[float] = None
+    consecutive_failures: int = 0
+    error: Optional[str] = None
+    detail: Any = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the status without internal bookkeeping."""
+        return {
+            "healthy": self.healthy,
+            "critical": self.critical,
+            "last_checked": self.last_checked,
+            "last_success": self.last_success,
+            "latency_ms": self.latency_ms,
+            "consecutive_failures": self.consecutive_failures,
+            "error": self.error,
+            "detail": self.detail,
+        }
+
+
+class HealthProber:
+    """
+    Checks dependencies on a background thread and caches the results.
+
+    Each registered check is a cheap callable (an HTTP GET, a count, a
+    SELECT 1) that raises on failure and may return a detail value. Checks
+    run every HEALTH_PROBE_INTERVAL seconds with a HEALTH_PROBE_TIMEOUT
+    deadline, so liveness and readiness requests only read the cache and
+    never call a dependency themselves.
+    """
+
+    def __init__(self, interval: float = HEALTH_PROBE_INTERVAL, timeout: float = HEALTH_PROBE_TIMEOUT):
+        """
+        Initialize the prober with no checks.
+
+        Args:
+            interval: Seconds between probe rounds
+            timeout: Seconds before a single check counts as failed
+        """
+        self.interval = interval
+        self.timeout = timeout
+        self._checks: Dict[str, Callable[[], Any]] = {}
+        self._status: Dict[str, CheckStatus] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.started_at = datetime.now().isoformat()
+
+    def register(self, name: str, check: Callable[[], Any], critical: bool = True):
+        """
+        Register a dependency check.
+
+        Args:
+            name: Name reported in the health status
+            check: Callable that raises if the dependency is unhealthy
+            critical: Whether readiness depends on this check
+        """
+        self._checks[name] = check
+        self._status[name] = CheckStatus(name=name, critical=critical)
+
+    def start(self):
+        """Run a first probe round now and keep probing on a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self._checks), 1), thread_name_prefix="health-check")
+        self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Probe all checks every interval."""
+        while True:
+            started = time.monotonic()
+            try:
+                self.probe_all()
+            except Exception as e:
+                logger.error(f"Health probe round failed: {str(e)}", exc_info=True)
+            time.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+    def probe_all(self):
+        """Run every check concurrently and record the results."""
+        futures = {name: (self._executor.submit(self._timed, check), time.monotonic()) for name, check in self._checks.items()}
+        for name, (future, submitted) in futures.items():
+            try:
+                latency, detail = future.result(timeout=max(self.timeout - (time.monotonic() - submitted), 0))
+                self._record(name, latency, detail=detail)
+            except TimeoutError:
+                self._record(name, None, error=f"timed out after {self.timeout}s")
+            except Exception as e:
+                self._record(name, None, error=str(e))
+
+    @staticmethod
+    def _timed(check: Callable[[], Any]):
+        start = time.perf_counter()
+        detail = check()
+        return (time.perf_counter() - start) * 1000, detail
+
+    def _record(self, name: str, latency_ms: Optional[float], detail: Any = None, error: Optional[str] = None):
+        """Update the cached status of a check."""
+        with self._lock:
+            status = self._status[name]
+            status.last_checked = datetime.now().isoformat()
+            status.latency_ms = round(latency_ms, 2) if latency_ms is not None else None
+            status.error = error
+            if error is None:
+                status.healthy = True
+                status.consecutive_failures = 0
+                status.last_success = status.last_checked
+                status.last_success_monotonic = time.monotonic()
+                status.detail = detail
+            else:
+                if status.healthy:
+                    logger.warning(f"Health check {name} failed: {error}")
+                status.healthy = False
+                status.consecutive_failures += 1
+            metrics.set_gauge(f"health_{name}", 1 if status.healthy else 0)
+
+    def _is_fresh(self, status: CheckStatus) -> bool:
+        """Whether the check has succeeded recently enough to trust."""
+        return (
+            status.last_success_monotonic is not None
+            and time.monotonic() - status.last_success_monotonic <= self.interval * HEALTH_STALE_INTERVALS
+        )
+
+    def live(self) -> Dict[str, Any]:
+        """Liveness: the process is serving requests and the prober is running."""
+        prober_running = self._thread is not None and self._thread.is_alive()
+        return {"status": "alive" if prober_running else "degraded", "prober_running": prober_running, "started_at": self.started_at}
+
+    def ready(self) -> Dict[str, Any]:
+        """
+        Readiness: every critical dependency passed its last check recently.
+
+        Returns:
+            dict: {"ready": bool, "checks": {name: status}}
+        """
+        with self._lock:
+            checks = {name: status.to_dict() for name, status in self._status.items()}
+            ready = all(
+                status.healthy and self._is_fresh(status)
+                for status in self._status.values() if status.critical
+            )
+        return {"ready": ready, "checks": checks}
@@ -10,6 +10,10 @@ from langchain_huggingface import HuggingFaceEndpoint # Added for endpoint usage
 from huggingface_hub import login
 import logging
 import os # Added for environment variables
+import requests
+from app.core.endpoint_pool import Endpoint, EndpointPool, PooledLLM, parse_endpoint_config
+from app.core.generation import RESPONSE_MAX_NEW_TOKENS, STOP_SEQUENCES
+from app.core.health import HEALTH_PROBE_TIMEOUT
 from app.core.prompts import get_rag_prompt_template
 from app.utils.logging_config import logger
 
@@ -17,14 +21,34 @@ logger = logging.getLogger(__name__)
 
 # Define endpoint URL and token constants from environment variables
 ENDPOINT_URL = os.environ.get("HUGGINGFACE_ENDPOINT_URL", "")
+# Optional pool of endpoints (replicas or alternative models), comma-separated, with matching weights
+ENDPOINT_URLS = os.environ.get("HUGGINGFACE_ENDPOINT_URLS", "")
+ENDPOINT_WEIGHTS = os.environ.get("HUGGINGFACE_ENDPOINT_WEIGHTS", "")
 HUGGINGFACE_API_TOKEN = os.environ.get("HUGGINGFACE_TOKEN") # Get token from env
 
+# Sampling parameters sent with every generation request; a response is one tweet,
+# so the token budget is derived from the tweet length and generation ends at any stop sequence
+GENERATION_KWARGS = {
+    "max_new_tokens": RESPONSE_MAX_NEW_TOKENS,
+    "stop_sequences": STOP_SEQUENCES,
+    "top_k": 10,
+    "top_p": 0.95,
+    "typical_p": 0.95,
+    "temperature": 0.01,
+    "repetition_penalty": 1.03,
+}
+
 class LLMManager:
     """LLM Manager for handling the language model, prioritizing Hugging Face Endpoints."""
     
     # Removed use_gpu flag as endpoint is the primary method now
-    def __init__(self, model_name="mistral-7b-instruct-v0-3-fsp", endpoint_url=ENDPOINT_URL): 
-        """Initialize the LLMManager, attempting to use the specified endpoint."""
+    def __init__(self, model_name="mistral-7b-instruct-v0-3-fsp", endpoint_url=ENDPOINT_URL, endpoint_urls=ENDPOINT_URLS, endpoint_weights=ENDPOINT_WEIGHTS): 
+        """
+        Initialize the LLMManager, attempting to use the specified endpoint.
+        
+        When endpoint_urls lists several endpoints, calls are routed across
+        them by an EndpointPool and endpoint_url is ignored.
+        """
         logger.info(f"Initializing LLMManager with model: {model_name}")
         logger.info(f"Using endpoint URL: {endpoint_url}")
         logger.info(f"Hugging Face API Token available: {HUGGINGFACE_API_TOKEN is not None}")
@@ -32,15 +56,30 @@ class LLMManager:
         logger.info(f"Initializing LLMManager. Model name (for reference): {model_name}")
         
         self.model_name = model_name # Keep for reference or potential future tokenizer use
-        self.endpoint_url = endpoint_url
+        self.endpoints = parse_endpoint_config(endpoint_urls, endpoint_weights) or [(endpoint_url, 1.0)]
+        self.endpoint_url = self.endpoints[0][0]
+        self.generation_kwargs = dict(GENERATION_KWARGS)
+        self.pool = None
         self.llm = self._initialize_llm()
         logger.info("LLMManager initialization complete")
         
     def _initialize_llm(self):
+        """Initialize the language model, pooling the endpoints if there are several."""
+        if len(self.endpoints) == 1:
+            return self._initialize_endpoint(self.endpoint_url)
+        
+        logger.info(f"Initializing pool of {len(self.endpoints)} Hugging Face Endpoints...")
+        self.pool = EndpointPool([
+            Endpoint(url=url, llm=self._initialize_endpoint(url), weight=weight)
+            for url, weight in self.endpoints
+        ])
+        return PooledLLM(pool=self.pool)
+        
+    def _initialize_endpoint(self, endpoint_url):
         """Initialize the language model using Hugging Face Endpoint."""
         logger.info("Initializing language model with Hugging Face Endpoint...")
         
-        if not self.endpoint_url:
+        if not endpoint_url:
             logger.error("HUGGINGFACE_ENDPOINT_URL is not set. Cannot initialize LLM.")
             raise ValueError("Hugging Face Endpoint URL is required but not provided.")
             
@@ -48,20 +87,15 @@ class LLMManager:
             logger.warning("HUGGINGFACE_TOKEN environment variable not set. Endpoint calls may fail.")
             # Depending on the endpoint's security settings, a token might be required.
             
-        logger.info(f"Attempting to initialize HuggingFaceEndpoint with URL: {self.endpoint_url}")
+        logger.info(f"Attempting to initialize HuggingFaceEndpoint with URL: {endpoint_url}")
         
         try:
             # Initialize Hugging Face Endpoint
             llm_endpoint = HuggingFaceEndpoint(
-                endpoint_url=self.endpoint_url,
+                endpoint_url=endpoint_url,
                 huggingfacehub_api_token=HUGGINGFACE_API_TOKEN,
                 task="text-generation",
-                max_new_tokens=512,
-                top_k=10,
-                top_p=0.95,
-                typical_p=0.95,
-                temperature=0.01,
-                repetition_penalty=1.03,
+                **self.generation_kwargs,
             )
             
             logger.info("HuggingFaceEndpoint initialized successfully.")
@@ -71,24 +105,46 @@ class LLMManager:
             logger.error(f"Failed to initialize HuggingFaceEndpoint: {str(e)}", exc_info=True)
             raise
 
+    def get_generation_params(self):
+        """Get the model identity and sampling parameters that determine an output."""
+        return {
+            "model_name": self.model_name,
+            "endpoint_urls": [url for url, _ in self.endpoints],
+            **self.generation_kwargs,
+        }
+
+    def get_endpoint_status(self):
+        """Get the routing state of each endpoint, or None when there is a single endpoint."""
+        return self.pool.status() if self.pool is not None else None
+
     def get_llm(self):
         """Get the LLM instance."""
         logger.info("Getting LLM instance")
         return self.llm
             
-    def health_check(self):
-        """Check if the LLM is working properly"""
-        logger.info("Performing LLM health check...")
-        try:
-            # Simple test query
-            test_query = "Hello, can you give me a short response?"
-            logger.info(f"Testing with query: {test_query}")
-            
-            # Invoke the endpoint with a simple query
-            response = self.llm.invoke(test_query)
-            logger.info("Health check successful - received response from endpoint")
+    def health_check(self, timeout=HEALTH_PROBE_TIMEOUT):
+        """
+        Check that the endpoints are up without generating any tokens.
+        
+        Sends a GET to each endpoint's /health route, which
+        text-generation-inference answers without running the model.
+        
+        Returns:
+            dict: Health (True/False) per endpoint URL
             
-            return True
-        except Exception as e:
-            logger.error(f"LLM health check failed: {str(e)}", exc_info=True)
-            raise 
+        Raises:
+            RuntimeError: If no endpoint is healthy
+        """
+        headers = {"Authorization": f"Bearer {HUGGINGFACE_API_TOKEN}"} if HUGGINGFACE_API_TOKEN else {}
+        results = {}
+        for url, _ in self.endpoints:
+            try:
+                response = requests.get(f"{url.rstrip('/')}/health", headers=headers, timeout=timeout)
+                results[url] = response.status_code == 200
+            except requests.RequestException as e:
+                logger.warning(f"LLM endpoint {url} health check failed: {str(e)}")
+                results[url] = False
+        
+        if not any(results.values()):
+            raise RuntimeError(f"No healthy LLM endpoint: {results}")
+        return results 
@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+import logging
+
+from app.db.doc_table import Hit
+from app.utils.metrics import metrics
+from app.utils.text_normalization import normalize_tweet
+
+logger = logging.getLogger(__name__)
+
+# Prefetch configuration from environment variables
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", 30))  # Seconds a prefetched retrieval stays reusable
+PREFETCH_MIN_CHARS = int(os.getenv("PREFETCH_MIN_CHARS", 10))  # Normalized characters typed before prefetching
+PREFETCH_MIN_COVERAGE = float(os.getenv("PREFETCH_MIN_COVERAGE", 0.8))  # Share of the final message the typed prefix must cover
+PREFETCH_WAIT = float(os.getenv("PREFETCH_WAIT", 0.5))  # Seconds a request waits for a matching prefetch still running
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 1))  # Threads running prefetches
+PREFETCH_MAX_PENDING = int(os.getenv("PREFETCH_MAX_PENDING", 32))  # Queued prefetches beyond which new ones are refused
+PREFETCH_MAX_SESSIONS = int(os.getenv("PREFETCH_MAX_SESSIONS", 10000))  # Sessions with a prefetch kept
+PREFETCH_NICENESS = int(os.getenv("PREFETCH_NICENESS", 10))  # Scheduling niceness added to prefetch threads (Linux)
+
+
+def _lower_thread_priority():
+    """Lower the scheduling priority of the calling thread, where the OS supports it."""
+    try:
+        # On Linux every thread is a task with its own nice value
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), os.getpriority(os.PRIO_PROCESS, 0) + PREFETCH_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+
+@dataclass
+class _Prefetch:
+    """A retrieval started for what a session has typed so far."""
+    text: str  # Normalized
+    version: str
+    created_at: float
+    seq: int
+    future: Future
+
+
+class Prefetcher:
+    """
+    Speculative retrieval for messages that are still being typed.
+
+    The UI reports the partial message of a session as the user types; its
+    retrieval runs on a small pool of low-priority threads and the result is
+    kept per session. When the message is sent and its normalized text
+    equals, or extends by a little, the prefetched text, the request reuses
+    that retrieval instead of running its own. A newer partial message
+    supersedes the older one: queued work is cancelled and running work
+    stops before searching.
+    """
+
+    def __init__(
+        self,
+        retrieve: Callable[[str], List[Hit]],
+        index_version: Callable[[], str],
+        enabled: bool = PREFETCH_ENABLED,
+        workers: int = PREFETCH_WORKERS,
+    ):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            retrieve: Retrieval for a text, returning hits
+            index_version: Name of the serving index version; results from other versions are not reused
+            enabled: Whether prefetches are accepted
+            workers: Threads running prefetches
+        """
+        self.retrieve = retrieve
+        self.index_version = index_version
+        self.enabled = enabled
+        self.workers = workers
+        self._seq = 0
+        self._reset()
+
+        # Executor threads do not survive fork (e.g. the pre-fork launcher)
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """Drop per-process state; prefetch threads are started on the next submit."""
+        # Reentrant: cancelling a queued future runs its done callback right away
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, _Prefetch]" = OrderedDict()
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="prefetch",
+            initializer=_lower_thread_priority
+        )
+
+    def submit(self, session_id: str, text: str) -> str:
+        """
+        Start retrieval for the partial message of a session.
+
+        Args:
+            session_id: The session the user is typing in
+            text: The message typed so far
+
+        Returns:
+            str: "queued", "cached" (already prefetched), "too_short", "busy" or "disabled"
+        """
+        if not self.enabled:
+            return "disabled"
+        normalized = normalize_tweet(text)
+        if len(normalized) < PREFETCH_MIN_CHARS:
+            return "too_short"
+
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry.text == normalized and not entry.future.cancelled():
+                return "cached"
+            if self._pending >= PREFETCH_MAX_PENDING:
+                metrics.increment("prefetch_busy")
+                return "busy"
+            if entry is not None and entry.future.cancel():
+                metrics.increment("prefetch_cancelled")
+
+            self._seq += 1
+            self._pending += 1
+            future = self._executor.submit(self._run, session_id, self._seq, text)
+            future.add_done_callback(self._done)
+            self._entries[session_id] = _Prefetch(normalized, self.index_version(), time.monotonic(), self._seq, future)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > PREFETCH_MAX_SESSIONS:
+                _, evicted = self._entries.popitem(last=False)
+                evicted.future.cancel()
+
+        metrics.increment("prefetch_requests")
+        return "queued"
+
+    def take(self, session_id: str, query: str) -> Optional[List[Hit]]:
+        """
+        Claim the prefetched retrieval of a session for its final message.
+
+        Waits up to PREFETCH_WAIT seconds for a matching prefetch that is
+        still running. The session's prefetch is discarded either way.
+
+        Args:
+            session_id: The session the message was sent in
+            query: The final message
+
+        Returns:
+            The hits, or None if there is nothing to reuse
+        """
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return None
+
+        usable = (
+            self.covers(entry.text, normalize_tweet(query))
+            and time.monotonic() - entry.created_at <= PREFETCH_TTL
+            and entry.version == self.index_version()
+        )
+        docs_and_scores = None
+        if usable:
+            try:
+                docs_and_scores = entry.future.result(timeout=PREFETCH_WAIT)
+            except (CancelledError, TimeoutError):
+                pass
+            except Exception as e:
+                logger.warning(f"Prefetch for session {session_id} failed: {str(e)}")
+        else:
+            entry.future.cancel()
+
+        metrics.increment("prefetch_claims")
+        metrics.increment("prefetch_hits" if docs_and_scores is not None else "prefetch_misses")
+        metrics.set_gauge("prefetch_hit_rate", metrics.ratio("prefetch_hits", "prefetch_claims"))
+        return docs_and_scores
+
+    def discard(self, session_id: str):
+        """Drop the prefetch of a session whose message was answered without retrieval."""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            entry.future.cancel()
+
+    @staticmethod
+    def covers(prefetched: str, final: str) -> bool:
+        """Whether a retrieval for the normalized prefix `prefetched` can stand in for `final`."""
+        return final.startswith(prefetched) and len(prefetched) >= PREFETCH_MIN_COVERAGE * len(final)
+
+    def _run(self, session_id: str, seq: int, text: str) -> Optional[List[Hit]]:
+        """Retrieve for a partial message unless the session has typed more since."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            # A missing entry was claimed by the final message, which is waiting for this result
+            superseded = entry is not None and entry.seq != seq
+        if superseded:
+            metrics.increment("prefetch_superseded")
+            return None
+        return self.retrieve(text)
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._pending -= 1
@@ -1,9 +1,9 @@
+import hashlib
+
 from langchain.prompts import PromptTemplate
 
 
-def get_rag_prompt_template():
-    """Get the RAG prompt template for the Twitter support agent."""
-    return PromptTemplate.from_template("""<s>[INST]
+RAG_PROMPT_TEMPLATE = """<s>[INST]
 You are a helpful, friendly Twitter customer support agent tasked with responding to user tweets using ONLY the context provided. Users may ask about various topics, such as:
 
 - Customer service and support issues
@@ -44,4 +44,12 @@ Always maintain an engaging, empathetic, and natural conversational tone suitabl
 ## Output Format:
 - **Response:** A concise, empathetic tweet response based strictly on the provided context.
 
-[/INST]""", template_format="jinja2") 
\ No newline at end of file
+[/INST]"""
+
+# Short fingerprint of the prompt, used to version cached answers
+PROMPT_VERSION = hashlib.sha256(RAG_PROMPT_TEMPLATE.encode()).hexdigest()[:12]
+
+
+def get_rag_prompt_template():
+    """Get the RAG prompt template for the Twitter support agent."""
+    return PromptTemplate.from_template(RAG_PROMPT_TEMPLATE, template_format="jinja2") 
\ No newline at end of file
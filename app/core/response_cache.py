@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+
+from app.utils.cache_keys import CACHE_TTL, get_redis_client, query_cache_key
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Response cache configuration from environment variables
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 5000))  # Answers kept in each process
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", CACHE_TTL))  # Seconds an answer stays valid
+
+
+class ResponseCache:
+    """
+    Answers to queries asked without chat history.
+
+    Entries are keyed by the normalized query text in the current cache
+    namespace (index version, prompt and model), so re-ingestion or a
+    prompt change makes old answers unreachable. The namespace version is
+    only shared through Redis, so keys also include a scope (the name of
+    the serving index version), which every worker updates when it picks up
+    an index swap. Each process keeps an LRU of RESPONSE_CACHE_SIZE
+    entries; when Redis is configured, entries are also written there and
+    read back on a local miss, so workers share them. Values are
+    JSON-serialisable dicts.
+    """
+
+    def __init__(
+        self,
+        size: int = RESPONSE_CACHE_SIZE,
+        ttl: int = RESPONSE_CACHE_TTL,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+        scope: Optional[Callable[[], str]] = None,
+    ):
+        """
+        Initialize an empty cache.
+
+        Args:
+            size: Entries kept in this process
+            ttl: Seconds an entry stays valid
+            enabled: Whether answers are cached at all
+            scope: Returns a name included in every key, e.g. the serving index version
+        """
+        self.size = size
+        self.ttl = ttl
+        self.enabled = enabled and size > 0
+        self.scope = scope
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _key(self, query: str) -> str:
+        kind = f"response:{self.scope()}" if self.scope is not None else "response"
+        return query_cache_key(kind, query)
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        """Get the cached answer to a query, or None."""
+        if not self.enabled:
+            return None
+        key = self._key(query)
+        value = self._get_local(key)
+        if value is None:
+            value = self._get_shared(key)
+            if value is not None:
+                self._put_local(key, value)
+        metrics.increment("response_cache_hits" if value is not None else "response_cache_misses")
+        return value
+
+    def contains(self, query: str) -> bool:
+        """Whether a valid answer is cached for a query (not counted as a lookup)."""
+        if not self.enabled:
+            return False
+        key = self._key(query)
+        if self._get_local(key) is not None:
+            return True
+        value = self._get_shared(key)
+        if value is None:
+            return False
+        self._put_local(key, value)
+        return True
+
+    def put(self, query: str, value: Dict[str, Any]):
+        """Cache the answer to a query."""
+        if not self.enabled:
+            return
+        key = self._key(query)
+        self._put_local(key, value)
+        client = get_redis_client()
+        if client is not None:
+            try:
+                client.setex(key, self.ttl, json.dumps(value))
+            except Exception as e:
+                logger.warning(f"Failed to share cached response: {str(e)}")
+
+    def _get_local(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _put_local(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def _get_shared(self, key: str) -> Optional[Dict[str, Any]]:
+        client = get_redis_client()
+        if client is None:
+            return None
+        try:
+            cached = client.get(key)
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.warning(f"Error retrieving cached response: {str(e)}")
+            return None
@@ -4,9 +4,11 @@ import re
 import uuid
 import json
 from datetime import datetime
-from collections import defaultdict
 from typing import List, Dict, Any, Optional
 from operator import itemgetter
+from app.core.generation import truncate_at_stop
+from app.db.doc_table import doc_table
+from app.db.interaction_store import SESSION_REHYDRATE_TURNS, get_interaction_store
 from app.utils.gcs_utils import GCSManager
 from app.utils.logging_utils import SessionLogger
 
@@ -15,7 +17,7 @@ class SessionManager:
     
     def __init__(self, csv_file="chat_history.csv", gcs_bucket: Optional[str] = None, gcs_credentials: Optional[str] = None):
         """Initialize the session manager."""
-        self.sessions = defaultdict(list)
+        self.sessions: Dict[str, List[Dict[str, Any]]] = {}
         self.csv_file = csv_file
         self._initialize_csv()
         
@@ -27,6 +29,9 @@ class SessionManager:
         # Initialize session logger
         self.logger = SessionLogger()
         
+        # Durable interaction store used to rehydrate sessions after a restart
+        self.interaction_store = get_interaction_store()
+        
     def _initialize_csv(self):
         """Initialize the CSV file if it doesn't exist."""
         if not os.path.exists(self.csv_file):
@@ -35,10 +40,44 @@ class SessionManager:
                 writer.writerow(["session_id", "user_input", "ai_response", "timestamp", "similarity_scores"])
                 
     def get_history(self, session_id):
-        """Get the chat history for the specified session."""
-        return self.sessions[session_id]
+        """
+        Get the chat history for the specified session.
+        
+        Sessions not held in memory (e.g. after a restart) are lazily loaded
+        from the interaction store, and sessions held in memory are reloaded
+        when the store has a newer turn than ours, i.e. another worker
+        answered the session since. Turns reach the store in batches, so
+        another worker's latest turn shows up once it has been flushed
+        (within INTERACTION_FLUSH_INTERVAL). A miss is not cached, so a
+        session is looked up again until it has turns.
+        
+        Each call queries the store, so call it once per request; recording
+        the answer and get_last_turn use the copy in memory.
+        """
+        history = self.sessions.get(session_id)
+        if not session_id or self.interaction_store is None:
+            return history if history is not None else []
+
+        try:
+            if history:
+                # Our own turns are never newer than the last one we hold, even before they are flushed
+                latest = self.interaction_store.last_timestamp(session_id)
+                if latest is None or latest <= history[-1]["timestamp"]:
+                    return history
+            turns = self.interaction_store.load_recent(session_id, SESSION_REHYDRATE_TURNS)
+            if turns:
+                self.sessions[session_id] = turns
+                return turns
+        except Exception as e:
+            self.logger.log_error(session_id, f"Could not load session history: {str(e)}")
+        return history if history is not None else []
     
-    def add_interaction(self, session_id: str, user_input: str, ai_response: str, similarity_scores: Optional[List[tuple]] = None):
+    def get_last_turn(self, session_id) -> Optional[Dict[str, Any]]:
+        """Get the latest turn recorded for a session in this process, without checking the store."""
+        history = self.sessions.get(session_id)
+        return history[-1] if history else None
+    
+    def add_interaction(self, session_id: str, user_input: str, ai_response: str, similarity_scores: Optional[List[tuple]] = None, context_stats: Optional[Dict[str, Any]] = None, generation_stats: Optional[Dict[str, Any]] = None, fast_path: bool = False):
         """
         Add an interaction to the session.
         
@@ -46,15 +85,20 @@ class SessionManager:
             session_id: The session ID
             user_input: The user's input
             ai_response: The AI's response
-            similarity_scores: Optional list of (document, score) tuples from similarity search
+            similarity_scores: Optional list of hits from similarity search
+            context_stats: Optional context selection statistics for the request
+            generation_stats: Optional token accounting of the LLM generation
+            fast_path: Whether the response was served from the corpus without the LLM
         """
         try:
             # Clean the response if needed
             cleaned_response = self._clean_response(ai_response)
-            self._store_interaction(session_id, user_input, cleaned_response, similarity_scores)
+            # Text of the documents, rendered once for the durable copies of the interaction
+            score_records = doc_table.score_records(similarity_scores) if similarity_scores else None
+            self._store_interaction(session_id, user_input, cleaned_response, similarity_scores, score_records, context_stats, generation_stats, fast_path)
             
             # Log the interaction
-            self.logger.log_interaction(session_id, user_input, cleaned_response, similarity_scores)
+            self.logger.log_interaction(session_id, user_input, cleaned_response, score_records)
             
             # Upload to GCS if configured
             if self.gcs_manager:
@@ -96,8 +140,11 @@ class SessionManager:
             "Answer: "
         ]
         
+        # Drop anything after an end-of-turn marker or chat-template artifact
+        cleaned, _ = truncate_at_stop(response)
+        cleaned = cleaned.strip()
+        
         # Try removing each prefix
-        cleaned = response
         for prefix in prefixes:
             if cleaned.startswith(prefix):
                 cleaned = cleaned[len(prefix):].strip()
@@ -105,27 +152,16 @@ class SessionManager:
                 
         return cleaned
     
-    def _write_to_csv(self, session_id, user_input, ai_response, timestamp, similarity_scores=None):
+    def _write_to_csv(self, session_id, user_input, ai_response, timestamp, score_records=None):
         """Write the interaction to the CSV file."""
-        # Convert similarity scores to JSON for storage
-        scores_json = ""
-        if similarity_scores:
-            # Format scores as a list of dicts with content, score, and answer
-            formatted_scores = [
-                {
-                    "content": doc.page_content, 
-                    "score": float(score),
-                    "answer": doc.metadata.get("answer", None)
-                }
-                for doc, score in similarity_scores
-            ]
-            scores_json = json.dumps(formatted_scores)
+        # Store similarity scores as JSON dicts with content, score, and answer
+        scores_json = json.dumps(score_records) if score_records else ""
             
         with open(self.csv_file, 'a', newline='') as f:
             writer = csv.writer(f)
             writer.writerow([session_id, user_input, ai_response, timestamp, scores_json])
             
-    def _store_interaction(self, session_id, user_input, ai_response, similarity_scores=None):
+    def _store_interaction(self, session_id, user_input, ai_response, similarity_scores=None, score_records=None, context_stats=None, generation_stats=None, fast_path=False):
         """Store the interaction in memory and in the CSV file."""
         timestamp = datetime.now().isoformat()
         
@@ -136,21 +172,41 @@ class SessionManager:
             "timestamp": timestamp
         }
         
-        # Add similarity scores if available
+        # Keep the hits in memory; the text stays in the doc table
         if similarity_scores:
-            session_data["similarity_scores"] = [
-                {
-                    "content": doc.page_content, 
-                    "score": float(score),
-                    "answer": doc.metadata.get("answer", None)  # Get answer from metadata
-                }
-                for doc, score in similarity_scores
-            ]
+            session_data["documents"] = list(similarity_scores)
+            
+        if context_stats:
+            session_data["context_stats"] = context_stats
+            
+        if generation_stats:
+            session_data["generation_stats"] = generation_stats
             
-        self.sessions[session_id].append(session_data)
+        if fast_path:
+            session_data["fast_path"] = True
+            
+        # The history was checked against the store when the request started, so it is not checked again
+        self.sessions.setdefault(session_id, []).append(session_data)
+        
+        # Persist to the durable store (written in batches by a background thread)
+        if self.interaction_store is not None:
+            self.interaction_store.add(session_id, user_input, ai_response, timestamp, score_records)
         
         # Write to CSV
-        self._write_to_csv(session_id, user_input, ai_response, timestamp, similarity_scores)
+        self._write_to_csv(session_id, user_input, ai_response, timestamp, score_records)
+    
+    @staticmethod
+    def get_similarity_scores(turn: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Get the documents a turn was based on as content/score/answer dicts.
+        
+        Turns recorded by this process hold doc ids, which are looked up in
+        the doc table; turns rehydrated from the interaction store carry the
+        text itself.
+        """
+        if "documents" in turn:
+            return doc_table.score_records(turn["documents"])
+        return turn.get("similarity_scores", [])
         
     def create_new_session(self):
         """Create a new session."""
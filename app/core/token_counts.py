@@ -0,0 +1,151 @@
+import os
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import logging
+
+from langchain.schema import Document
+
+from app.core.context_selection import estimate_tokens
+from app.db.doc_table import ANSWER_TOKENS_KEY, ANSWER_TRUNCATED_KEY, ANSWER_TRUNCATED_TOKENS_KEY, CONTENT_TOKENS_KEY
+
+logger = logging.getLogger(__name__)
+
+# Token counting configuration from environment variables
+TOKENIZER_NAME = os.getenv("TOKENIZER_NAME", "mistralai/Mistral-7B-Instruct-v0.3")  # Tokenizer of the generation model
+TOKEN_COUNT_BATCH_SIZE = int(os.getenv("TOKEN_COUNT_BATCH_SIZE", 1024))  # Texts tokenized together at ingestion
+ANSWER_MAX_TOKENS = int(os.getenv("ANSWER_MAX_TOKENS", 60))  # Longer answers get a truncated copy for the prompt
+
+_SENTENCE_END_RE = re.compile(r"[.!?](?=\s|$)")
+_ELLIPSIS = "…"
+
+
+@dataclass
+class TokenCountReport:
+    """Outcome of counting tokens for a corpus at ingestion."""
+    documents: int
+    seconds: float
+    tokenizer: str
+    truncated_answers: int
+
+    def __str__(self) -> str:
+        rate = self.documents / self.seconds if self.seconds else 0.0
+        return (
+            f"{self.documents} documents in {self.seconds:.2f}s ({rate:,.0f} docs/s) with {self.tokenizer}, "
+            f"{self.truncated_answers} answers truncated to {ANSWER_MAX_TOKENS} tokens"
+        )
+
+
+@lru_cache(maxsize=1)
+def get_tokenizer(name: str = TOKENIZER_NAME):
+    """
+    Load the generation model's tokenizer, once per process.
+
+    Returns:
+        The tokenizer, or None if it cannot be loaded (counts then fall back to estimates)
+    """
+    try:
+        from transformers import AutoTokenizer
+
+        return AutoTokenizer.from_pretrained(name)
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer {name}, estimating token counts instead: {str(e)}")
+        return None
+
+
+def count_tokens(texts: List[Optional[str]], tokenizer=None) -> List[int]:
+    """
+    Count the tokens of many texts.
+
+    Args:
+        texts: The texts (missing values such as None count as empty)
+        tokenizer: Tokenizer to count with; estimates are used if None
+
+    Returns:
+        List of token counts, one per text
+    """
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    if tokenizer is None:
+        return [estimate_tokens(text) for text in texts]
+
+    counts = []
+    for start in range(0, len(texts), TOKEN_COUNT_BATCH_SIZE):
+        batch = texts[start:start + TOKEN_COUNT_BATCH_SIZE]
+        counts.extend(len(ids) for ids in tokenizer(batch, add_special_tokens=False)["input_ids"])
+    return counts
+
+
+def truncate_answer(answer: str, max_tokens: int = ANSWER_MAX_TOKENS, tokenizer=None) -> Tuple[str, int]:
+    """
+    Shorten a long answer to about max_tokens tokens for the prompt.
+
+    The cut is moved back to the last sentence end, or failing that to a
+    word boundary marked with an ellipsis.
+
+    Args:
+        answer: The full answer
+        max_tokens: Token limit of the truncated answer
+        tokenizer: Tokenizer to cut with; a character estimate is used if None
+
+    Returns:
+        tuple: (truncated answer, its token count)
+    """
+    if tokenizer is not None:
+        ids = tokenizer(answer, add_special_tokens=False)["input_ids"][:max_tokens]
+        head = tokenizer.decode(ids)
+    else:
+        head = answer[:max_tokens * 4]
+
+    sentence_ends = [match.end() for match in _SENTENCE_END_RE.finditer(head)]
+    if sentence_ends and sentence_ends[-1] >= len(head) // 2:
+        truncated = head[:sentence_ends[-1]]
+    else:
+        truncated = head.rsplit(" ", 1)[0].rstrip() + _ELLIPSIS
+    return truncated, count_tokens([truncated], tokenizer)[0]
+
+
+def annotate_token_counts(documents: List[Document], tokenizer=None) -> TokenCountReport:
+    """
+    Store token counts, and truncated copies of long answers, in document metadata.
+
+    Sets CONTENT_TOKENS_KEY and ANSWER_TOKENS_KEY on every document, and
+    ANSWER_TRUNCATED_KEY with ANSWER_TRUNCATED_TOKENS_KEY on documents whose
+    answer is longer than ANSWER_MAX_TOKENS. The metadata is stored with the
+    index, so prompts can be budgeted without tokenizing at request time.
+
+    Args:
+        documents: Documents to annotate in place
+        tokenizer: Tokenizer to count with (default: the generation model's)
+
+    Returns:
+        TokenCountReport: How long counting took and how many answers were truncated
+    """
+    tokenizer = tokenizer if tokenizer is not None else get_tokenizer()
+    start = time.perf_counter()
+
+    content_counts = count_tokens([doc.page_content for doc in documents], tokenizer)
+    # Boilerplate answers are shared by many documents, so each distinct answer is counted once
+    answers = list(dict.fromkeys(doc.metadata.get("answer") for doc in documents))
+    answer_counts = dict(zip(answers, count_tokens(answers, tokenizer)))
+    truncations = {
+        answer: truncate_answer(answer, tokenizer=tokenizer)
+        for answer, tokens in answer_counts.items() if answer and tokens > ANSWER_MAX_TOKENS
+    }
+
+    truncated = 0
+    for doc, content_tokens in zip(documents, content_counts):
+        answer = doc.metadata.get("answer")
+        doc.metadata[CONTENT_TOKENS_KEY] = content_tokens
+        doc.metadata[ANSWER_TOKENS_KEY] = answer_counts[answer]
+        if answer in truncations:
+            doc.metadata[ANSWER_TRUNCATED_KEY], doc.metadata[ANSWER_TRUNCATED_TOKENS_KEY] = truncations[answer]
+            truncated += 1
+
+    return TokenCountReport(
+        documents=len(documents),
+        seconds=time.perf_counter() - start,
+        tokenizer=getattr(tokenizer, "name_or_path", None) or "estimate",
+        truncated_answers=truncated,
+    )
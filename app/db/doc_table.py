@@ -0,0 +1,221 @@
+import sys
+import threading
+from array import array
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import logging
+
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+# Metadata values that are not worth storing per document
+_DEFAULT_METADATA = {"duplicate_count": 0}
+
+# Token counts written at ingestion (see app.core.token_counts), kept in side arrays rather than extras
+CONTENT_TOKENS_KEY = "content_tokens"
+ANSWER_TOKENS_KEY = "answer_tokens"
+ANSWER_TRUNCATED_KEY = "answer_truncated"
+ANSWER_TRUNCATED_TOKENS_KEY = "answer_truncated_tokens"
+_TOKEN_METADATA = {CONTENT_TOKENS_KEY, ANSWER_TOKENS_KEY, ANSWER_TRUNCATED_KEY, ANSWER_TRUNCATED_TOKENS_KEY}
+_MAX_TOKENS = 0xFFFF
+
+
+class Hit(NamedTuple):
+    """A retrieved document."""
+    doc_id: int
+    distance: Optional[float]  # Embedding distance, lower is closer; None for documents only found by BM25
+    score: Optional[float] = None  # Rank-fusion (hybrid) or BM25 (lexical) relevance, higher is better
+
+
+class DocTable:
+    """
+    Append-only table of the documents known to this process, addressed by integer doc id.
+
+    Searches return Hit tuples of doc ids and scores and sessions keep those,
+    so each document's text is held once however often it is retrieved.
+    Questions are stored once per (question, answer) pair and answers are
+    deduplicated, which matters because many agent replies are boilerplate.
+    Token counts from ingestion are kept in side arrays (per question and
+    per distinct answer, 0 meaning unknown) together with truncated copies
+    of long answers, so prompts can be budgeted without tokenizing. Other
+    metadata (e.g. duplicate counts) is kept sparsely for the few documents
+    that have it.
+
+    Ids are stable for the lifetime of the process, across index version
+    swaps; they are not persisted, so anything durable stores text.
+    """
+
+    def __init__(self):
+        """Initialize an empty table."""
+        self._contents: List[str] = []
+        self._answer_ids = array("I")
+        self._content_tokens = array("H")
+        self._answers: List[Optional[str]] = []
+        self._answer_tokens = array("H")
+        self._truncated_answers: Dict[int, Tuple[str, int]] = {}  # answer id -> (answer, tokens)
+        self._answer_index: Dict[Optional[str], int] = {}
+        self._index: Dict[Tuple[str, int], int] = {}
+        self._extras: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._contents)
+
+    def intern(self, content: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Get the id of a document, adding it to the table if it is new.
+
+        Args:
+            content: The document's page content (the customer tweet)
+            metadata: The document's metadata, with the agent reply under "answer"
+
+        Returns:
+            int: The doc id
+        """
+        metadata = metadata or {}
+        answer = metadata.get("answer")
+
+        # Lock-free lookup for documents that are already interned, the common case on the search path
+        content_tokens = metadata.get(CONTENT_TOKENS_KEY)
+        answer_id = self._answer_index.get(answer)
+        if answer_id is not None:
+            doc_id = self._index.get((content, answer_id))
+            # Documents first interned without counts (e.g. from an older lexical index) pick them up later
+            if doc_id is not None and (not content_tokens or self._content_tokens[doc_id]):
+                return doc_id
+
+        with self._lock:
+            answer_id = self._answer_index.get(answer)
+            if answer_id is None:
+                answer_id = len(self._answers)
+                self._answers.append(answer)
+                self._answer_tokens.append(0)
+                self._answer_index[answer] = answer_id
+            self._set_answer_tokens(answer_id, metadata)
+
+            key = (content, answer_id)
+            doc_id = self._index.get(key)
+            if doc_id is None:
+                doc_id = len(self._contents)
+                self._contents.append(content)
+                self._answer_ids.append(answer_id)
+                self._content_tokens.append(0)
+                self._index[key] = doc_id
+                extras = {
+                    name: value for name, value in metadata.items()
+                    if name != "answer" and name not in _TOKEN_METADATA and _DEFAULT_METADATA.get(name, None) != value
+                }
+                if extras:
+                    self._extras[doc_id] = extras
+            if content_tokens and not self._content_tokens[doc_id]:
+                self._content_tokens[doc_id] = min(int(content_tokens), _MAX_TOKENS)
+            return doc_id
+
+    def _set_answer_tokens(self, answer_id: int, metadata: Dict[str, Any]):
+        """Record the token counts of an answer if they are new. Must hold the lock."""
+        answer_tokens = metadata.get(ANSWER_TOKENS_KEY)
+        if not answer_tokens or self._answer_tokens[answer_id]:
+            return
+        self._answer_tokens[answer_id] = min(int(answer_tokens), _MAX_TOKENS)
+        truncated = metadata.get(ANSWER_TRUNCATED_KEY)
+        if truncated:
+            self._truncated_answers[answer_id] = (truncated, int(metadata.get(ANSWER_TRUNCATED_TOKENS_KEY) or 0))
+
+    def intern_document(self, doc: Document) -> int:
+        """Get the id of a LangChain document, adding it if it is new."""
+        return self.intern(doc.page_content, doc.metadata)
+
+    def content(self, doc_id: int) -> str:
+        """Get the page content of a document."""
+        return self._contents[doc_id]
+
+    def answer(self, doc_id: int) -> Optional[str]:
+        """Get the stored answer of a document."""
+        return self._answers[self._answer_ids[doc_id]]
+
+    def content_tokens(self, doc_id: int) -> Optional[int]:
+        """Get the token count of a document's content, or None if it was not counted at ingestion."""
+        return self._content_tokens[doc_id] or None
+
+    def prompt_answer(self, doc_id: int) -> Tuple[Optional[str], Optional[int]]:
+        """
+        Get the answer to place in the prompt and its token count.
+
+        Long answers are replaced by the truncated copy made at ingestion.
+        The count is None if the answer was not counted at ingestion.
+        """
+        answer_id = self._answer_ids[doc_id]
+        truncated = self._truncated_answers.get(answer_id)
+        if truncated is not None:
+            return truncated
+        return self._answers[answer_id], self._answer_tokens[answer_id] or None
+
+    def token_metadata(self, doc_id: int) -> Dict[str, Any]:
+        """Get the ingestion-time token metadata of a document (empty if it was not counted)."""
+        answer_id = self._answer_ids[doc_id]
+        metadata = {}
+        if self._content_tokens[doc_id]:
+            metadata[CONTENT_TOKENS_KEY] = self._content_tokens[doc_id]
+        if self._answer_tokens[answer_id]:
+            metadata[ANSWER_TOKENS_KEY] = self._answer_tokens[answer_id]
+        truncated = self._truncated_answers.get(answer_id)
+        if truncated is not None:
+            metadata[ANSWER_TRUNCATED_KEY], metadata[ANSWER_TRUNCATED_TOKENS_KEY] = truncated
+        return metadata
+
+    def metadata(self, doc_id: int) -> Dict[str, Any]:
+        """Get a fresh copy of a document's metadata."""
+        return {"answer": self.answer(doc_id), **self.token_metadata(doc_id), **self._extras.get(doc_id, {})}
+
+    def document(self, doc_id: int) -> Document:
+        """Materialise a document, for the prompt or an API response."""
+        return Document(page_content=self._contents[doc_id], metadata=self.metadata(doc_id))
+
+    def prompt_document(self, doc_id: int) -> Document:
+        """Materialise a document for the prompt, with a long answer replaced by its truncated copy."""
+        metadata = self.metadata(doc_id)
+        metadata["answer"] = self.prompt_answer(doc_id)[0]
+        return Document(page_content=self._contents[doc_id], metadata=metadata)
+
+    def score_records(self, hits: List[Hit]) -> List[Dict[str, Any]]:
+        """
+        Render hits as the similarity score dicts used by the API and logs.
+
+        Args:
+            hits: The retrieved documents
+
+        Returns:
+            List of {"content", "score", "relevance", "answer"} dicts; "score" is the
+            embedding distance and "relevance" the fused or BM25 score, either may be None
+        """
+        return [
+            {
+                "content": self._contents[hit.doc_id],
+                "score": hit.distance,
+                "relevance": hit.score,
+                "answer": self.answer(hit.doc_id)
+            }
+            for hit in hits
+        ]
+
+    def size_bytes(self) -> int:
+        """Estimate the memory held by the table's strings and arrays."""
+        strings = sum(sys.getsizeof(text) for text in self._contents)
+        strings += sum(sys.getsizeof(text) for text in self._answers if text is not None)
+        strings += sum(sys.getsizeof(text) for text, _ in self._truncated_answers.values())
+        arrays = sum(a.itemsize * len(a) for a in (self._answer_ids, self._content_tokens, self._answer_tokens))
+        return strings + arrays + sys.getsizeof(self._index) + sys.getsizeof(self._answer_index)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the table's size."""
+        return {
+            "documents": len(self),
+            "unique_answers": len(self._answers),
+            "with_token_counts": sum(1 for tokens in self._content_tokens if tokens),
+            "truncated_answers": len(self._truncated_answers),
+            "approx_bytes": self.size_bytes(),
+        }
+
+
+# Create the process-wide document table
+doc_table = DocTable()
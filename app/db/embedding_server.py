@@ -0,0 +1,447 @@
+"""
+Out-of-process embedding server shared by all web workers.
+
+One process owns the embedding model. Web workers connect to it over a Unix
+socket and send texts; the server groups the texts of concurrent requests
+from every worker into one forward pass and writes the vectors into a
+shared-memory buffer that belongs to the connection, so only the request
+text and a row count travel over the socket.
+
+Usage:
+    python -m app.db.embedding_server --socket /tmp/rag-embeddings.sock --backend quantized
+"""
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from app.db.embeddings import EMBEDDING_BACKEND, EMBEDDING_SERVER_SOCKET, create_base_embedding_model
+from app.utils.metrics import metrics
+from app.utils.tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+# Embedding server configuration from environment variables
+EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", 5.0))  # Seconds to wait for the server before embedding in-process
+EMBEDDING_SERVER_RETRY_INTERVAL = float(os.getenv("EMBEDDING_SERVER_RETRY_INTERVAL", 30.0))  # Seconds to embed in-process after a failure
+EMBEDDING_SERVER_MAX_BATCH = int(os.getenv("EMBEDDING_SERVER_MAX_BATCH", 128))  # Texts encoded together across all clients
+EMBEDDING_SERVER_MAX_WAIT_MS = float(os.getenv("EMBEDDING_SERVER_MAX_WAIT_MS", 2.0))  # How long a batch waits for more texts
+EMBEDDING_SERVER_CHUNK = int(os.getenv("EMBEDDING_SERVER_CHUNK", 256))  # Texts per request; sizes each connection's buffer
+
+_HEADER = struct.Struct("!I")
+
+
+class EmbeddingServerError(Exception):
+    """The embedding server answered a request with an error."""
+
+
+def _send_message(sock: socket.socket, message: Dict[str, Any]):
+    """Send a length-prefixed JSON message."""
+    payload = json.dumps(message).encode()
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    """Read exactly size bytes, or None if the peer closed the connection first."""
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            return None
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def _recv_message(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """Read a length-prefixed JSON message, or None at end of stream."""
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    payload = _recv_exactly(sock, _HEADER.unpack(header)[0])
+    if payload is None:
+        return None
+    return json.loads(payload)
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to a segment owned by the server without letting this process unlink it at exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching also registers the segment with this process's resource tracker
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+class EmbeddingServer:
+    """
+    Serves embeddings to many client processes with dynamic batching.
+
+    Each connection gets a float32 shared-memory buffer of chunk x dim
+    values. Connection threads queue their texts; a single batcher thread
+    takes whatever is queued, waits up to max_wait for more texts (until
+    max_batch are waiting), encodes them together and hands each request
+    its slice, which the connection thread copies into its buffer.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        socket_path: str = EMBEDDING_SERVER_SOCKET,
+        max_batch: int = EMBEDDING_SERVER_MAX_BATCH,
+        max_wait_ms: float = EMBEDDING_SERVER_MAX_WAIT_MS,
+        chunk: int = EMBEDDING_SERVER_CHUNK,
+    ):
+        """
+        Initialize the server and warm up the model.
+
+        Args:
+            embeddings: The embedding function that runs the model
+            socket_path: Path of the Unix socket to listen on
+            max_batch: Texts after which a batch is encoded without waiting
+            max_wait_ms: Milliseconds a batch waits for more texts
+            chunk: Maximum texts per request
+        """
+        self.embeddings = embeddings
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.chunk = chunk
+        self.dim = len(embeddings.embed_query("warm up"))
+        self._encode = getattr(embeddings, "embed_array", None) or embeddings.embed_documents
+        self._queue: "queue.Queue" = queue.Queue()
+        self._segments: Dict[str, shared_memory.SharedMemory] = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "texts": 0, "batches": 0}
+        self._sock: Optional[socket.socket] = None
+
+    def serve_forever(self):
+        """Listen on the socket and serve clients until interrupted."""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.socket_path)
+        self._sock.listen(128)
+        threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True).start()
+        logger.info(f"Embedding server {os.getpid()} listening on {self.socket_path} (dim={self.dim}, max_batch={self.max_batch})")
+
+        try:
+            while True:
+                conn, _ = self._sock.accept()
+                threading.Thread(target=self._serve_connection, args=(conn,), name="embedding-conn", daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop listening, remove the socket and free every shared-memory segment."""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        with self._lock:
+            segments, self._segments = self._segments, {}
+        for segment in segments.values():
+            segment.unlink()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get request and batching counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["connections"] = len(self._segments)
+        stats["mean_batch"] = round(stats["texts"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["pid"] = os.getpid()
+        return stats
+
+    def _serve_connection(self, conn: socket.socket):
+        """Answer one client's requests until it disconnects."""
+        segment = shared_memory.SharedMemory(create=True, size=self.chunk * self.dim * 4)
+        with self._lock:
+            self._segments[segment.name] = segment
+        vectors = np.ndarray((self.chunk, self.dim), dtype=np.float32, buffer=segment.buf)
+        try:
+            while True:
+                message = _recv_message(conn)
+                if message is None:
+                    break
+                op = message.get("op")
+                if op == "hello":
+                    _send_message(conn, {"shm": segment.name, "dim": self.dim, "rows": self.chunk})
+                elif op == "embed":
+                    texts = message.get("texts") or []
+                    if len(texts) > self.chunk:
+                        _send_message(conn, {"error": f"At most {self.chunk} texts per request"})
+                        continue
+                    future = Future()
+                    self._queue.put((texts, future))
+                    try:
+                        vectors[:len(texts)] = future.result()
+                    except Exception as e:
+                        _send_message(conn, {"error": str(e)})
+                        continue
+                    _send_message(conn, {"rows": len(texts)})
+                elif op == "stats":
+                    _send_message(conn, self.stats())
+                else:
+                    _send_message(conn, {"error": f"Unknown op {op!r}"})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping embedding client: {str(e)}")
+        finally:
+            del vectors
+            conn.close()
+            with self._lock:
+                owned = self._segments.pop(segment.name, None) is not None
+            segment.close()
+            if owned:
+                segment.unlink()
+
+    def _batch_loop(self):
+        """Encode queued requests together, waiting briefly for more to arrive."""
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            texts = [text for request_texts, _ in pending for text in request_texts]
+            try:
+                encoded = np.asarray(self._encode(texts), dtype=np.float32) if texts else np.empty((0, self.dim), np.float32)
+            except Exception as e:
+                logger.error(f"Error embedding a batch of {len(texts)} texts: {str(e)}")
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_texts, future in pending:
+                future.set_result(encoded[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+            with self._lock:
+                self._stats["requests"] += len(pending)
+                self._stats["texts"] += len(texts)
+                self._stats["batches"] += 1
+
+
+class _Connection:
+    """A client connection and the server-owned buffer its vectors arrive in."""
+
+    def __init__(self, socket_path: str, timeout: float):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(socket_path)
+            hello = self.request({"op": "hello"})
+            self.segment = _attach_shared_memory(hello["shm"])
+        except BaseException:
+            self.sock.close()
+            raise
+        self.rows = hello["rows"]
+        self.vectors = np.ndarray((self.rows, hello["dim"]), dtype=np.float32, buffer=self.segment.buf)
+
+    def request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a request and wait for its reply."""
+        _send_message(self.sock, message)
+        reply = _recv_message(self.sock)
+        if reply is None:
+            raise ConnectionError("Embedding server closed the connection")
+        if "error" in reply:
+            raise EmbeddingServerError(reply["error"])
+        return reply
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed at most `rows` texts, reading the vectors straight from shared memory."""
+        reply = self.request({"op": "embed", "texts": texts})
+        return self.vectors[:reply["rows"]].tolist()
+
+    def close(self):
+        del self.vectors
+        self.segment.close()
+        self.sock.close()
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Thin client of the embedding server with in-process fallback.
+
+    Connections are pooled per process (one per concurrent caller) and
+    dropped after a fork. When the server cannot be reached or does not
+    answer within `timeout`, texts are embedded by a local model, created
+    from `fallback` on first use, and the server is not tried again for
+    `retry_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        socket_path: str = EMBEDDING_SERVER_SOCKET,
+        fallback: Callable[[], Embeddings] = create_base_embedding_model,
+        timeout: float = EMBEDDING_SERVER_TIMEOUT,
+        retry_interval: float = EMBEDDING_SERVER_RETRY_INTERVAL,
+    ):
+        """
+        Initialize the client; nothing is connected or loaded until first use.
+
+        Args:
+            socket_path: Path of the server's Unix socket
+            fallback: Factory for the in-process embedding function
+            timeout: Seconds to wait for a connection or a reply
+            retry_interval: Seconds to embed in-process after a failure
+        """
+        self.socket_path = socket_path
+        self.fallback = fallback
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._local_embeddings: Optional[Embeddings] = None
+        self._local_lock = threading.Lock()
+        self._down_until = 0.0
+        self._reset()
+
+        # Sockets and their buffers belong to the process that opened them
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """Forget connections inherited from the parent process."""
+        self._idle: List[_Connection] = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts on the server, or in-process if it is unavailable."""
+        if not texts:
+            return []
+        if time.monotonic() >= self._down_until:
+            start = time.perf_counter()
+            try:
+                vectors = self._embed_remote(list(texts))
+            except (OSError, ValueError, KeyError, EmbeddingServerError) as e:
+                self._down_until = time.monotonic() + self.retry_interval
+                self._close_idle()
+                logger.warning(f"Embedding server unavailable ({str(e)}), embedding in-process for {self.retry_interval:.0f}s")
+            else:
+                metrics.increment("embedding_server_requests")
+                metrics.observe("embedding_server_latency_seconds", time.perf_counter() - start)
+                annotate(embedding_server=True)
+                return vectors
+
+        metrics.increment("embedding_server_fallbacks")
+        annotate(embedding_server=False)
+        return self._local().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        return self.embed_documents([text])[0]
+
+    def health_check(self) -> Dict[str, Any]:
+        """Ask the server for its counters, raising if it does not answer."""
+        connection = self._acquire()
+        try:
+            stats = connection.request({"op": "stats"})
+        except BaseException:
+            connection.close()
+            raise
+        self._release(connection)
+        return stats
+
+    def _embed_remote(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts over one pooled connection, in chunks that fit its buffer."""
+        connection = self._acquire()
+        try:
+            vectors = []
+            for start in range(0, len(texts), connection.rows):
+                vectors.extend(connection.embed(texts[start:start + connection.rows]))
+        except BaseException:
+            # The reply to a timed-out request may still arrive, so the connection cannot be reused
+            connection.close()
+            raise
+        self._release(connection)
+        return vectors
+
+    def _acquire(self) -> _Connection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return _Connection(self.socket_path, self.timeout)
+
+    def _release(self, connection: _Connection):
+        with self._lock:
+            self._idle.append(connection)
+
+    def _close_idle(self):
+        """Close pooled connections, which likely lead to a server that has gone away."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def _local(self) -> Embeddings:
+        """Get the in-process embedding function, loading it on first use."""
+        with self._local_lock:
+            if self._local_embeddings is None:
+                logger.info("Loading in-process embedding model as a fallback...")
+                self._local_embeddings = self.fallback()
+            return self._local_embeddings
+
+
+def wait_for_server(socket_path: str = EMBEDDING_SERVER_SOCKET, timeout: float = 120.0) -> bool:
+    """
+    Wait until an embedding server answers on the socket.
+
+    Returns:
+        bool: True if the server answered before the timeout
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _Connection(socket_path, timeout=1.0).close()
+            return True
+        except (OSError, ValueError, KeyError):
+            time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding server shared by all web workers")
+    parser.add_argument("--socket", default=EMBEDDING_SERVER_SOCKET or "/tmp/rag-embeddings.sock", help="Unix socket to listen on")
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, help="Embedding backend: default or quantized")
+    parser.add_argument("--max-batch", type=int, default=EMBEDDING_SERVER_MAX_BATCH, help="Texts encoded together")
+    parser.add_argument("--max-wait-ms", type=float, default=EMBEDDING_SERVER_MAX_WAIT_MS, help="Milliseconds a batch waits for more texts")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = EmbeddingServer(
+        create_base_embedding_model(args.backend),
+        socket_path=args.socket,
+        max_batch=args.max_batch,
+        max_wait_ms=args.max_wait_ms
+    )
+    # Exit through serve_forever's cleanup so the socket and shared memory are removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
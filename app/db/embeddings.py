@@ -0,0 +1,204 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+import logging
+
+from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.embeddings.base import Embeddings
+
+from app.utils.metrics import metrics
+from app.utils.text_normalization import normalize_for_embedding
+from app.utils.tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+# Embedding configuration from environment variables
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "default")  # "default" or "quantized"
+EMBEDDING_NUM_THREADS = int(os.getenv("EMBEDDING_NUM_THREADS", 0))  # torch intra-op threads, 0 keeps the torch default
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", 64))  # Word pieces kept per text; tweets rarely need more
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))  # Texts tokenized and encoded together
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 10000))  # Query embeddings kept, keyed by normalized text
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "")  # Unix socket of a shared embedding server; empty embeds in-process
+
+
+class QuantizedEmbeddings(Embeddings):
+    """
+    CPU-optimised sentence-transformers embeddings.
+
+    The model's linear layers are converted to int8 with torch dynamic
+    quantization, the input length is capped to what tweets need, texts are
+    tokenized and encoded in batches, and the number of intra-op threads can
+    be pinned so that concurrent requests do not oversubscribe the cores.
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH,
+        num_threads: int = EMBEDDING_NUM_THREADS,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+    ):
+        """
+        Load and quantize the model.
+
+        Args:
+            model_name: sentence-transformers model to load
+            max_seq_length: Maximum number of word pieces per text
+            num_threads: torch intra-op threads (0 keeps the torch default)
+            batch_size: Number of texts tokenized and encoded together
+        """
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        self._torch = torch
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+
+        model = SentenceTransformer(model_name, device="cpu")
+        model.max_seq_length = max_seq_length
+        model.eval()
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.batch_size = batch_size
+
+        logger.info(
+            f"Loaded int8 embedding model {model_name} (max_seq_length={max_seq_length}, "
+            f"threads={torch.get_num_threads()})"
+        )
+
+    def embed_array(self, texts: List[str]):
+        """Embed a list of texts in batches into a float32 numpy array."""
+        with self._torch.inference_mode():
+            return self.model.encode(
+                list(texts),
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts in batches."""
+        if not texts:
+            return []
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        return self.embed_documents([text])[0]
+
+
+class NormalizingEmbeddings(Embeddings):
+    """
+    Embeds normalized tweets and caches query embeddings.
+
+    When TEXT_NORMALIZATION_ENABLED is set, every text is passed through the
+    shared tweet normalization before it reaches the model, at ingestion and
+    at query time alike, so both sides embed the same form. Texts that
+    normalize to the same string are embedded once per batch, and query
+    embeddings are kept in an LRU cache keyed by the normalized text, so
+    "@Delta my flight!!!" and "my flight!!" share an entry.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache_size: int = EMBEDDING_CACHE_SIZE):
+        """
+        Wrap an embedding function.
+
+        Args:
+            embeddings: The embedding function that runs the model
+            cache_size: Number of query embeddings cached (0 disables the cache)
+        """
+        self.embeddings = embeddings
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed normalized texts, embedding each distinct normalized text once."""
+        normalized = [normalize_for_embedding(text) for text in texts]
+        unique: Dict[str, int] = {}
+        for text in normalized:
+            unique.setdefault(text, len(unique))
+        vectors = self.embeddings.embed_documents(list(unique)) if unique else []
+        return [vectors[unique[text]] for text in normalized]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a normalized query, using the cache when possible."""
+        key = normalize_for_embedding(text)
+        if self.cache_size > 0:
+            with self._lock:
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+            metrics.increment("embedding_cache_hits" if vector is not None else "embedding_cache_misses")
+            annotate(cache_hit=vector is not None)
+            if vector is not None:
+                return vector
+
+        vector = self.embeddings.embed_query(key)
+        if self.cache_size > 0:
+            with self._lock:
+                self._cache[key] = vector
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return vector
+
+    def warm(self, texts: List[str]) -> int:
+        """
+        Embed queries ahead of time into the query cache.
+
+        Args:
+            texts: The queries; those already cached are skipped
+
+        Returns:
+            int: Number of embeddings added to the cache
+        """
+        if self.cache_size <= 0:
+            return 0
+        keys = list(dict.fromkeys(normalize_for_embedding(text) for text in texts))
+        with self._lock:
+            missing = [key for key in keys if key not in self._cache][:self.cache_size]
+        vectors = self.embeddings.embed_documents(missing) if missing else []
+        with self._lock:
+            for key, vector in zip(missing, vectors):
+                self._cache[key] = vector
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return len(missing)
+
+    def cache_info(self) -> Dict[str, int]:
+        """Get the size of the query embedding cache."""
+        with self._lock:
+            return {"entries": len(self._cache), "capacity": self.cache_size}
+
+
+def create_embedding_model(backend: str = EMBEDDING_BACKEND) -> Embeddings:
+    """
+    Create the embedding function used by the vector store.
+
+    Both backends produce vectors in the same space, so an index built with
+    one can be queried with the other. Either way the model sees normalized
+    text (see NormalizingEmbeddings). When EMBEDDING_SERVER_SOCKET is set the
+    model runs in the shared embedding server and is only loaded in-process
+    if the server is unavailable (see app.db.embedding_server).
+
+    Args:
+        backend: "default" for float32 HuggingFaceEmbeddings, "quantized" for QuantizedEmbeddings
+
+    Returns:
+        Embeddings: The embedding function
+    """
+    if EMBEDDING_SERVER_SOCKET:
+        from app.db.embedding_server import RemoteEmbeddings
+
+        return NormalizingEmbeddings(RemoteEmbeddings(fallback=lambda: create_base_embedding_model(backend)))
+    return NormalizingEmbeddings(create_base_embedding_model(backend))
+
+
+def create_base_embedding_model(backend: str = EMBEDDING_BACKEND) -> Embeddings:
+    """Create the embedding function that runs the model on text as given."""
+    if backend == "quantized":
+        return QuantizedEmbeddings()
+    if backend != "default":
+        logger.warning(f"Unknown embedding backend '{backend}', using the default backend")
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
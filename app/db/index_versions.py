@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Index versioning configuration from environment variables
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", 3))  # Version directories kept on disk
+INDEX_VERSION_CHECK_INTERVAL = float(os.getenv("INDEX_VERSION_CHECK_INTERVAL", 5))  # Seconds between pointer checks
+
+VERSIONS_DIR = "versions"
+POINTER_FILE = "CURRENT.json"
+BASE_VERSION = "base"  # The unversioned index in the root of the persist directory
+
+
+@dataclass(frozen=True)
+class IndexVersion:
+    """
+    One immutable generation of the search indexes.
+
+    Readers take a reference to the current version once per search and use
+    only that, so swapping the store's reference to a new version never
+    affects searches already in progress.
+    """
+    name: str
+    path: str
+    db: Any
+    lexical_index: Any
+    sharded_index: Any
+    loaded_at: str
+
+
+def version_path(root: str, name: str) -> str:
+    """Get the directory holding a version's indexes."""
+    if name == BASE_VERSION:
+        return root
+    return os.path.join(root, VERSIONS_DIR, name)
+
+
+def read_pointer(root: str) -> dict:
+    """
+    Read which version is current and which one a rollback returns to.
+
+    Returns:
+        dict: {"current": name, "previous": name or None}
+    """
+    try:
+        with open(os.path.join(root, POINTER_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"current": BASE_VERSION, "previous": None}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read index version pointer: {str(e)}")
+        return {"current": BASE_VERSION, "previous": None}
+
+
+def write_pointer(root: str, current: str, previous: Optional[str]):
+    """Atomically point the store at a new current version."""
+    path = os.path.join(root, POINTER_FILE)
+    pointer = {"current": current, "previous": previous, "updated_at": datetime.now().isoformat()}
+    with open(path + ".tmp", "w") as f:
+        json.dump(pointer, f)
+    os.replace(path + ".tmp", path)
+
+
+def allocate_version(root: str) -> str:
+    """
+    Create an empty directory for a new version.
+
+    The directory is created with mkdir, so concurrent builders (e.g. in
+    different workers) never get the same version.
+
+    Returns:
+        str: Name of the new version
+    """
+    versions_root = os.path.join(root, VERSIONS_DIR)
+    os.makedirs(versions_root, exist_ok=True)
+    number = max((int(name[1:]) for name in list_versions(root)), default=0) + 1
+    while True:
+        name = f"v{number:04d}"
+        try:
+            os.mkdir(os.path.join(versions_root, name))
+            return name
+        except FileExistsError:
+            number += 1
+
+
+def list_versions(root: str) -> List[str]:
+    """List the version directories on disk, oldest first."""
+    versions_root = os.path.join(root, VERSIONS_DIR)
+    if not os.path.isdir(versions_root):
+        return []
+    names = [name for name in os.listdir(versions_root) if name.startswith("v") and name[1:].isdigit()]
+    return sorted(names, key=lambda name: int(name[1:]))
+
+
+def prune_versions(root: str, keep: int = INDEX_KEEP_VERSIONS, protect: tuple = ()):
+    """Delete the oldest version directories beyond keep, never touching protected ones."""
+    versions = list_versions(root)
+    removable = [name for name in versions if name not in protect]
+    excess = len(versions) - keep
+    for name in removable[:max(excess, 0)]:
+        logger.info(f"Removing old index version {name}")
+        shutil.rmtree(version_path(root, name), ignore_errors=True)
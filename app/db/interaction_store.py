@@ -0,0 +1,329 @@
+"""
+Durable store of chat interactions backed by SQLite in WAL mode.
+
+Usage:
+    python -m app.db.interaction_store import chat_history.csv
+    python -m app.db.interaction_store export --format jsonl > interactions.jsonl
+"""
+import argparse
+import atexit
+import csv
+import io
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Interaction store configuration from environment variables
+INTERACTION_STORE_ENABLED = os.getenv("INTERACTION_STORE_ENABLED", "true").lower() == "true"
+INTERACTION_DB_PATH = os.getenv("INTERACTION_DB_PATH", "chat_history.db")
+INTERACTION_FLUSH_SIZE = int(os.getenv("INTERACTION_FLUSH_SIZE", 50))  # Rows per write transaction
+INTERACTION_FLUSH_INTERVAL = float(os.getenv("INTERACTION_FLUSH_INTERVAL", 1.0))  # Max seconds a row waits
+SESSION_REHYDRATE_TURNS = int(os.getenv("SESSION_REHYDRATE_TURNS", 10))  # Turns loaded for an unknown session
+
+EXPORT_COLUMNS = ["session_id", "user_input", "ai_response", "timestamp", "similarity_scores"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    user_input TEXT,
+    ai_response TEXT,
+    timestamp TEXT NOT NULL,
+    similarity_scores TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_interactions_session_timestamp ON interactions (session_id, timestamp);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_INSERT = (
+    "INSERT INTO interactions (session_id, user_input, ai_response, timestamp, similarity_scores) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class InteractionStore:
+    """
+    Append-mostly store of chat turns with an index on (session_id, timestamp).
+
+    Writes are queued and committed by a background thread in batches of up
+    to INTERACTION_FLUSH_SIZE rows or every INTERACTION_FLUSH_INTERVAL
+    seconds, so request threads never wait on disk. Reads use one
+    connection per thread, which WAL mode allows alongside the writer.
+    """
+
+    def __init__(
+        self,
+        db_path: str = INTERACTION_DB_PATH,
+        flush_size: int = INTERACTION_FLUSH_SIZE,
+        flush_interval: float = INTERACTION_FLUSH_INTERVAL,
+    ):
+        """
+        Initialize the store and start the writer thread.
+
+        Args:
+            db_path: Path to the SQLite database file
+            flush_size: Maximum rows per write transaction
+            flush_interval: Maximum seconds a queued row waits before being written
+        """
+        self.db_path = db_path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._writer_lock = threading.Lock()
+        self._reset()
+
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+        # Threads and SQLite connections do not survive fork (e.g. the pre-fork launcher)
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush_on_exit)
+
+    def _reset(self):
+        """Drop per-process state; the writer thread is started on the next write."""
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = None
+
+    def _ensure_writer(self):
+        """Start the writer thread in this process if it is not running yet."""
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="interaction-writer", daemon=True)
+                self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, session_id: str, user_input: str, ai_response: str, timestamp: str, similarity_scores: Optional[list] = None):
+        """Queue an interaction for the next batched write."""
+        scores_json = json.dumps(similarity_scores) if similarity_scores else ""
+        self._ensure_writer()
+        self._queue.put((session_id, user_input, ai_response, timestamp, scores_json))
+
+    def flush(self):
+        """Block until every queued interaction has been written."""
+        self._queue.join()
+
+    def flush_on_exit(self):
+        """Write queued interactions before the process exits."""
+        if self._writer is not None and self._writer.is_alive():
+            self.flush()
+
+    def _write_loop(self):
+        """Drain the queue into batched transactions."""
+        conn = self._connect()
+        pending = self._queue
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                with conn:
+                    conn.executemany(_INSERT, batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} interactions: {str(e)}", exc_info=True)
+            finally:
+                for _ in batch:
+                    pending.task_done()
+
+    def load_recent(self, session_id: str, limit: int = SESSION_REHYDRATE_TURNS) -> List[Dict[str, Any]]:
+        """
+        Load the last turns of a session, oldest first.
+
+        Args:
+            session_id: The session ID
+            limit: Maximum number of turns to load
+
+        Returns:
+            List of turns in the in-memory session format
+        """
+        rows = self._connect().execute(
+            "SELECT user_input, ai_response, timestamp, similarity_scores FROM interactions "
+            "WHERE session_id = ? ORDER BY timestamp DESC LIMIT ?",
+            (session_id, limit)
+        ).fetchall()
+
+        turns = []
+        for user_input, ai_response, timestamp, scores_json in reversed(rows):
+            turn = {"user": user_input, "ai": ai_response, "timestamp": timestamp}
+            if scores_json:
+                turn["similarity_scores"] = json.loads(scores_json)
+            turns.append(turn)
+        return turns
+
+    def last_timestamp(self, session_id: str) -> Optional[str]:
+        """Get the timestamp of the latest stored turn of a session, or None if it has none."""
+        row = self._connect().execute(
+            "SELECT MAX(timestamp) FROM interactions WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def recent_user_inputs(self, limit: int) -> List[str]:
+        """
+        Load the user messages of the most recent interactions, across all sessions.
+
+        Args:
+            limit: Maximum number of messages to load
+
+        Returns:
+            List of messages, newest first
+        """
+        rows = self._connect().execute(
+            "SELECT user_input FROM interactions WHERE user_input != '' ORDER BY id DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [user_input for (user_input,) in rows]
+
+    def health_check(self) -> int:
+        """Check the database answers a trivial query and return the number of queued writes."""
+        self._connect().execute("SELECT 1").fetchone()
+        return self._queue.qsize()
+
+    def export(self, fmt: str = "jsonl") -> Iterator[str]:
+        """
+        Stream every interaction in insertion order.
+
+        Args:
+            fmt: "jsonl" for JSON lines or "csv" for the chat_history.csv layout
+
+        Yields:
+            str: One serialized line per interaction (preceded by a header for CSV)
+        """
+        # A dedicated connection keeps the cursor independent of other reads; streaming
+        # responses may resume the generator on different threads
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        try:
+            cursor = conn.execute(
+                "SELECT session_id, user_input, ai_response, timestamp, similarity_scores "
+                "FROM interactions ORDER BY id"
+            )
+            if fmt == "csv":
+                yield _csv_line(EXPORT_COLUMNS)
+                for row in cursor:
+                    yield _csv_line(row)
+            else:
+                for row in cursor:
+                    record = dict(zip(EXPORT_COLUMNS, row))
+                    record["similarity_scores"] = json.loads(record["similarity_scores"]) if record["similarity_scores"] else []
+                    yield json.dumps(record) + "\n"
+        finally:
+            conn.close()
+
+    def import_csv(self, csv_path: str, force: bool = False) -> int:
+        """
+        Import an existing chat_history.csv once.
+
+        Args:
+            csv_path: Path to the CSV written by SessionManager
+            force: Import even if this file was imported before
+
+        Returns:
+            int: Number of interactions imported
+        """
+        conn = self._connect()
+        meta_key = f"imported:{os.path.abspath(csv_path)}"
+        if not force and conn.execute("SELECT 1 FROM store_meta WHERE key = ?", (meta_key,)).fetchone():
+            logger.info(f"{csv_path} was already imported, skipping")
+            return 0
+
+        imported = 0
+        # Older rows were written with the platform encoding, so undecodable bytes are replaced
+        with open(csv_path, newline="", encoding="utf-8", errors="replace") as f:
+            reader = csv.DictReader(f)
+            batch = []
+            for row in reader:
+                batch.append(tuple(row.get(column) or "" for column in EXPORT_COLUMNS))
+                if len(batch) >= 1000:
+                    with conn:
+                        conn.executemany(_INSERT, batch)
+                    imported += len(batch)
+                    batch = []
+            with conn:
+                if batch:
+                    conn.executemany(_INSERT, batch)
+                    imported += len(batch)
+                conn.execute(
+                    "INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)",
+                    (meta_key, str(imported))
+                )
+
+        logger.info(f"Imported {imported} interactions from {csv_path}")
+        return imported
+
+
+def _csv_line(values) -> str:
+    """Serialize one CSV row."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def get_interaction_store() -> Optional[InteractionStore]:
+    """Get the process-wide interaction store, or None if it is disabled."""
+    global _store
+    if not INTERACTION_STORE_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = InteractionStore()
+        return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the durable interaction store")
+    parser.add_argument("--db", default=INTERACTION_DB_PATH, help="Path to the SQLite database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Import an existing chat_history.csv")
+    import_parser.add_argument("csv_path", help="CSV file to import")
+    import_parser.add_argument("--force", action="store_true", help="Import even if imported before")
+
+    export_parser = subparsers.add_parser("export", help="Stream all interactions to stdout")
+    export_parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    store = InteractionStore(db_path=args.db)
+
+    if args.command == "import":
+        print(f"Imported {store.import_csv(args.csv_path, force=args.force)} interactions")
+    elif args.command == "export":
+        for line in store.export(args.format):
+            sys.stdout.write(line)
+
+
+if __name__ == "__main__":
+    main()
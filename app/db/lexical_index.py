@@ -0,0 +1,178 @@
+import heapq
+import math
+import os
+import pickle
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Hashable, List, Tuple
+import logging
+
+from langchain.schema import Document
+
+from app.db.doc_table import doc_table
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_FILE = "bm25_index.pkl"
+
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i if in is it its me my of on or so that "
+    "the their this to was we were what when with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lower-cased terms, dropping stopwords."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over document page content.
+
+    Postings are stored per term as two parallel typed arrays (document ids
+    as uint32 and term frequencies as uint16), which keeps the index a small
+    fraction of the size of a dict-of-dicts layout. Document text lives in
+    the shared doc table; the index only maps its positions to doc ids, and
+    writes the text into its pickle so the table can be refilled on load.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """Initialize an empty index with the given BM25 parameters."""
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: Dict[str, int] = {}
+        self.posting_ids: List[array] = []
+        self.posting_freqs: List[array] = []
+        self.doc_lengths = array("H")
+        self.doc_ids = array("I")  # Doc table id of each indexed position
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["doc_ids"]
+        state["contents"] = [doc_table.content(doc_id) for doc_id in self.doc_ids]
+        state["answers"] = [doc_table.answer(doc_id) for doc_id in self.doc_ids]
+        state["token_metadata"] = [doc_table.token_metadata(doc_id) for doc_id in self.doc_ids]
+        return state
+
+    def __setstate__(self, state: dict):
+        contents = state.pop("contents")
+        answers = state.pop("answers")
+        # Indexes pickled before token counts were stored have none
+        token_metadata = state.pop("token_metadata", None) or [{}] * len(contents)
+        self.__dict__.update(state)
+        self.doc_ids = array("I", (
+            doc_table.intern(content, {"answer": answer, **tokens})
+            for content, answer, tokens in zip(contents, answers, token_metadata)
+        ))
+
+    def add_documents(self, documents: List[Document]):
+        """Index documents, appending them after the existing ones."""
+        for doc in documents:
+            position = len(self.doc_ids)
+            terms = Counter(tokenize(doc.page_content))
+            length = sum(terms.values())
+
+            for term, freq in terms.items():
+                term_id = self.vocabulary.get(term)
+                if term_id is None:
+                    term_id = len(self.posting_ids)
+                    self.vocabulary[term] = term_id
+                    self.posting_ids.append(array("I"))
+                    self.posting_freqs.append(array("H"))
+                self.posting_ids[term_id].append(position)
+                self.posting_freqs[term_id].append(min(freq, 0xFFFF))
+
+            self.doc_lengths.append(min(length, 0xFFFF))
+            self.total_length += length
+            self.doc_ids.append(doc_table.intern_document(doc))
+
+        logger.info(f"BM25 index now contains {len(self)} documents and {len(self.vocabulary)} terms")
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Score documents against a query with BM25.
+
+        Args:
+            query: The query text
+            k: Number of results to return
+
+        Returns:
+            List of (doc table id, score) tuples, best first
+        """
+        num_docs = len(self)
+        if num_docs == 0:
+            return []
+
+        avg_length = self.total_length / num_docs or 1.0
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            ids = self.posting_ids[term_id]
+            freqs = self.posting_freqs[term_id]
+            idf = math.log(1 + (num_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+
+            for position, freq in zip(ids, freqs):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[position] / avg_length)
+                scores[position] = scores.get(position, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.doc_ids[position], score) for position, score in top]
+
+    def postings_size_bytes(self) -> int:
+        """Get the memory used by the posting arrays, document lengths and doc ids."""
+        postings = sum(ids.itemsize * len(ids) + freqs.itemsize * len(freqs)
+                       for ids, freqs in zip(self.posting_ids, self.posting_freqs))
+        return postings + self.doc_lengths.itemsize * len(self.doc_lengths) + self.doc_ids.itemsize * len(self.doc_ids)
+
+    def save(self, persist_directory: str) -> str:
+        """Persist the index next to the vector index."""
+        path = os.path.join(persist_directory, LEXICAL_INDEX_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        logger.info(f"BM25 index persisted to {path}")
+        return path
+
+    @classmethod
+    def load(cls, persist_directory: str) -> "BM25Index":
+        """Load a persisted index, or return an empty one if none exists."""
+        path = os.path.join(persist_directory, LEXICAL_INDEX_FILE)
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "rb") as f:
+                index = pickle.load(f)
+            logger.info(f"Loaded BM25 index with {len(index)} documents from {path}")
+            return index
+        except Exception as e:
+            logger.warning(f"Could not load BM25 index from {path}: {str(e)}")
+            return cls()
+
+
+def reciprocal_rank_fusion(rankings: List[List[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """
+    Merge several rankings of keys with reciprocal-rank fusion.
+
+    Args:
+        rankings: Lists of keys, each ordered best first
+        k: RRF damping constant
+
+    Returns:
+        List of (key, fused score) tuples, best first
+    """
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,304 @@
+"""
+Topic shards of the vector index with a centroid router.
+
+Usage:
+    python -m app.db.sharded_index build --shards 8
+    python -m app.db.sharded_index info
+"""
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from app.db.doc_table import Hit, doc_table
+from app.utils.metrics import metrics
+from app.utils.tracing import propagate
+
+logger = logging.getLogger(__name__)
+
+# Sharding configuration from environment variables
+INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", 0))  # Shards built at ingestion, 0 disables sharding
+SHARD_PROBES = int(os.getenv("SHARD_PROBES", 2))  # Shards searched per query
+SHARDED_SEARCH_ENABLED = os.getenv("SHARDED_SEARCH_ENABLED", "true").lower() == "true"
+SHARD_SEARCH_THREADS = int(os.getenv("SHARD_SEARCH_THREADS", 4))  # Threads fanning out to shards
+
+SHARD_META_FILE = "shards.json"
+SHARD_CENTROIDS_FILE = "shard_centroids.npy"
+SHARD_ADD_BATCH = 5000  # Stays well below Chroma's maximum batch size
+
+# One fan-out pool per process, shared by every index version loaded over hot-swaps
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _shard_executor() -> ThreadPoolExecutor:
+    """Get the process-wide pool querying shards in parallel, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SHARD_SEARCH_THREADS, thread_name_prefix="shard-search")
+        return _executor
+
+
+def _reset_executor():
+    """Drop the pool in a forked child; its threads do not survive fork."""
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+# Executor threads do not survive fork (e.g. the pre-fork launcher)
+os.register_at_fork(after_in_child=_reset_executor)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 25, seed: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means over embedding vectors.
+
+    Args:
+        vectors: Matrix of embeddings, one per row
+        n_clusters: Number of clusters
+        iterations: Maximum number of assignment/update rounds
+        seed: Random seed for the initial centroids
+
+    Returns:
+        tuple: (unit-length centroids, cluster label per row)
+    """
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    n_clusters = max(1, min(n_clusters, len(vectors)))
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)]
+
+    labels = np.argmax(vectors @ centroids.T, axis=1)
+    for _ in range(iterations):
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=n_clusters)
+
+        # Reseed empty clusters with random points so every shard gets documents
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+
+        centroids = _normalize(sums)
+        new_labels = np.argmax(vectors @ centroids.T, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    return centroids, labels
+
+
+class ShardedIndex:
+    """
+    The vector index partitioned into topic shards.
+
+    Shards are built from the embeddings already stored in the flat
+    collection by clustering them with k-means, one Chroma collection per
+    cluster. A query is routed to the SHARD_PROBES shards whose centroids are
+    most similar to its embedding; those shards are searched in parallel and
+    their hits merged into a global top-k by distance, so each query only
+    scans a fraction of the corpus.
+    """
+
+    def __init__(self, client, persist_directory: str, collection_name: str):
+        """
+        Load the shard layout persisted next to the flat index, if any.
+
+        Args:
+            client: Chroma client holding the collections
+            persist_directory: Directory of the vector index
+            collection_name: Name of the flat collection the shards are built from
+        """
+        self.client = client
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self.centroids: Optional[np.ndarray] = None
+        self.sizes: List[int] = []
+        self.shards = []
+
+        meta_path = os.path.join(persist_directory, SHARD_META_FILE)
+        centroids_path = os.path.join(persist_directory, SHARD_CENTROIDS_FILE)
+        if not (os.path.exists(meta_path) and os.path.exists(centroids_path)):
+            return
+
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.centroids = np.load(centroids_path)
+            self.sizes = meta["sizes"]
+            self.shards = [client.get_collection(name) for name in meta["collections"]]
+            logger.info(f"Loaded {len(self.shards)} index shards with sizes {self.sizes}")
+        except Exception as e:
+            logger.warning(f"Could not load index shards, using the flat index: {str(e)}")
+            self.centroids, self.sizes, self.shards = None, [], []
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether queries should be served from the shards."""
+        return SHARDED_SEARCH_ENABLED and len(self.shards) > 0
+
+    def _shard_name(self, shard_id: int) -> str:
+        return f"{self.collection_name}_shard_{shard_id}"
+
+    def rebuild(self, source_collection, n_shards: int):
+        """
+        Re-partition the flat collection into shards.
+
+        Args:
+            source_collection: The flat Chroma collection to partition
+            n_shards: Number of shards to build
+        """
+        data = source_collection.get(include=["embeddings", "documents", "metadatas"])
+        if not data["ids"]:
+            logger.warning("Flat collection is empty, not building shards")
+            return
+
+        embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+        centroids, labels = kmeans(embeddings, n_shards)
+        logger.info(f"Partitioning {len(embeddings)} documents into {len(centroids)} shards")
+
+        for i in range(max(len(self.shards), len(centroids))):
+            try:
+                self.client.delete_collection(self._shard_name(i))
+            except Exception:
+                pass
+
+        shards, sizes = [], []
+        for shard_id in range(len(centroids)):
+            rows = np.flatnonzero(labels == shard_id)
+            shard = self.client.create_collection(self._shard_name(shard_id), metadata=source_collection.metadata)
+            for start in range(0, len(rows), SHARD_ADD_BATCH):
+                batch = rows[start:start + SHARD_ADD_BATCH]
+                shard.add(
+                    ids=[data["ids"][i] for i in batch],
+                    embeddings=embeddings[batch].tolist(),
+                    documents=[data["documents"][i] for i in batch],
+                    metadatas=[data["metadatas"][i] for i in batch]
+                )
+            shards.append(shard)
+            sizes.append(len(rows))
+
+        self._save(centroids, sizes)
+        self.centroids, self.sizes, self.shards = centroids, sizes, shards
+        logger.info(f"Built {len(shards)} index shards with sizes {sizes}")
+
+    def _save(self, centroids: np.ndarray, sizes: List[int]):
+        """Persist the centroids and shard layout atomically."""
+        centroids_path = os.path.join(self.persist_directory, SHARD_CENTROIDS_FILE)
+        with open(centroids_path + ".tmp", "wb") as f:
+            np.save(f, centroids)
+        os.replace(centroids_path + ".tmp", centroids_path)
+
+        meta_path = os.path.join(self.persist_directory, SHARD_META_FILE)
+        meta = {"collections": [self._shard_name(i) for i in range(len(sizes))], "sizes": sizes}
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def route(self, query_embeddings: Sequence[Sequence[float]], n_probe: int = SHARD_PROBES) -> np.ndarray:
+        """
+        Pick the shards to search for each query.
+
+        Returns:
+            Matrix of shard ids, one row of n_probe shards per query, most similar first
+        """
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        similarities = queries @ self.centroids.T
+        n_probe = max(1, min(n_probe, len(self.shards)))
+        return np.argsort(-similarities, axis=1)[:, :n_probe]
+
+    def search(self, query_embedding: Sequence[float], k: int = 5, n_probe: int = SHARD_PROBES) -> List[Hit]:
+        """Search the routed shards for one query embedding."""
+        return self.search_many([query_embedding], k=k, n_probe=n_probe)[0]
+
+    def search_many(self, query_embeddings: Sequence[Sequence[float]], k: int = 5, n_probe: int = SHARD_PROBES) -> List[List[Hit]]:
+        """
+        Search the routed shards for many query embeddings.
+
+        Queries routed to the same shard are sent in one multi-query call,
+        and the shards are queried in parallel.
+
+        Args:
+            query_embeddings: One embedding per query
+            k: Number of documents to retrieve per query
+            n_probe: Number of shards searched per query
+
+        Returns:
+            One list of hits per query, best first
+        """
+        embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        routes = self.route(embeddings, n_probe)
+        by_shard: Dict[int, List[int]] = {}
+        for query_index, shard_ids in enumerate(routes):
+            for shard_id in shard_ids:
+                by_shard.setdefault(int(shard_id), []).append(query_index)
+
+        def query_shard(shard_id: int):
+            query_indices = by_shard[shard_id]
+            n_results = min(k, self.sizes[shard_id])
+            if n_results == 0:
+                return shard_id, None
+            return shard_id, self.shards[shard_id].query(
+                query_embeddings=embeddings[query_indices].tolist(),
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"]
+            )
+
+        if len(by_shard) == 1:
+            shard_results = [query_shard(next(iter(by_shard)))]
+        else:
+            shard_results = list(_shard_executor().map(propagate(query_shard), by_shard))
+
+        merged: List[List[Hit]] = [[] for _ in range(len(embeddings))]
+        for shard_id, results in shard_results:
+            if results is None:
+                continue
+            for row, query_index in enumerate(by_shard[shard_id]):
+                merged[query_index].extend(
+                    Hit(doc_table.intern(content, metadata), float(distance))
+                    for content, metadata, distance in zip(
+                        results["documents"][row], results["metadatas"][row], results["distances"][row]
+                    )
+                )
+
+        metrics.increment("sharded_searches", len(embeddings))
+        metrics.increment("shard_queries", len(by_shard))
+        return [sorted(hits, key=lambda hit: hit.distance)[:k] for hits in merged]
+
+
+def main():
+    from app.db.vector_store import VectorStore
+
+    parser = argparse.ArgumentParser(description="Manage the topic shards of the vector index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Partition the flat index into shards")
+    build_parser.add_argument("--shards", type=int, default=INDEX_SHARDS or 8, help="Number of shards")
+    subparsers.add_parser("info", help="Show the current shard layout")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    vector_store = VectorStore()
+
+    if args.command == "build":
+        vector_store.sharded_index.rebuild(vector_store.db._collection, args.shards)
+    print(f"Shards: {len(vector_store.sharded_index)}, sizes: {vector_store.sharded_index.sizes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,36 @@
 from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.schema import Document
 import os
-from typing import List, Tuple
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple
 import logging
 
+from app.db.doc_table import Hit, doc_table
+from app.db.embeddings import create_embedding_model
+from app.db.index_versions import (
+    INDEX_VERSION_CHECK_INTERVAL, POINTER_FILE, VERSIONS_DIR, IndexVersion,
+    allocate_version, list_versions, prune_versions, read_pointer, version_path, write_pointer
+)
+from app.db.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.db.sharded_index import INDEX_SHARDS, ShardedIndex
+from app.utils.cache_keys import bump_cache_version
+from app.utils.data_loader import load_csv_data
+from app.utils.metrics import metrics
+from app.utils.tracing import annotate, propagate, span
+
 logger = logging.getLogger(__name__)
 
+# Retrieval configuration from environment variables
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")  # "vector", "hybrid" or "lexical"
+RRF_K = int(os.getenv("RRF_K", 60))  # Reciprocal-rank fusion damping constant
+# Switch to lexical-only retrieval while this many query embeddings are in flight (0 disables)
+LEXICAL_FALLBACK_INFLIGHT = int(os.getenv("LEXICAL_FALLBACK_INFLIGHT", 0))
+INGEST_MAX_DOCUMENTS = int(os.getenv("INGEST_MAX_DOCUMENTS", 2000))  # Documents add_documents indexes, 0 for all
+
 class VectorStore:
     """Vector store for document retrieval."""
     
@@ -14,30 +38,87 @@ class VectorStore:
         """Initialize the vector store with the specified embedding model."""
         self.persist_directory = persist_directory
         self.collection_name = collection_name
-        self.embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.embedding_model = create_embedding_model()
+        self.retrieval_mode = RETRIEVAL_MODE
+        self._search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vector-search")
+        self._inflight_embeddings = 0
+        self._inflight_lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._rebuild_status = {"state": "idle"}
+        self._reload_lock = threading.Lock()
+        self._last_version_check = time.monotonic()
         
         # Create the persist directory if it doesn't exist
         os.makedirs(self.persist_directory, exist_ok=True)
         
-        # Initialize the vector store
-        self.db = Chroma(
-            persist_directory=self.persist_directory,
-            embedding_function=self.embedding_model,
-            collection_name=self.collection_name
-        )
+        # Open the current index version; searches read this reference without locking
+        pointer = read_pointer(self.persist_directory)
+        self._current = self._open_version(pointer["current"])
+        self._previous_name = pointer.get("previous")
         
         # Log the collection count on initialization
         try:
             collection_count = self.db._collection.count()
-            logger.info(f"Vector store initialized with {collection_count} documents")
+            logger.info(f"Vector store initialized with {collection_count} documents (index version {self._current.name})")
             print(f"Vector store initialized with {collection_count} documents")
         except Exception as e:
             logger.warning(f"Could not get collection count: {str(e)}")
             print(f"WARNING: Could not get collection count: {str(e)}")
     
+    @property
+    def version_name(self) -> str:
+        """The name of the index version serving queries."""
+        return self._current.name
+    
+    @property
+    def db(self):
+        """The Chroma collection wrapper of the current index version."""
+        return self._current.db
+    
+    @property
+    def lexical_index(self) -> BM25Index:
+        """The BM25 index of the current index version."""
+        return self._current.lexical_index
+    
+    @property
+    def sharded_index(self) -> ShardedIndex:
+        """The topic shards of the current index version."""
+        return self._current.sharded_index
+    
+    def _open_version(self, name: str) -> IndexVersion:
+        """Open the vector, lexical and sharded indexes of a version."""
+        path = version_path(self.persist_directory, name)
+        db = Chroma(
+            persist_directory=path,
+            embedding_function=self.embedding_model,
+            collection_name=self.collection_name
+        )
+        return IndexVersion(
+            name=name,
+            path=path,
+            db=db,
+            # Load the BM25 index persisted alongside the vector index
+            lexical_index=BM25Index.load(path),
+            # Topic shards built from the flat collection, if ingestion created them
+            sharded_index=ShardedIndex(db._client, path, self.collection_name),
+            loaded_at=datetime.now().isoformat()
+        )
+    
     def add_documents(self, documents: List[Document]):
-        documents=documents[:2000]
-        """Add documents to the vector store in batches to avoid size limits."""
+        """Add documents to the current index version in batches to avoid size limits."""
+        if INGEST_MAX_DOCUMENTS and len(documents) > INGEST_MAX_DOCUMENTS:
+            logger.warning(
+                f"Indexing only the first {INGEST_MAX_DOCUMENTS} of {len(documents)} documents "
+                f"(INGEST_MAX_DOCUMENTS; set it to 0 to index all)"
+            )
+            documents = documents[:INGEST_MAX_DOCUMENTS]
+        self._index_documents(self._current, documents)
+        
+        # Cached answers were computed against the old index
+        bump_cache_version("documents added to the vector store")
+    
+    def _index_documents(self, version: IndexVersion, documents: List[Document]):
+        """Add documents to the indexes of a version in batches to avoid size limits."""
         try:
             # ChromaDB has a batch size limit of 41666 documents
             MAX_BATCH_SIZE = 20000  # Using 40k to be safe
@@ -46,30 +127,7 @@ class VectorStore:
             logger.info(f"Adding {total_docs} documents to Chroma vector store in batches...")
             print(f"Adding {total_docs} documents to Chroma vector store in batches...")
             
-            # Process first batch to initialize or use existing collection
-            first_batch_size = min(MAX_BATCH_SIZE, total_docs)
-            first_batch = documents[:first_batch_size]
-            
-            # For the first batch, either initialize or add to the existing collection
-            if hasattr(self, 'db') and self.db is not None:
-                # If db already exists, add documents to it
-                self.db.add_documents(documents=first_batch)
-            else:
-                # Initialize the db with the first batch
-                self.db = Chroma.from_documents(
-                    documents=first_batch,
-                    embedding=self.embedding_model,
-                    persist_directory=self.persist_directory,
-                    collection_name=self.collection_name
-                )
-            
-            # Log progress
-            progress = min(first_batch_size / total_docs * 100, 100)
-            logger.info(f"Progress: {progress:.2f}% ({first_batch_size}/{total_docs} documents processed)")
-            print(f"Progress: {progress:.2f}% ({first_batch_size}/{total_docs} documents processed)")
-            
-            # Process remaining batches
-            for i in range(first_batch_size, total_docs, MAX_BATCH_SIZE):
+            for i in range(0, total_docs, MAX_BATCH_SIZE):
                 end_idx = min(i + MAX_BATCH_SIZE, total_docs)
                 batch = documents[i:end_idx]
                 batch_size = len(batch)
@@ -78,10 +136,7 @@ class VectorStore:
                 print(f"Processing batch {i//MAX_BATCH_SIZE + 1}: documents {i+1} to {end_idx} ({batch_size} documents)")
                 
                 # Add this batch to the existing db
-                self.db.add_documents(documents=batch)
-                
-                # Optionally persist after each batch for safety
-                # self.db.persist()
+                version.db.add_documents(documents=batch)
                 
                 # Log progress
                 progress = min(end_idx / total_docs * 100, 100)
@@ -89,13 +144,21 @@ class VectorStore:
                 print(f"Progress: {progress:.2f}% ({end_idx}/{total_docs} documents processed)")
             
             # Persist the database
-            self.db.persist()
+            version.db.persist()
             logger.info("All documents added successfully and database persisted")
             print("All documents added successfully and database persisted")
             
+            # Index the same documents for lexical retrieval
+            version.lexical_index.add_documents(documents)
+            version.lexical_index.save(version.path)
+            
+            # Re-partition the shards so they include the new documents
+            if INDEX_SHARDS > 0 or len(version.sharded_index) > 0:
+                version.sharded_index.rebuild(version.db._collection, INDEX_SHARDS or len(version.sharded_index))
+            
             # Verify document count after adding
             try:
-                collection_count = self.db._collection.count()
+                collection_count = version.db._collection.count()
                 logger.info(f"Vector store now contains {collection_count} documents")
                 print(f"Vector store now contains {collection_count} documents")
             except Exception as e:
@@ -106,6 +169,164 @@ class VectorStore:
             logger.error(f"Error adding documents: {str(e)}", exc_info=True)
             print(f"ERROR: Failed to add documents: {str(e)}")
             raise
+    
+    def start_rebuild(self, csv_path: str, incremental: bool = False) -> dict:
+        """
+        Build a new index version in a background thread and swap it in when ready.
+
+        A full rebuild indexes the CSV into an empty version. An incremental
+        rebuild copies the current version and adds the CSV's rows (the
+        delta) to the copy. Searches keep using the current version until the
+        new one is complete.
+
+        Args:
+            csv_path: CSV with input/output columns to index
+            incremental: Add to a copy of the current version instead of starting empty
+
+        Returns:
+            dict: The rebuild status
+
+        Raises:
+            RuntimeError: If a rebuild is already running in this process
+        """
+        if not self._rebuild_lock.acquire(blocking=False):
+            raise RuntimeError("An index rebuild is already running")
+        
+        self._rebuild_status = {
+            "state": "building",
+            "source": csv_path,
+            "incremental": incremental,
+            "base_version": self._current.name,
+            "started_at": datetime.now().isoformat()
+        }
+        threading.Thread(
+            target=self._run_rebuild, args=(csv_path, incremental), name="index-rebuild", daemon=True
+        ).start()
+        return self.rebuild_status()
+    
+    def _run_rebuild(self, csv_path: str, incremental: bool):
+        """Build, open and swap in a new index version."""
+        status = dict(self._rebuild_status)
+        start = time.perf_counter()
+        path = None
+        try:
+            documents = load_csv_data(csv_path)
+            base = self._current
+            name = allocate_version(self.persist_directory)
+            path = version_path(self.persist_directory, name)
+            logger.info(f"Building index version {name} from {csv_path} ({len(documents)} documents, incremental={incremental})")
+            
+            if incremental:
+                shutil.copytree(base.path, path, dirs_exist_ok=True, ignore=shutil.ignore_patterns(VERSIONS_DIR, POINTER_FILE))
+            
+            version = self._open_version(name)
+            self._index_documents(version, documents)
+            self._swap(version, previous=base)
+            
+            status.update(
+                state="ready",
+                version=name,
+                documents=version.db._collection.count(),
+                duration_seconds=round(time.perf_counter() - start, 2)
+            )
+            metrics.increment("index_rebuilds")
+        except Exception as e:
+            logger.error(f"Index rebuild failed: {str(e)}", exc_info=True)
+            status.update(state="failed", error=str(e))
+            if path is not None and self._current.path != path:
+                shutil.rmtree(path, ignore_errors=True)
+            metrics.increment("index_rebuild_failures")
+        finally:
+            status["finished_at"] = datetime.now().isoformat()
+            self._rebuild_status = status
+            self._rebuild_lock.release()
+    
+    def rollback(self) -> str:
+        """
+        Swap back to the version that was current before the last swap.
+
+        Returns:
+            str: Name of the version now serving
+
+        Raises:
+            RuntimeError: If there is no previous version or a rebuild is running
+        """
+        if not self._rebuild_lock.acquire(blocking=False):
+            raise RuntimeError("An index rebuild is running")
+        try:
+            previous_name = self._previous_name
+            if not previous_name or not os.path.isdir(version_path(self.persist_directory, previous_name)):
+                raise RuntimeError("No previous index version to roll back to")
+            
+            logger.info(f"Rolling back index from {self._current.name} to {previous_name}")
+            self._swap(self._open_version(previous_name), previous=self._current)
+            metrics.increment("index_rollbacks")
+            return previous_name
+        finally:
+            self._rebuild_lock.release()
+    
+    def _swap(self, version: IndexVersion, previous: IndexVersion):
+        """Publish a new current version to this process and to the other workers."""
+        write_pointer(self.persist_directory, version.name, previous.name)
+        # A single reference assignment: searches that already read the old version finish on it
+        self._current = version
+        self._previous_name = previous.name
+        logger.info(f"Index version {version.name} is now serving (previous: {previous.name})")
+        
+        prune_versions(self.persist_directory, protect=(version.name, previous.name))
+        bump_cache_version(f"index version {version.name} swapped in")
+    
+    def rebuild_status(self) -> dict:
+        """Get the state of the last rebuild and the versions currently in use."""
+        return {
+            **self._rebuild_status,
+            "current_version": self._current.name,
+            "previous_version": self._previous_name,
+            "current_loaded_at": self._current.loaded_at,
+            "versions_on_disk": list_versions(self.persist_directory),
+            "doc_table": doc_table.stats()
+        }
+    
+    def _refresh_version(self) -> IndexVersion:
+        """
+        Get the current version, picking up swaps made by other workers.
+
+        At most every INDEX_VERSION_CHECK_INTERVAL seconds the pointer file is
+        checked; a changed version is opened on a background thread so the
+        request that noticed it is not delayed.
+        """
+        now = time.monotonic()
+        if now - self._last_version_check >= INDEX_VERSION_CHECK_INTERVAL:
+            self._last_version_check = now
+            pointer = read_pointer(self.persist_directory)
+            if pointer["current"] != self._current.name and not self._rebuild_lock.locked() and self._reload_lock.acquire(blocking=False):
+                threading.Thread(target=self._reload_version, args=(pointer,), name="index-reload", daemon=True).start()
+        return self._current
+    
+    def _reload_version(self, pointer: dict):
+        """Open the version another worker swapped in and make it current here."""
+        try:
+            logger.info(f"Loading index version {pointer['current']} published by another worker")
+            self._current = self._open_version(pointer["current"])
+            self._previous_name = pointer.get("previous")
+        except Exception as e:
+            logger.error(f"Could not load index version {pointer['current']}: {str(e)}", exc_info=True)
+        finally:
+            self._reload_lock.release()
+        
+    def health_check(self) -> dict:
+        """
+        Check the current index version answers a count query.
+
+        Returns:
+            dict: The serving version and its document counts
+        """
+        version = self._current
+        return {
+            "version": version.name,
+            "documents": version.db._collection.count(),
+            "lexical_documents": len(version.lexical_index),
+        }
         
     def get_retriever(self, k=5):
         """Get a retriever for the vector store."""
@@ -218,4 +439,154 @@ class VectorStore:
         except Exception as e:
             print(f"ERROR in similarity search with score: {str(e)}")
             logger.error(f"Error in similarity search with score: {str(e)}", exc_info=True)
-            return [] 
\ No newline at end of file
+            return [] 
+    def search_with_score(self, query: str, k: int = 5, mode: Optional[str] = None) -> List[Hit]:
+        """
+        Retrieve documents with distances using the configured retrieval mode.
+
+        In hybrid mode the vector and BM25 searches run concurrently and are
+        merged with reciprocal-rank fusion. Retrieval falls back to
+        lexical-only while the embedding path is saturated, and to
+        vector-only if no lexical index has been built.
+
+        Args:
+            query: The query to search for
+            k: Number of documents to retrieve
+            mode: "vector", "hybrid" or "lexical"; defaults to RETRIEVAL_MODE
+
+        Returns:
+            List of hits, best first; see app.db.doc_table.Hit
+        """
+        # Every step of this search uses the same index version, even if a new one is swapped in meanwhile
+        version = self._refresh_version()
+        mode = mode or self.retrieval_mode
+        if len(version.lexical_index) == 0:
+            mode = "vector"
+        elif mode != "lexical" and self._embedding_saturated():
+            logger.info("Embedding path saturated, using lexical-only retrieval")
+            metrics.increment("lexical_fallbacks")
+            mode = "lexical"
+
+        metrics.increment(f"retrieval_{mode}")
+        annotate(mode=mode, index_version=version.name)
+        if mode == "vector":
+            return self._vector_search_with_score(query, k, version)
+        if mode == "lexical":
+            return self.lexical_search_with_score(query, k, version)
+
+        # Embed and search on a worker thread while BM25 runs on this one
+        vector_future = self._search_executor.submit(propagate(self._vector_search_with_score), query, k, version)
+        lexical_results = self.lexical_search_with_score(query, k, version)
+        vector_results = vector_future.result()
+        return self._fuse_results(vector_results, lexical_results, k)
+
+    def batch_search_with_score(self, queries: List[str], k: int = 5, mode: Optional[str] = None) -> List[List[Hit]]:
+        """
+        Retrieve documents for many queries at once.
+
+        All queries are embedded in one batched forward pass and searched with
+        a single multi-query call to the collection. In hybrid mode each
+        query's vector results are fused with its BM25 results.
+
+        Args:
+            queries: The queries to search for
+            k: Number of documents to retrieve per query
+            mode: "vector", "hybrid" or "lexical"; defaults to RETRIEVAL_MODE
+
+        Returns:
+            One list of hits per query, best first
+        """
+        if not queries:
+            return []
+
+        version = self._refresh_version()
+        mode = mode or self.retrieval_mode
+        if len(version.lexical_index) == 0:
+            mode = "vector"
+        if mode == "lexical":
+            return [self.lexical_search_with_score(query, k, version) for query in queries]
+
+        query_embeddings = self.embedding_model.embed_documents(list(queries))
+        if version.sharded_index.enabled:
+            all_vector_results = version.sharded_index.search_many(query_embeddings, k=k)
+        else:
+            all_vector_results = self._query_collection(version, query_embeddings, k)
+
+        batch_results = []
+        for query, vector_results in zip(queries, all_vector_results):
+            if mode == "hybrid":
+                vector_results = self._fuse_results(vector_results, self.lexical_search_with_score(query, k, version), k)
+            batch_results.append(vector_results)
+
+        metrics.increment(f"retrieval_batch_{mode}", len(queries))
+        return batch_results
+
+    def lexical_search_with_score(self, query: str, k: int = 5, version: Optional[IndexVersion] = None) -> List[Hit]:
+        """
+        Retrieve documents with the BM25 index.
+
+        Args:
+            query: The query to search for
+            k: Number of documents to retrieve
+            version: Index version to search; defaults to the current one
+
+        Returns:
+            List of hits with their BM25 score and no distance, best first
+        """
+        lexical_index = (version or self._current).lexical_index
+        with span("lexical_search", k=k) as lexical_span:
+            hits = lexical_index.search(query, k=k)
+            lexical_span.set(hits=len(hits))
+        return [Hit(doc_id, None, score) for doc_id, score in hits]
+
+    def _vector_search_with_score(self, query: str, k: int, version: IndexVersion) -> List[Hit]:
+        """Run a vector search on a version while tracking the number of in-flight embeddings."""
+        with self._inflight_lock:
+            self._inflight_embeddings += 1
+        try:
+            with span("embed"):
+                query_embedding = self.embedding_model.embed_query(query)
+            with span("vector_search", k=k, sharded=version.sharded_index.enabled):
+                if version.sharded_index.enabled:
+                    return version.sharded_index.search(query_embedding, k=k)
+                return self._query_collection(version, [query_embedding], k)[0]
+        except Exception as e:
+            logger.error(f"Error in vector search on index version {version.name}: {str(e)}", exc_info=True)
+            return []
+        finally:
+            with self._inflight_lock:
+                self._inflight_embeddings -= 1
+
+    @staticmethod
+    def _query_collection(version: IndexVersion, query_embeddings: List[List[float]], k: int) -> List[List[Hit]]:
+        """Search a version's flat collection, returning doc ids rather than LangChain documents."""
+        results = version.db._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                Hit(doc_table.intern(content, metadata), float(distance))
+                for content, metadata, distance in zip(
+                    results["documents"][i], results["metadatas"][i], results["distances"][i]
+                )
+            ]
+            for i in range(len(query_embeddings))
+        ]
+
+    def _embedding_saturated(self) -> bool:
+        """Check whether too many query embeddings are already in flight."""
+        return LEXICAL_FALLBACK_INFLIGHT > 0 and self._inflight_embeddings >= LEXICAL_FALLBACK_INFLIGHT
+
+    def _fuse_results(self, vector_results: List[Hit], lexical_results: List[Hit], k: int) -> List[Hit]:
+        """
+        Merge vector and lexical results with reciprocal-rank fusion.
+
+        Documents keep their vector distance when the vector search found
+        them (None otherwise) and carry the fused score.
+        """
+        distances = {hit.doc_id: hit.distance for hit in vector_results}
+        rankings = [[hit.doc_id for hit in lexical_results], [hit.doc_id for hit in vector_results]]
+        fused = reciprocal_rank_fusion(rankings, k=RRF_K)
+        return [Hit(doc_id, distances.get(doc_id), score) for doc_id, score in fused[:k]]
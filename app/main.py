@@ -1,13 +1,15 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uuid
 import os
 import torch
-from app.api.routes import router as api_router
+from app.api.routes import cache_warmer, health_prober, router as api_router
+from app.api.admin import router as admin_router
 from app.core.session_manager import SessionManager
+from app.services.cache_warmer import CACHE_WARM_ENABLED
 # from app.utils.cache_utils import init_cache
 from app.utils.logging_config import logger
 
@@ -50,9 +52,21 @@ async def health_check():
     logger.info("Health check endpoint called")
     return {"status": "healthy", "message": "API is running"}
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: answers immediately while the process is serving"""
+    return health_prober.live()
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: cached status of the LLM endpoint, index and session store"""
+    result = health_prober.ready()
+    return JSONResponse(result, status_code=200 if result["ready"] else 503)
+
 # Include API router
 logger.info("Including API router...")
 app.include_router(api_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
 
 # Root endpoint
 @app.get("/", response_class=HTMLResponse)
@@ -76,6 +90,18 @@ async def startup_event():
     logger.info(f"REDIS_PORT: {os.getenv('REDIS_PORT', 'not set')}")
     logger.info(f"GCS_BUCKET_NAME: {os.getenv('GCS_BUCKET_NAME', 'not set')}")
     
+    # Start probing dependencies in this worker
+    logger.info("Starting health prober...")
+    health_prober.start()
+    
+    # Warm this worker's caches with frequent past queries in the background
+    if CACHE_WARM_ENABLED:
+        try:
+            logger.info("Scheduling cache warming...")
+            cache_warmer.start()
+        except RuntimeError as e:
+            logger.warning(f"Not warming caches: {str(e)}")
+    
     # Initialize cache with retry logic
     # logger.info("Initializing cache...")
     # cache_initialized = init_cache(app)
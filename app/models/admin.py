@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+
+
+class IndexRebuildRequest(BaseModel):
+    """Request to build a new index version in the background."""
+    csv_path: str = Field(..., description="CSV with input/output columns, relative to the data directory")
+    incremental: bool = Field(False, description="Add the CSV's rows to a copy of the current version instead of rebuilding from scratch")
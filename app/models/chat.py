@@ -5,20 +5,73 @@ from typing import Optional, List, Dict, Any, Union
 class SimilarityScore(BaseModel):
     """Model for a document similarity score result."""
     content: str = Field(..., description="The content of the document")
-    score: float = Field(..., description="The similarity score")
+    score: Optional[float] = Field(None, description="Embedding distance to the query (lower is closer); null for documents found only by keyword search")
+    relevance: Optional[float] = Field(None, description="Rank-fusion (hybrid retrieval) or BM25 (lexical retrieval) score, higher is better")
     source: Optional[str] = Field(None, description="The source of the document")
     answer: Optional[str] = Field(None, description="The answer associated with this document")
 
 
+class ContextStats(BaseModel):
+    """Model for the context selection statistics of a request."""
+    candidates: int = Field(..., description="Number of documents retrieved as candidates")
+    selected: int = Field(..., description="Number of documents placed in the prompt")
+    dropped_by_distance: int = Field(0, description="Candidates dropped by the distance cutoff or score gap")
+    dropped_as_duplicate: int = Field(0, description="Candidates dropped as near-duplicates")
+    dropped_by_budget: int = Field(0, description="Candidates dropped by the token budget")
+    baseline_tokens: int = Field(0, description="Estimated context tokens without pruning")
+    context_tokens: int = Field(0, description="Estimated context tokens after pruning")
+    tokens_saved: int = Field(0, description="Estimated prompt tokens saved by pruning")
+
+
+class GenerationStats(BaseModel):
+    """Model for the token accounting of a generated response."""
+    tokens_generated: int = Field(..., description="Tokens the endpoint generated (estimated when not streaming)")
+    tokens_used: int = Field(..., description="Tokens that ended up in the response")
+    tokens_wasted: int = Field(0, description="Tokens generated after the answer was complete")
+    stop_reason: str = Field(..., description="Why generation ended: stop_sequence, complete, max_tokens or eos")
+
+
 class ChatRequest(BaseModel):
     """Chat request model."""
     input: str = Field(..., description="The input from the user")
     session_id: Optional[str] = Field(None, description="Session ID for the chat. If None, a new session will be created")
 
 
+class PrefetchRequest(BaseModel):
+    """Prefetch request model, sent by the UI while the user is typing."""
+    input: str = Field(..., description="The message typed so far")
+    session_id: str = Field(..., description="Session ID the message will be sent in")
+
+
+class PrefetchResponse(BaseModel):
+    """Prefetch response model."""
+    status: str = Field(..., description="queued, cached, too_short, busy or disabled")
+
+
 class ChatResponse(BaseModel):
     """Chat response model."""
     session_id: str = Field(..., description="Session ID for the chat")
     response: str = Field(..., description="The response from the LLM")
     similarity_scores: List[SimilarityScore] = Field(default_factory=list, description="List of similarity scores for the documents retrieved")
-    sources: List[str] = Field(default_factory=list, description="List of document sources") 
\ No newline at end of file
+    sources: List[str] = Field(default_factory=list, description="List of document sources")
+    context_stats: Optional[ContextStats] = Field(None, description="Context selection statistics for this request")
+    generation_stats: Optional[GenerationStats] = Field(None, description="Token accounting of the LLM generation for this request")
+    fast_path: bool = Field(False, description="Whether the response was served from a stored answer without calling the LLM") 
+
+
+class BatchChatRequest(BaseModel):
+    """Batch chat request model."""
+    inputs: List[str] = Field(..., description="The user inputs to answer")
+    session_ids: Optional[List[Optional[str]]] = Field(None, description="Optional session ID per input, used for chat history")
+    store_sessions: bool = Field(False, description="Whether to record the interactions in the chat sessions")
+    max_concurrency: Optional[int] = Field(None, description="Maximum number of concurrent LLM calls for this batch")
+
+
+class BatchChatResult(BaseModel):
+    """Result for one input of a batch chat request, streamed as a JSON line."""
+    index: int = Field(..., description="Position of the input in the request")
+    session_id: Optional[str] = Field(None, description="Session ID the interaction was recorded under, if any")
+    response: Optional[str] = Field(None, description="The response from the LLM")
+    fast_path: bool = Field(False, description="Whether the response was served from a stored answer")
+    similarity_scores: List[SimilarityScore] = Field(default_factory=list, description="Documents the response was based on")
+    error: Optional[str] = Field(None, description="Error message if this input failed")
@@ -0,0 +1,209 @@
+import csv
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+import logging
+
+from app.db.interaction_store import get_interaction_store
+from app.utils.metrics import metrics
+from app.utils.text_normalization import normalize_tweet
+
+logger = logging.getLogger(__name__)
+
+# Cache warming configuration from environment variables
+CACHE_WARM_ENABLED = os.getenv("CACHE_WARM_ENABLED", "false").lower() == "true"  # Every worker warms its own copy, multiplying LLM calls
+CACHE_WARM_ENTRIES = int(os.getenv("CACHE_WARM_ENTRIES", 100))  # Most frequent queries warmed
+CACHE_WARM_MIN_COUNT = int(os.getenv("CACHE_WARM_MIN_COUNT", 2))  # Times a query must have been asked to be warmed
+CACHE_WARM_MAX_SECONDS = float(os.getenv("CACHE_WARM_MAX_SECONDS", 300))  # Warming stops after this long
+CACHE_WARM_DELAY = float(os.getenv("CACHE_WARM_DELAY", 10))  # Seconds after startup before warming begins
+CACHE_WARM_CONCURRENCY = int(os.getenv("CACHE_WARM_CONCURRENCY", 2))  # Concurrent LLM calls while warming
+CACHE_WARM_HISTORY_ROWS = int(os.getenv("CACHE_WARM_HISTORY_ROWS", 100000))  # Most recent interactions mined
+CACHE_WARM_SOURCE = os.getenv("CACHE_WARM_SOURCE", "")  # CSV of past interactions; empty uses the interaction store
+CACHE_WARM_BACKOFF = 0.5  # Seconds to wait while live traffic has no spare capacity
+
+HISTORY_CSV = "chat_history.csv"
+
+
+def frequent_queries(user_inputs: Iterable[str], limit: int = CACHE_WARM_ENTRIES, min_count: int = CACHE_WARM_MIN_COUNT) -> List[Tuple[str, int]]:
+    """
+    Find the most frequently asked queries.
+
+    Queries are counted by their normalized text, so "@Delta my flight!!!"
+    and "my flight!!" count as the same query.
+
+    Args:
+        user_inputs: Past user messages
+        limit: Maximum number of queries returned
+        min_count: Times a query must occur to be returned
+
+    Returns:
+        List of (query, count) tuples, most frequent first; each query is the first raw message seen for it
+    """
+    counts = Counter()
+    examples = {}
+    for text in user_inputs:
+        if not isinstance(text, str):
+            continue
+        key = normalize_tweet(text)
+        if not key:
+            continue
+        counts[key] += 1
+        examples.setdefault(key, text)
+    return [(examples[key], count) for key, count in counts.most_common(limit) if count >= min_count]
+
+
+def load_user_inputs(source: str = CACHE_WARM_SOURCE, max_rows: int = CACHE_WARM_HISTORY_ROWS) -> Tuple[str, List[str]]:
+    """
+    Load recent user messages to mine for frequent queries.
+
+    Args:
+        source: CSV with a user_input column; if empty, the interaction store
+            is used when enabled, otherwise chat_history.csv
+
+    Returns:
+        tuple: (description of the source, messages)
+    """
+    if not source:
+        store = get_interaction_store()
+        if store is not None:
+            return "interaction_store", store.recent_user_inputs(max_rows)
+        source = HISTORY_CSV
+
+    if not os.path.isfile(source):
+        logger.info(f"No interaction history at {source}, nothing to warm")
+        return source, []
+    # Older rows were written with the platform encoding, so undecodable bytes are replaced
+    with open(source, newline="", encoding="utf-8", errors="replace") as f:
+        rows = deque((row.get("user_input") for row in csv.DictReader(f)), maxlen=max_rows)
+    return source, list(rows)
+
+
+class CacheWarmer:
+    """
+    Fills the caches with the answers to the most frequently asked queries.
+
+    Frequent queries are mined from past interactions, then their
+    embeddings are computed in one batch, and their retrieval and answer
+    run on a small worker pool, so the first users after a deploy or index
+    swap are answered from the response cache. Warming stops at
+    CACHE_WARM_MAX_SECONDS and waits while live traffic has no spare
+    capacity.
+    """
+
+    def __init__(
+        self,
+        chat_service,
+        busy: Callable[[], bool] = lambda: False,
+        entries: int = CACHE_WARM_ENTRIES,
+        max_seconds: float = CACHE_WARM_MAX_SECONDS,
+        concurrency: int = CACHE_WARM_CONCURRENCY,
+    ):
+        """
+        Initialize the warmer.
+
+        Args:
+            chat_service: The ChatService whose caches are warmed
+            busy: Whether live traffic currently needs the LLM capacity
+            entries: Number of frequent queries warmed
+            max_seconds: Time limit of one warming run
+            concurrency: Concurrent LLM calls while warming
+        """
+        self.chat_service = chat_service
+        self.busy = busy
+        self.entries = entries
+        self.max_seconds = max_seconds
+        self.concurrency = max(1, concurrency)
+        self._lock = threading.Lock()
+        self._status = {"state": "idle"}
+
+    def start(self, delay: float = CACHE_WARM_DELAY) -> dict:
+        """
+        Warm the caches in a background thread.
+
+        Args:
+            delay: Seconds to wait before warming begins
+
+        Returns:
+            dict: The warming status
+
+        Raises:
+            RuntimeError: If the response cache is disabled or a warming run is already in progress in this process
+        """
+        if not self.chat_service.response_cache.enabled:
+            raise RuntimeError("The response cache is disabled, so there is nothing to warm")
+        with self._lock:
+            if self._status["state"] in ("scheduled", "running"):
+                raise RuntimeError("Cache warming is already running")
+            self._status = {"state": "scheduled", "scheduled_at": datetime.now().isoformat()}
+        threading.Thread(target=self._run, args=(delay,), name="cache-warmer", daemon=True).start()
+        return self.status()
+
+    def status(self) -> dict:
+        """Get the state and counters of the last warming run."""
+        with self._lock:
+            return dict(self._status)
+
+    def _update(self, **fields):
+        with self._lock:
+            self._status.update(fields)
+
+    def _run(self, delay: float):
+        """Warm the caches, recording the outcome in the status."""
+        time.sleep(delay)
+        start = time.perf_counter()
+        self._update(state="running", started_at=datetime.now().isoformat())
+        try:
+            self.warm(deadline=time.monotonic() + self.max_seconds)
+            self._update(state="done")
+        except Exception as e:
+            logger.error(f"Cache warming failed: {str(e)}", exc_info=True)
+            self._update(state="failed", error=str(e))
+        finally:
+            elapsed = time.perf_counter() - start
+            self._update(seconds=round(elapsed, 3))
+            metrics.set_gauge("cache_warm_seconds", elapsed)
+            logger.info(f"Cache warming finished: {self.status()}")
+
+    def warm(self, deadline: Optional[float] = None):
+        """
+        Warm the embedding and response caches with the most frequent past queries.
+
+        Args:
+            deadline: time.monotonic() value at which warming stops
+        """
+        deadline = deadline if deadline is not None else time.monotonic() + self.max_seconds
+        source, user_inputs = load_user_inputs()
+        queries = [query for query, _ in frequent_queries(user_inputs, limit=self.entries)]
+        self._update(source=source, messages=len(user_inputs), candidates=len(queries), warmed=0, cached=0, skipped=0, failed=0)
+        if not queries:
+            return
+
+        # One forward pass embeds every query; retrievals then hit the query embedding cache
+        embedding_model = self.chat_service.vector_store.embedding_model
+        if hasattr(embedding_model, "warm"):
+            self._update(embeddings=embedding_model.warm(queries))
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="cache-warm") as executor:
+            for outcome in executor.map(lambda query: self._warm_query(query, deadline), queries):
+                with self._lock:
+                    self._status[outcome] += 1
+                metrics.increment(f"cache_warm_{outcome}")
+
+    def _warm_query(self, query: str, deadline: float) -> str:
+        """Retrieve and answer one query unless out of time; returns the status counter to bump."""
+        # Live traffic takes precedence over warming for the LLM
+        while self.busy():
+            if time.monotonic() >= deadline:
+                return "skipped"
+            time.sleep(CACHE_WARM_BACKOFF)
+        if time.monotonic() >= deadline:
+            return "skipped"
+        try:
+            return "warmed" if self.chat_service.warm_answer(query) else "cached"
+        except Exception as e:
+            logger.warning(f"Failed to warm cache for query {query!r}: {str(e)}")
+            return "failed"
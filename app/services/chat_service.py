@@ -1,13 +1,74 @@
 import uuid
-from operator import itemgetter
-from langchain.schema.runnable import RunnablePassthrough, RunnableLambda
-from langchain.schema.output_parser import StrOutputParser
-from typing import List, Tuple, Optional
+import time
+import os
+import json
+import hashlib
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Tuple, Optional
 
 from app.core.session_manager import SessionManager
 from app.core.llm import LLMManager
 from app.db.vector_store import VectorStore
 from app.core.prompts import get_rag_prompt_template
+from app.core.context_selection import CONTEXT_CANDIDATE_K, select_context
+from app.core.fast_path import FAST_PATH_ENABLED, find_fast_path_answer
+from app.core.prefetch import Prefetcher
+from app.core.response_cache import ResponseCache
+from app.core.generation import LLM_STREAMING, GenerationResult, collect_stream, finalize_response
+from app.db.doc_table import Hit, doc_table
+from app.utils.metrics import metrics
+from app.utils.single_flight import SingleFlight
+from app.utils.text_normalization import normalize_tweet
+from app.utils.tracing import annotate, span
+
+logger = logging.getLogger(__name__)
+
+# Smoothing factor for the moving average of LLM latency
+LLM_LATENCY_EWMA_ALPHA = 0.2
+
+# Batch configuration from environment variables
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 8))  # Concurrent LLM calls per batch
+BATCH_SEARCH_SIZE = int(os.getenv("BATCH_SEARCH_SIZE", 256))  # Queries embedded and searched together
+
+# Single-flight configuration from environment variables
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+# Also coalesce requests that carry chat history (keyed by a fingerprint of that history)
+SINGLE_FLIGHT_WITH_HISTORY = os.getenv("SINGLE_FLIGHT_WITH_HISTORY", "false").lower() == "true"
+
+
+@dataclass
+class ChatAnswer:
+    """The answer to a single query and the documents it was based on."""
+    response: str
+    documents: List[Hit] = field(default_factory=list)
+    context_stats: Optional[Dict[str, Any]] = None
+    generation_stats: Optional[Dict[str, Any]] = None
+    fast_path: bool = False
+    
+    def to_cache(self) -> Dict[str, Any]:
+        """Serialize for the response cache; documents are stored by content since doc ids are per process."""
+        return {
+            "response": self.response,
+            "documents": doc_table.score_records(self.documents),
+            "context_stats": self.context_stats,
+            "fast_path": self.fast_path,
+        }
+    
+    @classmethod
+    def from_cache(cls, value: Dict[str, Any]) -> "ChatAnswer":
+        """Rebuild an answer from the response cache."""
+        documents = [
+            Hit(doc_table.intern(record["content"], {"answer": record["answer"]}), record["score"], record.get("relevance"))
+            for record in value["documents"]
+        ]
+        return cls(
+            response=value["response"],
+            documents=documents,
+            context_stats=value.get("context_stats"),
+            fast_path=value.get("fast_path", False)
+        )
 
 
 class ChatService:
@@ -19,25 +80,18 @@ class ChatService:
         self.vector_store = VectorStore()
         self.llm_manager = LLMManager()
         self.llm = self.llm_manager.get_llm()
-        self.retriever = self.vector_store.get_retriever(k=5)
-        self.qa_chain = self._create_qa_chain()
-        
-    def _create_qa_chain(self):
-        """Create the question-answering chain."""
-        rag_prompt_template = get_rag_prompt_template()
-        
-        return (
-            {
-                "context": itemgetter("question") | self.retriever,
-                "question": itemgetter("question"),
-                "chat_history": RunnableLambda(lambda x: self.session_manager.get_history(x["session_id"]))
-            }
-            | rag_prompt_template
-            | self.llm
-            | StrOutputParser()
+        self.prompt_template = get_rag_prompt_template()
+        self.fast_path_enabled = FAST_PATH_ENABLED
+        self.llm_latency_ewma = None
+        self.single_flight = SingleFlight()
+        self.prefetcher = Prefetcher(
+            lambda text: self.get_similar_documents(text, k=CONTEXT_CANDIDATE_K),
+            lambda: self.vector_store.version_name
         )
-    
-    def get_similar_documents(self, query: str, k: int = 5) -> List[Tuple]:
+        # Scoped by index version so answers from before a swap in another worker are not served
+        self.response_cache = ResponseCache(scope=lambda: self.vector_store.version_name)
+        
+    def get_similar_documents(self, query: str, k: int = 5) -> List[Hit]:
         """
         Retrieve documents similar to the query with their similarity scores.
         
@@ -46,9 +100,9 @@ class ChatService:
             k: Number of documents to retrieve
             
         Returns:
-            List of (document, score) tuples
+            List of (doc id, score) tuples; see app.db.doc_table
         """
-        return self.vector_store.similarity_search_with_score(query, k=k)
+        return self.vector_store.search_with_score(query, k=k)
     
     def handle_query(self, query, session_id=None):
         """
@@ -65,16 +119,249 @@ class ChatService:
         if not session_id:
             session_id = str(uuid.uuid4())
         
-        # Get similar documents with scores
-        docs_and_scores = self.get_similar_documents(query)
+        chat_history = self.session_manager.get_history(session_id)
+        
+        # Answers to history-free queries do not depend on the session, so they are cached
+        cached = self.response_cache.get(query) if not chat_history else None
+        if cached is not None:
+            annotate(response_cache=True)
+            self.prefetcher.discard(session_id)
+            answer = ChatAnswer.from_cache(cached)
+        else:
+            answer = self._answer_and_cache(query, chat_history, self.prefetcher.take(session_id, query))
+        
+        # Each caller records the interaction in its own session
+        with span("persist"):
+            self._store_answer(session_id, query, answer)
+        
+        return session_id, answer.response
+    
+    def _answer_and_cache(
+        self,
+        query: str,
+        chat_history: List[Dict[str, Any]],
+        prefetched: Optional[List[Hit]] = None,
+        warm: bool = False
+    ) -> "ChatAnswer":
+        """Answer a query, sharing the work with identical concurrent queries and caching history-free answers."""
+        # Identical concurrent queries share one retrieval and generation
+        if SINGLE_FLIGHT_ENABLED and (not chat_history or SINGLE_FLIGHT_WITH_HISTORY):
+            key = self._single_flight_key(query, chat_history)
+            with span("single_flight") as flight_span:
+                answer, shared = self.single_flight.do(key, lambda: self._answer_query(query, chat_history, prefetched, warm))
+                flight_span.set(shared=shared)
+            metrics.increment("single_flight_coalesced" if shared else "single_flight_leaders")
+        else:
+            answer = self._answer_query(query, chat_history, prefetched, warm)
+        
+        if not chat_history and answer.response:
+            self.response_cache.put(query, answer.to_cache())
+        return answer
+    
+    def warm_answer(self, query: str) -> bool:
+        """
+        Answer a query without a session so later requests are served from the response cache.
+        
+        Args:
+            query: The query to answer
+            
+        Returns:
+            bool: False if the answer was already cached
+        """
+        if self.response_cache.contains(query):
+            return False
+        self._answer_and_cache(query, [], warm=True)
+        return True
+    
+    def _answer_query(
+        self,
+        query: str,
+        chat_history: List[Dict[str, Any]],
+        prefetched: Optional[List[Hit]] = None,
+        warm: bool = False
+    ) -> "ChatAnswer":
+        """Retrieve candidates for a query (unless prefetched) and generate its answer."""
+        if prefetched is not None:
+            annotate(prefetched=True)
+            docs_and_scores = prefetched
+        else:
+            with span("retrieve", k=CONTEXT_CANDIDATE_K) as retrieve_span:
+                docs_and_scores = self.get_similar_documents(query, k=CONTEXT_CANDIDATE_K)
+                retrieve_span.set(hits=len(docs_and_scores))
+        return self._generate_answer(query, docs_and_scores, chat_history, warm)
+    
+    @staticmethod
+    def _single_flight_key(query: str, chat_history: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """Key identical requests by normalized query text and a fingerprint of the history."""
+        normalized = normalize_tweet(query)
+        history_fingerprint = ""
+        if chat_history:
+            turns = [(turn.get("user"), turn.get("ai")) for turn in chat_history]
+            history_fingerprint = hashlib.sha1(json.dumps(turns).encode()).hexdigest()
+        return normalized, history_fingerprint
+    
+    def handle_batch(
+        self,
+        queries: List[str],
+        session_ids: Optional[List[Optional[str]]] = None,
+        store_sessions: bool = False,
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Handle many chat queries at once, yielding results as they finish.
+        
+        Queries are embedded and searched in batches of BATCH_SEARCH_SIZE with a
+        single forward pass and one multi-query search per batch, while LLM calls
+        for earlier batches are already running on a bounded worker pool.
+        
+        Args:
+            queries: The user questions
+            session_ids: Optional session ID per query, used for chat history
+            store_sessions: Whether to record the interactions in the session manager
+            max_concurrency: Maximum number of concurrent LLM calls
+            
+        Yields:
+            dict: Result for one query with its index in the input list
+        """
+        if session_ids is not None and len(session_ids) != len(queries):
+            raise ValueError("session_ids must have the same length as queries")
+        
+        session_ids = list(session_ids) if session_ids is not None else [None] * len(queries)
+        if store_sessions:
+            session_ids = [session_id or str(uuid.uuid4()) for session_id in session_ids]
+        
+        max_pending = max_concurrency * 4
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch-llm") as executor:
+            pending = {}
+            for batch_start in range(0, len(queries), BATCH_SEARCH_SIZE):
+                batch = queries[batch_start:batch_start + BATCH_SEARCH_SIZE]
+                batch_results = self.vector_store.batch_search_with_score(batch, k=CONTEXT_CANDIDATE_K)
+                
+                for offset, (query, docs_and_scores) in enumerate(zip(batch, batch_results)):
+                    index = batch_start + offset
+                    session_id = session_ids[index]
+                    history = self.session_manager.get_history(session_id) if session_id else []
+                    future = executor.submit(self._generate_answer, query, docs_and_scores, history)
+                    pending[future] = index
+                    
+                    # Keep the number of queued LLM calls bounded, yielding results as they finish
+                    if len(pending) >= max_pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for finished in done:
+                            yield self._batch_result(finished, pending.pop(finished), queries, session_ids, store_sessions)
             
-        # Get response from QA chain
-        result = self.qa_chain.invoke({
-            "question": query,
-            "session_id": session_id
-        })
+            for finished in as_completed(list(pending)):
+                yield self._batch_result(finished, pending.pop(finished), queries, session_ids, store_sessions)
+    
+    def _batch_result(self, future, index, queries, session_ids, store_sessions) -> Dict[str, Any]:
+        """Turn a finished batch future into a result dict, storing it if requested."""
+        session_id = session_ids[index]
+        try:
+            answer = future.result()
+        except Exception as e:
+            logger.error(f"Error processing batch query {index}: {str(e)}")
+            return {"index": index, "session_id": session_id, "error": str(e)}
+        
+        if store_sessions:
+            self._store_answer(session_id, queries[index], answer)
         
-        # Store interaction with similarity scores
-        self.session_manager.add_interaction(session_id, query, result, docs_and_scores)
+        return {
+            "index": index,
+            "session_id": session_id,
+            "response": answer.response,
+            "fast_path": answer.fast_path,
+            "similarity_scores": doc_table.score_records(answer.documents),
+        }
+    
+    def _generate_answer(self, query: str, docs_and_scores: List[Hit], chat_history: List[Dict[str, Any]], warm: bool = False) -> "ChatAnswer":
+        """
+        Generate the answer for a query from its retrieved candidates.
         
-        return session_id, result 
\ No newline at end of file
+        Args:
+            query: The user's question
+            docs_and_scores: Candidate hits
+            chat_history: Previous turns of the session
+            warm: Whether the query is a cache warm-up rather than a chat request
+            
+        Returns:
+            ChatAnswer: The response and the documents it was based on
+        """
+        # Warm-ups are counted apart so chat_requests and the fast path hit rate reflect user traffic
+        metrics.increment("cache_warm_answers" if warm else "chat_requests")
+        
+        # Serve the stored answer directly when the best match is nearly identical. Follow-up
+        # turns are matched on the latest message alone, so they always go to the LLM
+        use_fast_path = self.fast_path_enabled and not chat_history
+        fast_path_answer = find_fast_path_answer(docs_and_scores) if use_fast_path else None
+        if fast_path_answer is not None:
+            doc_id, distance, response = fast_path_answer
+            annotate(fast_path=True, fast_path_distance=distance)
+            if not warm:
+                self._record_fast_path_hit()
+            return ChatAnswer(response=response, documents=[Hit(doc_id, distance)], fast_path=True)
+        
+        # Prune the candidates down to the prompt context
+        with span("context_selection") as selection_span:
+            selection = select_context(docs_and_scores)
+            selection_span.set(**selection.stats())
+        
+        with span("prompt_render") as render_span:
+            prompt = self.prompt_template.format(
+                question=query,
+                chat_history=chat_history,
+                context=selection.get_documents()
+            )
+            render_span.set(prompt_chars=len(prompt))
+        
+        # Get the response from the LLM, stopping as soon as the answer is complete
+        start_time = time.perf_counter()
+        with span("llm", streaming=LLM_STREAMING) as llm_span:
+            if LLM_STREAMING:
+                generation = collect_stream(self.llm.stream(prompt))
+            else:
+                generation = finalize_response(self.llm.invoke(prompt))
+            llm_span.set(**generation.stats())
+        self._record_llm_latency(time.perf_counter() - start_time)
+        self._record_generation(generation)
+        
+        return ChatAnswer(
+            response=generation.text,
+            documents=selection.documents,
+            context_stats=selection.stats(),
+            generation_stats=generation.stats()
+        )
+    
+    def _store_answer(self, session_id: str, query: str, answer: "ChatAnswer"):
+        """Record an answered query in the session manager."""
+        self.session_manager.add_interaction(
+            session_id,
+            query,
+            answer.response,
+            answer.documents,
+            context_stats=answer.context_stats,
+            generation_stats=answer.generation_stats,
+            fast_path=answer.fast_path
+        )
+    
+    def _record_llm_latency(self, elapsed: float):
+        """Track LLM latency so fast path savings can be estimated."""
+        metrics.observe("llm_latency_seconds", elapsed)
+        if self.llm_latency_ewma is None:
+            self.llm_latency_ewma = elapsed
+        else:
+            self.llm_latency_ewma += LLM_LATENCY_EWMA_ALPHA * (elapsed - self.llm_latency_ewma)
+        metrics.set_gauge("fast_path_hit_rate", metrics.ratio("fast_path_hits", "chat_requests"))
+    
+    def _record_generation(self, generation: GenerationResult):
+        """Track tokens generated versus tokens kept in responses."""
+        metrics.increment("llm_tokens_generated", generation.tokens_generated)
+        metrics.increment("llm_tokens_used", generation.tokens_used)
+        metrics.increment(f"llm_stop_{generation.stop_reason}")
+        metrics.observe("llm_tokens_generated_per_request", generation.tokens_generated)
+    
+    def _record_fast_path_hit(self):
+        """Count a fast path hit and the LLM latency it avoided."""
+        metrics.increment("fast_path_hits")
+        if self.llm_latency_ewma is not None:
+            metrics.increment("fast_path_latency_saved_seconds", self.llm_latency_ewma)
+        metrics.set_gauge("fast_path_hit_rate", metrics.ratio("fast_path_hits", "chat_requests")) 
\ No newline at end of file
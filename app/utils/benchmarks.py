@@ -0,0 +1,498 @@
+"""
+Benchmarks for the retrieval stack.
+
+Usage:
+    python -m app.utils.benchmarks retrieval --queries data/final_data.csv --limit 200
+    python -m app.utils.benchmarks embedding --queries data/final_data.csv --limit 2000
+    python -m app.utils.benchmarks shards --queries data/final_data.csv --limit 200
+    python -m app.utils.benchmarks llm-pool --latencies 0.1,0.3,1.0 --requests 200
+    python -m app.utils.benchmarks normalization --queries data/final_data.csv --rows 2000000
+    python -m app.utils.benchmarks embedding-server --queries data/final_data.csv --workers 4 --duration 20
+    python -m app.utils.benchmarks tokens --queries data/final_data.csv --limit 20000
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import pandas as pd
+from langchain.schema import Document
+
+from app.core.context_selection import CONTEXT_CANDIDATE_K, document_tokens, estimate_tokens
+from app.core.generation import collect_stream
+from app.core.llm import LLMManager
+from app.core.token_counts import annotate_token_counts, count_tokens, get_tokenizer
+from app.db.doc_table import doc_table
+from app.db.embedding_server import RemoteEmbeddings, wait_for_server
+from app.db.embeddings import EMBEDDING_BACKEND, EMBEDDING_CACHE_SIZE, create_base_embedding_model
+from app.db.vector_store import VectorStore
+from app.utils.prefork import read_memory_usage
+from app.utils.stub_llm_server import StubLLMServer
+from app.utils.text_normalization import normalize_tweet
+
+
+def _load_queries(path: str, column: str, limit: int) -> List[str]:
+    """Load benchmark queries from a CSV column."""
+    df = pd.read_csv(path)
+    queries = df[column].dropna().astype(str)
+    return queries.sample(n=min(limit, len(queries)), random_state=42).tolist()
+
+
+def _directory_size(path: str) -> int:
+    """Get the total size of the files under a directory."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _time_calls(func: Callable[[str], list], queries: List[str]) -> Dict[str, float]:
+    """Time a retrieval function over all queries and summarise the latencies in ms."""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0],
+    }
+
+
+def _overlap(a: list, b: list) -> float:
+    """Fraction of the results in a that also appear in b."""
+    keys_a = {hit.doc_id for hit in a}
+    keys_b = {hit.doc_id for hit in b}
+    return len(keys_a & keys_b) / len(keys_a) if keys_a else 0.0
+
+
+def benchmark_retrieval(queries: List[str], k: int = 5):
+    """Compare index size, latency and overlap of vector, lexical and hybrid retrieval."""
+    vector_store = VectorStore()
+    lexical_index = vector_store.lexical_index
+
+    print("\n== Index size ==")
+    print(f"Vector index directory: {_directory_size(vector_store.persist_directory) / 1e6:.2f} MB")
+    print(f"BM25 documents: {len(lexical_index)}, terms: {len(lexical_index.vocabulary)}")
+    print(f"BM25 postings in memory: {lexical_index.postings_size_bytes() / 1e6:.2f} MB")
+    print(f"BM25 serialized: {len(pickle.dumps(lexical_index)) / 1e6:.2f} MB")
+    table_stats = doc_table.stats()
+    print(f"Doc table: {table_stats['documents']} documents, {table_stats['unique_answers']} unique answers, "
+          f"{table_stats['approx_bytes'] / 1e6:.2f} MB")
+
+    print(f"\n== Query latency over {len(queries)} queries (k={k}) ==")
+    for mode in ("vector", "lexical", "hybrid"):
+        timings = _time_calls(lambda q: vector_store.search_with_score(q, k=k, mode=mode), queries)
+        print(f"{mode:>8}: mean {timings['mean_ms']:.2f} ms, p50 {timings['p50_ms']:.2f} ms, p95 {timings['p95_ms']:.2f} ms")
+
+    print(f"\n== Retrieval overlap with vector results (top-{k}) ==")
+    lexical_overlap, hybrid_overlap = [], []
+    for query in queries:
+        vector_results = vector_store.search_with_score(query, k=k, mode="vector")
+        lexical_overlap.append(_overlap(vector_results, vector_store.search_with_score(query, k=k, mode="lexical")))
+        hybrid_overlap.append(_overlap(vector_results, vector_store.search_with_score(query, k=k, mode="hybrid")))
+    print(f" lexical: {statistics.mean(lexical_overlap):.3f}")
+    print(f"  hybrid: {statistics.mean(hybrid_overlap):.3f}")
+
+
+def benchmark_embedding(texts: List[str], min_cosine: float = 0.99) -> bool:
+    """
+    Compare the quantized embedding backend with the default float32 backend.
+
+    Checks that every quantized embedding has cosine similarity of at least
+    min_cosine with the reference embedding, and reports throughput for
+    single-query and batched embedding.
+
+    Returns:
+        bool: True if the equivalence check passed
+    """
+    import numpy as np
+
+    backends = {"default": create_base_embedding_model("default"), "quantized": create_base_embedding_model("quantized")}
+
+    print(f"\n== Throughput over {len(texts)} texts ==")
+    vectors = {}
+    for name, model in backends.items():
+        model.embed_documents(texts[:8])  # warm up
+
+        start = time.perf_counter()
+        vectors[name] = np.asarray(model.embed_documents(texts))
+        batched = len(texts) / (time.perf_counter() - start)
+
+        single_texts = texts[:200]
+        start = time.perf_counter()
+        for text in single_texts:
+            model.embed_query(text)
+        single = len(single_texts) / (time.perf_counter() - start)
+
+        print(f"{name:>9}: batched {batched:.1f} texts/s, single query {single:.1f} queries/s")
+
+    reference = vectors["default"] / np.linalg.norm(vectors["default"], axis=1, keepdims=True)
+    candidate = vectors["quantized"] / np.linalg.norm(vectors["quantized"], axis=1, keepdims=True)
+    cosines = (reference * candidate).sum(axis=1)
+
+    passed = bool(cosines.min() >= min_cosine)
+    print("\n== Equivalence with the default backend ==")
+    print(f"cosine min {cosines.min():.4f}, mean {cosines.mean():.4f}, p1 {np.percentile(cosines, 1):.4f}")
+    print(f"{'PASS' if passed else 'FAIL'}: minimum cosine similarity {'>=' if passed else '<'} {min_cosine}")
+    return passed
+
+
+def benchmark_shards(queries: List[str], k: int = 5):
+    """
+    Compare sharded search with the flat index.
+
+    Query embeddings are computed up front so only the search itself is
+    timed. Recall is the fraction of the flat index's top-k that the
+    sharded search also returns.
+    """
+    vector_store = VectorStore()
+    sharded_index = vector_store.sharded_index
+    if len(sharded_index) == 0:
+        print("No shards built; run `python -m app.db.sharded_index build` first")
+        return
+
+    embeddings = vector_store.embedding_model.embed_documents(queries)
+    by_query = dict(zip(queries, embeddings))
+    collection = vector_store.db._collection
+
+    def flat_search(query):
+        results = collection.query(query_embeddings=[by_query[query]], n_results=k, include=["documents"])
+        return results["documents"][0]
+
+    def sharded_search(query, n_probe):
+        return [doc_table.content(hit.doc_id) for hit in sharded_index.search(by_query[query], k=k, n_probe=n_probe)]
+
+    flat_contents = {query: set(flat_search(query)) for query in queries}
+
+    print(f"\n== Shards: {len(sharded_index)}, sizes {sharded_index.sizes} ==")
+    print(f"\n== Search latency and recall@{k} over {len(queries)} queries ==")
+    timings = _time_calls(flat_search, queries)
+    print(f"    flat: mean {timings['mean_ms']:.2f} ms, p50 {timings['p50_ms']:.2f} ms, p95 {timings['p95_ms']:.2f} ms, recall 1.000")
+    for n_probe in range(1, len(sharded_index) + 1):
+        timings = _time_calls(lambda q: sharded_search(q, n_probe), queries)
+        recall = statistics.mean(
+            len(set(sharded_search(query, n_probe)) & flat_contents[query]) / len(flat_contents[query])
+            for query in queries if flat_contents[query]
+        )
+        print(
+            f"probe {n_probe:>2}: mean {timings['mean_ms']:.2f} ms, p50 {timings['p50_ms']:.2f} ms, "
+            f"p95 {timings['p95_ms']:.2f} ms, recall {recall:.3f}"
+        )
+
+
+def benchmark_llm_pool(latencies: List[float], requests: int = 200, concurrency: int = 8, outage: int = -1):
+    """
+    Route requests across local stub endpoints with different latencies.
+
+    Optionally takes one endpoint down for the middle third of the run to
+    show it being ejected by the circuit breaker and re-admitted afterwards.
+    """
+    servers = [StubLLMServer(latency=latency).start() for latency in latencies]
+    llm_manager = LLMManager(endpoint_urls=",".join(server.url for server in servers))
+    llm = llm_manager.get_llm()
+
+    def one_request(i):
+        if 0 <= outage < len(servers):
+            servers[outage].available = not (requests // 3 <= i < 2 * requests // 3)
+        start = time.perf_counter()
+        try:
+            collect_stream(llm.stream("Hello"))
+            return (time.perf_counter() - start) * 1000, None
+        except Exception as e:
+            return (time.perf_counter() - start) * 1000, str(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = sorted(ms for ms, error in results if error is None)
+    errors = sum(1 for _, error in results if error is not None)
+    print(f"\n== {requests} requests, concurrency {concurrency}, {requests / elapsed:.1f} req/s ==")
+    if latencies_ms:
+        print(
+            f"latency mean {statistics.mean(latencies_ms):.1f} ms, p50 {latencies_ms[len(latencies_ms) // 2]:.1f} ms, "
+            f"p95 {latencies_ms[int(len(latencies_ms) * 0.95) - 1]:.1f} ms, errors {errors}"
+        )
+    print("\n== Endpoints ==")
+    for server, status in zip(servers, llm_manager.get_endpoint_status()):
+        print(
+            f"{server.latency:>5.2f}s stub: {status['requests']:>4} routed, {server.requests:>4} served, "
+            f"{status['failures']:>3} failures, state {status['state']}"
+        )
+
+    for server in servers:
+        server.stop()
+
+
+def _lru_hit_rate(keys: List[str], capacity: int) -> float:
+    """Simulate an LRU cache of the given capacity over a stream of keys."""
+    cache = OrderedDict()
+    hits = 0
+    for key in keys:
+        if key in cache:
+            hits += 1
+            cache.move_to_end(key)
+        else:
+            cache[key] = None
+            if len(cache) > capacity:
+                cache.popitem(last=False)
+    return hits / len(keys) if keys else 0.0
+
+
+def benchmark_normalization(texts: List[str], rows: int = 2_000_000, cache_size: int = EMBEDDING_CACHE_SIZE):
+    """
+    Measure tweet normalization throughput and what it buys.
+
+    Normalizes `rows` texts (cycling through the sample) to report rows per
+    second, then compares raw and normalized text on length, vocabulary and
+    the hit rate of a query embedding cache of `cache_size` entries.
+    """
+    stream = [texts[i % len(texts)] for i in range(rows)]
+
+    start = time.perf_counter()
+    for text in stream:
+        normalize_tweet(text)
+    elapsed = time.perf_counter() - start
+    print(f"\n== Throughput over {rows} rows ==")
+    print(f"{rows / elapsed:,.0f} rows/s ({elapsed / rows * 1e6:.2f} us/row)")
+
+    normalized = [normalize_tweet(text) for text in texts]
+    raw_chars = sum(len(text) for text in texts)
+    normalized_chars = sum(len(text) for text in normalized)
+    raw_vocab = {word for text in texts for word in text.split()}
+    normalized_vocab = {word for text in normalized for word in text.split()}
+    print(f"\n== Reduction over {len(texts)} texts ==")
+    print(f"characters: {raw_chars} -> {normalized_chars} ({1 - normalized_chars / max(raw_chars, 1):.1%} fewer)")
+    print(f"distinct words: {len(raw_vocab)} -> {len(normalized_vocab)} ({1 - len(normalized_vocab) / max(len(raw_vocab), 1):.1%} fewer)")
+    print(f"distinct texts: {len(set(texts))} -> {len(set(normalized))}")
+
+    print(f"\n== Query cache hit rate ({cache_size} entries, {len(texts)} queries) ==")
+    print(f"raw        {_lru_hit_rate(texts, cache_size):.1%}")
+    print(f"normalized {_lru_hit_rate(normalized, cache_size):.1%}")
+
+
+def _embedding_worker(socket_path, backend, texts, threads, duration, ready, start, results):
+    """Benchmark worker: embed queries from several threads for `duration` seconds."""
+    if socket_path:
+        model = RemoteEmbeddings(socket_path, fallback=lambda: create_base_embedding_model(backend))
+    else:
+        model = create_base_embedding_model(backend)
+    model.embed_query(texts[0])  # connect or warm up
+    ready.set()
+    start.wait()
+
+    def run(offset):
+        done = 0
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            model.embed_query(texts[(offset + done) % len(texts)])
+            done += 1
+        return done
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        completed = sum(executor.map(run, [i * 997 for i in range(threads)]))
+    results.put((completed, read_memory_usage(os.getpid())))
+
+
+def _run_embedding_workers(texts, socket_path, backend, workers, threads, duration) -> Dict[str, float]:
+    """Start the worker processes together and collect their query counts and memory."""
+    # Spawned, not forked, so every worker loads its own model as separate web workers would
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    results = context.Queue()
+    readies = []
+    processes = []
+    for _ in range(workers):
+        ready = context.Event()
+        process = context.Process(
+            target=_embedding_worker,
+            args=(socket_path, backend, texts, threads, duration, ready, start, results)
+        )
+        process.start()
+        readies.append(ready)
+        processes.append(process)
+    for ready in readies:
+        ready.wait()
+
+    start.set()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    queries = sum(completed for completed, _ in collected)
+    pss_kb = sum((usage or {}).get("pss_kb", 0) for _, usage in collected)
+    return {"qps": queries / duration, "pss_mb": pss_kb / 1024}
+
+
+def benchmark_embedding_server(texts: List[str], workers: int = 4, threads: int = 4, duration: float = 20.0, backend: str = EMBEDDING_BACKEND):
+    """
+    Compare a model per worker process with one shared embedding server.
+
+    Both runs start `workers` processes that each embed single queries from
+    `threads` threads for `duration` seconds. Reports aggregate queries per
+    second and the proportional memory (PSS) of all processes involved.
+    """
+    print(f"\n== {workers} workers x {threads} threads, {duration:.0f}s, {backend} backend ==")
+
+    local = _run_embedding_workers(texts, "", backend, workers, threads, duration)
+    print(f"per-worker models: {local['qps']:8.1f} queries/s, {local['pss_mb']:8.1f} MB")
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "embeddings.sock")
+    server = subprocess.Popen([sys.executable, "-m", "app.db.embedding_server", "--socket", socket_path, "--backend", backend])
+    try:
+        if not wait_for_server(socket_path):
+            print("Embedding server did not start")
+            return
+        shared = _run_embedding_workers(texts, socket_path, backend, workers, threads, duration)
+        server_usage = read_memory_usage(server.pid) or {}
+        stats = RemoteEmbeddings(socket_path).health_check()
+    finally:
+        server.terminate()
+        server.wait()
+
+    server_mb = server_usage.get("pss_kb", 0) / 1024
+    print(
+        f"embedding server:  {shared['qps']:8.1f} queries/s, {shared['pss_mb'] + server_mb:8.1f} MB "
+        f"(workers {shared['pss_mb']:.1f} MB + server {server_mb:.1f} MB), mean batch {stats['mean_batch']}"
+    )
+
+
+def benchmark_tokens(documents: List[Document], requests: int = 2000, k: int = CONTEXT_CANDIDATE_K):
+    """
+    Measure the cost of counting tokens at ingestion and what it saves per request.
+
+    Counts tokens for the documents with the generation model's tokenizer,
+    then times budgeting `k` candidates per request by tokenizing their
+    content and answer versus reading the stored counts. Also reports how
+    far the character-based estimate is from the real counts and how many
+    prompt tokens the truncated answers save.
+    """
+    tokenizer = get_tokenizer()
+    report = annotate_token_counts(documents, tokenizer=tokenizer)
+    print("\n== Ingestion ==")
+    print(f"{report} ({report.seconds / max(len(documents), 1) * 1e6:.1f} us/doc)")
+
+    exact = [doc.metadata["content_tokens"] + doc.metadata["answer_tokens"] for doc in documents]
+    estimated = [estimate_tokens(doc.page_content) + estimate_tokens(doc.metadata.get("answer")) for doc in documents]
+    errors = [abs(e - x) / x for e, x in zip(estimated, exact) if x]
+    if errors:
+        print(f"character estimate vs counts: mean error {statistics.mean(errors):.1%}, p95 {sorted(errors)[int(len(errors) * 0.95)]:.1%}")
+
+    truncated = [doc.metadata for doc in documents if "answer_truncated" in doc.metadata]
+    saved = sum(metadata["answer_tokens"] - metadata["answer_truncated_tokens"] for metadata in truncated)
+    print(f"truncated answers: {len(truncated)}, saving {saved / max(len(truncated), 1):.1f} prompt tokens each when selected")
+
+    doc_ids = [doc_table.intern_document(doc) for doc in documents]
+    rng = random.Random(42)
+    candidate_sets = [rng.sample(doc_ids, min(k, len(doc_ids))) for _ in range(requests)]
+
+    start = time.perf_counter()
+    for candidates in candidate_sets:
+        count_tokens([doc_table.content(doc_id) for doc_id in candidates], tokenizer)
+        count_tokens([doc_table.answer(doc_id) for doc_id in candidates], tokenizer)
+    tokenize_time = (time.perf_counter() - start) / requests
+
+    start = time.perf_counter()
+    for candidates in candidate_sets:
+        sum(document_tokens(doc_id) for doc_id in candidates)
+    lookup_time = (time.perf_counter() - start) / requests
+
+    print(f"\n== Budgeting {k} candidates per request ({requests} requests) ==")
+    print(f"tokenize per request: {tokenize_time * 1e6:8.1f} us")
+    print(f"stored counts:        {lookup_time * 1e6:8.1f} us ({tokenize_time / lookup_time if lookup_time else 0:.0f}x faster)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the retrieval stack")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    retrieval = subparsers.add_parser("retrieval", help="Vector vs BM25 vs hybrid retrieval")
+    retrieval.add_argument("--queries", default=os.path.join("data", "final_data.csv"), help="CSV file with queries")
+    retrieval.add_argument("--column", default="input", help="Column holding the query text")
+    retrieval.add_argument("--limit", type=int, default=200, help="Number of queries to sample")
+    retrieval.add_argument("--k", type=int, default=5, help="Number of documents to retrieve")
+
+    embedding = subparsers.add_parser("embedding", help="Quantized vs default embedding backend")
+    embedding.add_argument("--queries", default=os.path.join("data", "final_data.csv"), help="CSV file with texts")
+    embedding.add_argument("--column", default="input", help="Column holding the text")
+    embedding.add_argument("--limit", type=int, default=2000, help="Number of texts to sample")
+    embedding.add_argument("--min-cosine", type=float, default=0.99, help="Required cosine similarity to the reference")
+
+    shards = subparsers.add_parser("shards", help="Sharded vs flat vector search")
+    shards.add_argument("--queries", default=os.path.join("data", "final_data.csv"), help="CSV file with queries")
+    shards.add_argument("--column", default="input", help="Column holding the query text")
+    shards.add_argument("--limit", type=int, default=200, help="Number of queries to sample")
+    shards.add_argument("--k", type=int, default=5, help="Number of documents to retrieve")
+
+    llm_pool = subparsers.add_parser("llm-pool", help="Latency-aware routing across stub LLM endpoints")
+    llm_pool.add_argument("--latencies", default="0.1,0.3,1.0", help="Comma-separated latency of each stub endpoint in seconds")
+    llm_pool.add_argument("--requests", type=int, default=200, help="Number of requests to send")
+    llm_pool.add_argument("--concurrency", type=int, default=8, help="Concurrent requests")
+    llm_pool.add_argument("--outage", type=int, default=-1, help="Index of an endpoint to take down mid-run")
+
+    normalization = subparsers.add_parser("normalization", help="Tweet normalization throughput and cache hit rate")
+    normalization.add_argument("--queries", default=os.path.join("data", "final_data.csv"), help="CSV file with texts")
+    normalization.add_argument("--column", default="input", help="Column holding the text")
+    normalization.add_argument("--limit", type=int, default=100000, help="Number of texts to sample")
+    normalization.add_argument("--rows", type=int, default=2000000, help="Number of rows to normalize for throughput")
+    normalization.add_argument("--cache-size", type=int, default=EMBEDDING_CACHE_SIZE, help="Simulated query cache entries")
+
+    embedding_server = subparsers.add_parser("embedding-server", help="Per-worker embedding models vs the shared embedding server")
+    embedding_server.add_argument("--queries", default=os.path.join("data", "final_data.csv"), help="CSV file with texts")
+    embedding_server.add_argument("--column", default="input", help="Column holding the text")
+    embedding_server.add_argument("--limit", type=int, default=5000, help="Number of texts to sample")
+    embedding_server.add_argument("--workers", type=int, default=4, help="Worker processes")
+    embedding_server.add_argument("--threads", type=int, default=4, help="Concurrent queries per worker")
+    embedding_server.add_argument("--duration", type=float, default=20.0, help="Seconds each run lasts")
+    embedding_server.add_argument("--backend", default=EMBEDDING_BACKEND, help="Embedding backend: default or quantized")
+
+    tokens = subparsers.add_parser("tokens", help="Token counting at ingestion vs tokenizing per request")
+    tokens.add_argument("--queries", default=os.path.join("data", "final_data.csv"), help="CSV file with input and output columns")
+    tokens.add_argument("--limit", type=int, default=20000, help="Number of documents to sample")
+    tokens.add_argument("--requests", type=int, default=2000, help="Simulated requests")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "retrieval":
+        benchmark_retrieval(_load_queries(args.queries, args.column, args.limit), k=args.k)
+    elif args.benchmark == "embedding":
+        passed = benchmark_embedding(_load_queries(args.queries, args.column, args.limit), min_cosine=args.min_cosine)
+        sys.exit(0 if passed else 1)
+    elif args.benchmark == "shards":
+        benchmark_shards(_load_queries(args.queries, args.column, args.limit), k=args.k)
+    elif args.benchmark == "llm-pool":
+        latencies = [float(latency) for latency in args.latencies.split(",")]
+        benchmark_llm_pool(latencies, requests=args.requests, concurrency=args.concurrency, outage=args.outage)
+    elif args.benchmark == "embedding-server":
+        benchmark_embedding_server(
+            _load_queries(args.queries, args.column, args.limit),
+            workers=args.workers,
+            threads=args.threads,
+            duration=args.duration,
+            backend=args.backend
+        )
+    elif args.benchmark == "tokens":
+        df = pd.read_csv(args.queries).dropna(subset=["input", "output"])
+        df = df.sample(n=min(args.limit, len(df)), random_state=42)
+        documents = [Document(page_content=row.input, metadata={"answer": row.output}) for row in df.itertuples()]
+        benchmark_tokens(documents, requests=args.requests)
+    elif args.benchmark == "normalization":
+        benchmark_normalization(_load_queries(args.queries, args.column, args.limit), rows=args.rows, cache_size=args.cache_size)
+
+
+if __name__ == "__main__":
+    main()
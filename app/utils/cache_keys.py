@@ -0,0 +1,149 @@
+import hashlib
+import os
+import threading
+import time
+import logging
+
+from app.core.prompts import PROMPT_VERSION
+from app.utils.text_normalization import normalize_tweet
+
+logger = logging.getLogger(__name__)
+
+# Redis configuration from environment variables
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")  # Changed default from localhost to redis
+REDIS_PORT = int(os.getenv("REDIS_PORT", 2000))
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
+CACHE_TTL = int(os.getenv("CACHE_TTL", 3600))  # Default 1 hour
+REDIS_UNAVAILABLE_BACKOFF = 60  # Seconds before a failed Redis connection is retried by a version bump
+
+# Cache versioning configuration
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "rag")  # Prefix shared by all versioned keys
+CACHE_VERSION_KEY = f"{CACHE_KEY_PREFIX}-meta:index-version"  # Redis counter bumped on re-ingestion
+CACHE_VERSION_REFRESH = float(os.getenv("CACHE_VERSION_REFRESH", 5))  # Seconds a worker trusts its copy of the version
+CACHE_MODEL_VERSION = os.getenv("CACHE_MODEL_VERSION", "mistral-7b-instruct-v0-3-fsp")
+
+# Client set by app.utils.cache_utils.init_cache once Redis is reachable
+_redis_client = None
+
+# Local copy of the index version, refreshed from Redis every CACHE_VERSION_REFRESH seconds
+_index_version = 0
+_index_version_checked_at = 0.0
+_version_lock = threading.Lock()
+
+# Connection used to publish version bumps when the cache was never initialized
+_bump_client = None
+_bump_client_unavailable_until = 0.0
+
+
+def set_redis_client(client):
+    """Use a connected Redis client for the shared index version (None to stop using Redis)."""
+    global _redis_client
+    _redis_client = client
+
+
+def get_redis_client():
+    """Get the Redis client set by init_cache, or None if the cache is not initialized."""
+    return _redis_client
+
+
+def get_index_version() -> int:
+    """Get the current index version, refreshing the local copy from Redis when stale"""
+    global _index_version, _index_version_checked_at
+
+    if _redis_client is None or time.monotonic() - _index_version_checked_at < CACHE_VERSION_REFRESH:
+        return _index_version
+
+    with _version_lock:
+        try:
+            _index_version = int(_redis_client.get(CACHE_VERSION_KEY) or 0)
+        except Exception as e:
+            logger.warning(f"Could not read cache version: {str(e)}")
+        _index_version_checked_at = time.monotonic()
+    return _index_version
+
+
+def get_cache_namespace() -> str:
+    """
+    Get the namespace that prefixes every cache key.
+
+    The namespace embeds the index version, the prompt fingerprint and the
+    model version, so changing any of them makes all existing entries
+    unreachable at once without touching Redis.
+    """
+    return f"{CACHE_KEY_PREFIX}:i{get_index_version()}:p{PROMPT_VERSION}:m{CACHE_MODEL_VERSION}"
+
+
+def _get_bump_client():
+    """
+    Get a client to publish a version bump with.
+
+    Ingestion may run outside the web app (e.g. run.py), where the cache is
+    never initialized, so a single fallback connection is created on first
+    use and reused. After a failed connection it is not retried for
+    REDIS_UNAVAILABLE_BACKOFF seconds, so repeated bumps do not each wait
+    for the connect timeout.
+    """
+    global _bump_client
+
+    if _redis_client is not None:
+        return _redis_client
+    if time.monotonic() < _bump_client_unavailable_until:
+        return None
+    if _bump_client is None:
+        try:
+            from redis import Redis
+        except ImportError:
+            return None
+        _bump_client = Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            password=REDIS_PASSWORD,
+            db=REDIS_DB,
+            decode_responses=True,
+            socket_timeout=2,
+            socket_connect_timeout=2
+        )
+    return _bump_client
+
+
+def bump_cache_version(reason: str = "") -> int:
+    """
+    Invalidate every cached entry in O(1) by moving to a new index version.
+
+    Old entries are left to expire by TTL or to be removed by the sweeper.
+
+    Args:
+        reason: Why the cache is invalidated (for the logs)
+
+    Returns:
+        int: The new index version
+    """
+    global _index_version, _index_version_checked_at, _bump_client_unavailable_until
+
+    with _version_lock:
+        client = _get_bump_client()
+        try:
+            if client is None:
+                raise ConnectionError("Redis is unavailable")
+            _index_version = int(client.incr(CACHE_VERSION_KEY))
+        except Exception as e:
+            logger.warning(f"Could not bump cache version in Redis: {str(e)}")
+            if client is not None and client is not _redis_client:
+                _bump_client_unavailable_until = time.monotonic() + REDIS_UNAVAILABLE_BACKOFF
+            _index_version += 1
+        _index_version_checked_at = time.monotonic()
+
+    logger.info(f"Cache version bumped to {_index_version}" + (f" ({reason})" if reason else ""))
+    return _index_version
+
+
+def versioned_key(*parts: str) -> str:
+    """Build a cache key in the current namespace from the given parts"""
+    return ":".join((get_cache_namespace(),) + parts)
+
+
+def query_cache_key(kind: str, query: str) -> str:
+    """Build a versioned cache key for a query, keyed by its normalized text"""
+    normalized = normalize_tweet(query)
+    return versioned_key(kind, hashlib.sha1(normalized.encode()).hexdigest())
@@ -10,19 +10,26 @@ from functools import wraps
 import logging
 import time
 import socket
+import threading
+
+from app.utils.cache_keys import (
+    CACHE_KEY_PREFIX, CACHE_TTL, REDIS_DB, REDIS_HOST, REDIS_PASSWORD, REDIS_PORT,
+    get_cache_namespace, set_redis_client, versioned_key
+)
 
 logger = logging.getLogger(__name__)
 
-# Get Redis configuration from environment variables or use defaults
-REDIS_HOST = os.getenv("REDIS_HOST", "redis")  # Changed default from localhost to redis
-REDIS_PORT = int(os.getenv("REDIS_PORT", 2000))
-REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
-REDIS_DB = int(os.getenv("REDIS_DB", 0))
-CACHE_TTL = int(os.getenv("CACHE_TTL", 3600))  # Default 1 hour
+# Redis connection settings, CACHE_TTL and key versioning live in app.utils.cache_keys,
+# which does not depend on fastapi-cache
 REDIS_CONNECTION_RETRIES = int(os.getenv("REDIS_CONNECTION_RETRIES", 3))
 REDIS_RETRY_DELAY = int(os.getenv("REDIS_RETRY_DELAY", 2))
 
+# Stale-entry sweeping configuration
+CACHE_SWEEP_INTERVAL = int(os.getenv("CACHE_SWEEP_INTERVAL", 3600))  # Seconds between stale-entry sweeps (0 disables)
+CACHE_SWEEP_BATCH = int(os.getenv("CACHE_SWEEP_BATCH", 500))  # Keys per SCAN/UNLINK round trip
+
 redis_client = None
+_sweeper_thread = None
 
 def try_resolve_redis_host():
     """Try to resolve Redis host, with fallback to localhost if needed"""
@@ -90,6 +97,8 @@ def init_cache(app):
             )
             
             logger.info(f"Cache successfully initialized with Redis at {REDIS_HOST}:{REDIS_PORT}")
+            set_redis_client(redis_client)
+            start_cache_sweeper()
             return True
             
         except Exception as e:
@@ -101,17 +110,18 @@ def init_cache(app):
             else:
                 logger.error(f"Failed to initialize cache after {REDIS_CONNECTION_RETRIES} attempts. The application will continue without caching.")
                 redis_client = None
+                set_redis_client(None)
                 return False
 
 def generate_cache_key(func_name: str, args: List[Any], kwargs: Dict[str, Any]) -> str:
-    """Generate a cache key based on function name and arguments"""
+    """Generate a versioned cache key based on function name and arguments"""
     # Create a string representation of the arguments
     args_str = json.dumps(args, sort_keys=True)
     kwargs_str = json.dumps(kwargs, sort_keys=True)
     
     # Generate a hash
     key = f"{func_name}:{args_str}:{kwargs_str}"
-    return hashlib.md5(key.encode()).hexdigest()
+    return versioned_key(func_name, hashlib.md5(key.encode()).hexdigest())
 
 def cache_result(ttl: Optional[int] = None):
     """
@@ -161,6 +171,30 @@ def cache_result(ttl: Optional[int] = None):
         return wrapper
     return decorator
 
+def _unlink_in_batches(pattern: str, keep=None) -> int:
+    """
+    Delete keys matching a pattern with incremental SCAN and non-blocking UNLINK.
+    
+    Args:
+        pattern: Redis glob pattern to scan
+        keep: Optional predicate; keys for which it returns True are kept
+        
+    Returns:
+        int: Number of keys deleted
+    """
+    deleted = 0
+    batch = []
+    for key in redis_client.scan_iter(match=pattern, count=CACHE_SWEEP_BATCH):
+        if keep is not None and keep(key):
+            continue
+        batch.append(key)
+        if len(batch) >= CACHE_SWEEP_BATCH:
+            deleted += redis_client.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += redis_client.unlink(*batch)
+    return deleted
+
 def clear_cache(pattern: str = "*"):
     """Clear cache entries matching the given pattern"""
     if redis_client is None:
@@ -168,11 +202,41 @@ def clear_cache(pattern: str = "*"):
         return
         
     try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            redis_client.delete(*keys)
-            logger.info(f"Cleared {len(keys)} cache entries")
+        deleted = _unlink_in_batches(pattern)
+        if deleted:
+            logger.info(f"Cleared {deleted} cache entries")
         else:
             logger.info("No cache entries to clear")
     except Exception as e:
-        logger.warning(f"Failed to clear cache: {str(e)}")
\ No newline at end of file
+        logger.warning(f"Failed to clear cache: {str(e)}")
+
+def sweep_stale_entries() -> int:
+    """Delete entries from namespaces other than the current one"""
+    if redis_client is None:
+        return 0
+        
+    namespace = get_cache_namespace() + ":"
+    try:
+        deleted = _unlink_in_batches(f"{CACHE_KEY_PREFIX}:*", keep=lambda key: key.startswith(namespace))
+        if deleted:
+            logger.info(f"Swept {deleted} stale cache entries")
+        return deleted
+    except Exception as e:
+        logger.warning(f"Failed to sweep stale cache entries: {str(e)}")
+        return 0
+
+def start_cache_sweeper():
+    """Start the background thread that periodically sweeps stale entries"""
+    global _sweeper_thread
+    
+    if CACHE_SWEEP_INTERVAL <= 0 or (_sweeper_thread is not None and _sweeper_thread.is_alive()):
+        return
+        
+    def sweep_forever():
+        while True:
+            time.sleep(CACHE_SWEEP_INTERVAL)
+            sweep_stale_entries()
+            
+    _sweeper_thread = threading.Thread(target=sweep_forever, name="cache-sweeper", daemon=True)
+    _sweeper_thread.start()
+    logger.info(f"Cache sweeper started (every {CACHE_SWEEP_INTERVAL}s)")
\ No newline at end of file
@@ -3,14 +3,19 @@ from langchain.schema import Document
 from typing import List, Optional
 import logging
 
+from app.core.token_counts import annotate_token_counts
+from app.utils.dedup import DEDUP_ENABLED, collapse_duplicates
+from app.utils.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
-def load_csv_data(file_path: str) -> List[Document]:
+def load_csv_data(file_path: str, deduplicate: bool = DEDUP_ENABLED) -> List[Document]:
     """
     Load data from a CSV file and convert it to a list of Document objects.
     
     Args:
         file_path: Path to the CSV file
+        deduplicate: Whether to collapse near-duplicate inputs into one document each
         
     Returns:
         List of Document objects
@@ -37,6 +42,16 @@ def load_csv_data(file_path: str) -> List[Document]:
         ]
         
         logger.info(f"Successfully created {len(documents)} Document objects")
+
+        if deduplicate:
+            documents, report = collapse_duplicates(documents)
+            logger.info(f"Collapsed near-duplicates: {report}")
+            metrics.set_gauge("dedup_reduction_ratio", round(report.reduction_ratio, 4))
+
+        # Count tokens once here so prompt budgeting never tokenizes at request time
+        token_report = annotate_token_counts(documents)
+        logger.info(f"Counted tokens: {token_report}")
+        metrics.set_gauge("ingest_token_count_seconds", round(token_report.seconds, 3))
         return documents
         
     except Exception as e:
@@ -0,0 +1,208 @@
+"""
+Near-duplicate collapsing of the corpus with MinHash-LSH.
+
+Usage:
+    python -m app.utils.dedup data/final_data.csv --threshold 0.8
+"""
+import argparse
+import json
+import os
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+from langchain.schema import Document
+
+from app.utils.text_normalization import normalize_tweet
+
+logger = logging.getLogger(__name__)
+
+# Deduplication configuration from environment variables
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "false").lower() == "true"  # Opt-in: changes which rows are indexed
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.8))  # Estimated Jaccard similarity of word shingles
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", 64))  # MinHash permutations
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", 16))  # LSH bands; fewer rows per band finds lower-similarity pairs
+DEDUP_MAX_ALTERNATIVES = int(os.getenv("DEDUP_MAX_ALTERNATIVES", 5))  # Alternative answers kept per representative
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_TOKEN_RE = re.compile(r"\w+")
+
+
+@dataclass
+class DedupReport:
+    """Outcome of collapsing a corpus."""
+    input_documents: int
+    output_documents: int
+    collapsed_clusters: int
+    largest_cluster: int
+
+    @property
+    def reduction_ratio(self) -> float:
+        """Fraction of documents removed."""
+        if self.input_documents == 0:
+            return 0.0
+        return 1 - self.output_documents / self.input_documents
+
+    def __str__(self) -> str:
+        return (
+            f"{self.input_documents} -> {self.output_documents} documents "
+            f"({self.reduction_ratio:.1%} reduction, {self.collapsed_clusters} clusters collapsed, "
+            f"largest cluster {self.largest_cluster})"
+        )
+
+
+def shingles(text: str) -> List[str]:
+    """Word bigrams of the normalized text (unigrams for one-word texts)."""
+    tokens = _TOKEN_RE.findall(normalize_tweet(text))
+    if len(tokens) < 2:
+        return tokens
+    return [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class MinHasher:
+    """MinHash signatures using universal hashing of CRC32 shingle hashes."""
+
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, seed: int = 1):
+        """Draw the hash function parameters."""
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        # a < 2**32 keeps a * h below 2**64 for 32-bit shingle hashes h, so the product cannot wrap
+        self.a = rng.integers(1, _MAX_HASH + 1, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """Get the MinHash signature of a text, or None if it has no shingles."""
+        shingle_set = set(shingles(text))
+        if not shingle_set:
+            return None
+        hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+        # (a * h + b) mod p, truncated to 32 bits; reducing a * h first keeps the sum below 2**62
+        permuted = (((self.a[:, None] * hashes[None, :]) % _MERSENNE_PRIME + self.b[:, None]) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=1)
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_duplicate_clusters(
+    texts: List[str],
+    threshold: float = DEDUP_THRESHOLD,
+    num_perm: int = DEDUP_NUM_PERM,
+    bands: int = DEDUP_BANDS,
+) -> List[List[int]]:
+    """
+    Group near-duplicate texts.
+
+    Texts sharing an LSH bucket in any band are candidates; candidates whose
+    estimated Jaccard similarity reaches the threshold are merged.
+
+    Args:
+        texts: The texts to group
+        threshold: Minimum estimated Jaccard similarity of word shingles
+        num_perm: Number of MinHash permutations
+        bands: Number of LSH bands (num_perm must be divisible by it)
+
+    Returns:
+        Clusters of text indices, each in input order; singletons included
+    """
+    if num_perm % bands != 0:
+        raise ValueError("DEDUP_NUM_PERM must be divisible by DEDUP_BANDS")
+    rows = num_perm // bands
+    hasher = MinHasher(num_perm)
+    signatures = [hasher.signature(text) for text in texts]
+
+    parent = list(range(len(texts)))
+    buckets: Dict[Tuple[int, bytes], int] = {}
+    for i, signature in enumerate(signatures):
+        if signature is None:
+            continue
+        for band in range(bands):
+            key = (band, signature[band * rows:(band + 1) * rows].tobytes())
+            first = buckets.setdefault(key, i)
+            if first == i:
+                continue
+            root_i, root_first = _find(parent, i), _find(parent, first)
+            if root_i == root_first:
+                continue
+            if np.mean(signature == signatures[first]) >= threshold:
+                parent[max(root_i, root_first)] = min(root_i, root_first)
+
+    clusters = defaultdict(list)
+    for i in range(len(texts)):
+        clusters[_find(parent, i)].append(i)
+    return list(clusters.values())
+
+
+def collapse_duplicates(
+    documents: List[Document],
+    threshold: float = DEDUP_THRESHOLD,
+    max_alternatives: int = DEDUP_MAX_ALTERNATIVES,
+) -> Tuple[List[Document], DedupReport]:
+    """
+    Collapse near-duplicate documents into one representative each.
+
+    The first document of a cluster is kept. Its metadata records how many
+    documents were merged into it (duplicate_count) and the distinct answers
+    of those documents (alternative_answers, a JSON list, since vector store
+    metadata must be scalar).
+
+    Args:
+        documents: Documents whose page content is compared
+        threshold: Minimum estimated Jaccard similarity of word shingles
+        max_alternatives: Maximum number of alternative answers recorded
+
+    Returns:
+        tuple: (representative documents in input order, report)
+    """
+    clusters = find_duplicate_clusters([doc.page_content for doc in documents], threshold=threshold)
+
+    representatives = []
+    for cluster in sorted(clusters, key=lambda members: members[0]):
+        representative = documents[cluster[0]]
+        metadata = dict(representative.metadata)
+        metadata["duplicate_count"] = len(cluster) - 1
+        if len(cluster) > 1:
+            alternatives = []
+            for i in cluster[1:]:
+                answer = documents[i].metadata.get("answer")
+                if answer and answer != metadata.get("answer") and answer not in alternatives:
+                    alternatives.append(answer)
+                if len(alternatives) >= max_alternatives:
+                    break
+            metadata["alternative_answers"] = json.dumps(alternatives)
+        representatives.append(Document(page_content=representative.page_content, metadata=metadata))
+
+    report = DedupReport(
+        input_documents=len(documents),
+        output_documents=len(representatives),
+        collapsed_clusters=sum(1 for cluster in clusters if len(cluster) > 1),
+        largest_cluster=max((len(cluster) for cluster in clusters), default=0),
+    )
+    return representatives, report
+
+
+def main():
+    from app.utils.data_loader import load_csv_data
+
+    parser = argparse.ArgumentParser(description="Report how much near-duplicate collapsing shrinks a corpus")
+    parser.add_argument("csv_path", help="CSV with input/output columns")
+    parser.add_argument("--threshold", type=float, action="append", help="Similarity threshold (repeatable)")
+    args = parser.parse_args()
+
+    documents = load_csv_data(args.csv_path, deduplicate=False)
+    for threshold in args.threshold or [DEDUP_THRESHOLD]:
+        _, report = collapse_duplicates(documents, threshold=threshold)
+        print(f"threshold {threshold:.2f}: {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Offline RAG evaluation runner.
+
+Reads a CSV of questions and expected answers, measures retrieval quality
+with batched vector search, generates answers with the LLM endpoint on a
+bounded worker pool, and writes one JSON line per question. Generations are
+cached on disk by (prompt hash, model params), and a killed run resumes from
+the questions already written to the output file; questions whose generation
+failed are retried.
+
+Usage:
+    python -m app.utils.evaluate --questions data/eval.csv --output logs/eval_results.jsonl
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Any, Dict, List, Optional
+import logging
+
+import pandas as pd
+
+from app.core.context_selection import CONTEXT_CANDIDATE_K, select_context
+from app.core.generation import finalize_response
+from app.core.llm import LLMManager
+from app.core.prompts import get_rag_prompt_template
+from app.db.doc_table import doc_table
+from app.db.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCache:
+    """On-disk cache of LLM generations keyed by prompt and model parameters."""
+
+    def __init__(self, cache_dir: str, generation_params: Dict[str, Any]):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory holding one JSON file per cached generation
+            generation_params: Model identity and sampling parameters
+        """
+        self.cache_dir = cache_dir
+        self.params_hash = hashlib.sha256(json.dumps(generation_params, sort_keys=True).encode()).hexdigest()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, prompt: str) -> str:
+        """Get the cache file path for a prompt."""
+        key = hashlib.sha256(f"{self.params_hash}:{prompt}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, prompt: str) -> Optional[Dict[str, Any]]:
+        """Get a cached generation, or None if the prompt has not been generated."""
+        try:
+            with open(self._path(prompt)) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def put(self, prompt: str, entry: Dict[str, Any]):
+        """Store a generation atomically."""
+        path = self._path(prompt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+
+class EvaluationRunner:
+    """Parallel, resumable evaluation of retrieval and generation quality."""
+
+    def __init__(
+        self,
+        output_path: str,
+        cache_dir: str,
+        workers: int = 8,
+        k: int = CONTEXT_CANDIDATE_K,
+        batch_size: int = 256,
+        generate: bool = True,
+    ):
+        """
+        Initialize the runner.
+
+        Args:
+            output_path: JSONL file receiving one result per question (also the checkpoint)
+            cache_dir: Directory of the generation cache
+            workers: Number of concurrent LLM calls
+            k: Number of documents retrieved per question
+            batch_size: Number of questions embedded and searched together
+            generate: Whether to generate answers or only evaluate retrieval
+        """
+        self.output_path = output_path
+        self.workers = workers
+        self.k = k
+        self.batch_size = batch_size
+        self.generate = generate
+
+        self.vector_store = VectorStore()
+        self.llm_manager = LLMManager() if generate else None
+        self.prompt_template = get_rag_prompt_template()
+        self.cache = GenerationCache(cache_dir, self.llm_manager.get_generation_params()) if generate else None
+        self._write_lock = threading.Lock()
+
+    def load_results(self) -> Dict[str, Dict[str, Any]]:
+        """Get the latest result of each question in the output file, by question id."""
+        results = {}
+        if not os.path.exists(self.output_path):
+            return results
+        with open(self.output_path) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                    # A retried question appears again further down; its latest result wins
+                    results[row["id"]] = row
+                except (json.JSONDecodeError, KeyError):
+                    # A run killed mid-write can leave a truncated last line
+                    continue
+        return results
+
+    def load_completed_ids(self) -> set:
+        """Get the ids of questions already evaluated, excluding failed generations so they are retried."""
+        return {question_id for question_id, row in self.load_results().items() if "error" not in row}
+
+    def run(self, questions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Evaluate all questions that are not yet in the output file.
+
+        Args:
+            questions: Dicts with id, question and expected keys
+
+        Returns:
+            dict: The evaluation report over all results in the output file
+        """
+        completed = self.load_completed_ids()
+        pending = [q for q in questions if q["id"] not in completed]
+        logger.info(f"{len(completed)} questions already evaluated, {len(pending)} remaining")
+
+        os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+        start_time = time.perf_counter()
+
+        # Results are written while later batches are searched, so a killed run keeps its progress
+        max_in_flight = max(self.batch_size, self.workers * 4)
+        written = 0
+        with open(self.output_path, "a") as output, ThreadPoolExecutor(max_workers=self.workers) as executor:
+            in_flight = set()
+            for batch_start in range(0, len(pending), self.batch_size):
+                batch = pending[batch_start:batch_start + self.batch_size]
+                batch_results = self.vector_store.batch_search_with_score([q["question"] for q in batch], k=self.k)
+
+                for question, docs_and_scores in zip(batch, batch_results):
+                    in_flight.add(executor.submit(self._evaluate_question, question, docs_and_scores))
+
+                finished = {future for future in in_flight if future.done()}
+                while len(in_flight) - len(finished) > max_in_flight:
+                    done, _ = wait(in_flight - finished, return_when=FIRST_COMPLETED)
+                    finished |= done
+                written += self._write_results(output, finished, written, len(pending))
+                in_flight -= finished
+
+            written += self._write_results(output, as_completed(in_flight), written, len(pending))
+
+        wall_seconds = time.perf_counter() - start_time
+        return self.build_report(wall_seconds, len(pending))
+
+    def _write_results(self, output, futures, written: int, total: int) -> int:
+        """Append finished results to the output file, returning how many were written."""
+        count = 0
+        for future in futures:
+            result = future.result()
+            with self._write_lock:
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+            count += 1
+            if (written + count) % 100 == 0:
+                logger.info(f"Evaluated {written + count}/{total} questions")
+        return count
+
+    def _evaluate_question(self, question: Dict[str, Any], docs_and_scores) -> Dict[str, Any]:
+        """Compute retrieval metrics and (cached) generation for one question."""
+        expected = _normalize(question["expected"])
+        answers = [_normalize(doc_table.answer(hit.doc_id) or "") for hit in docs_and_scores]
+        rank = next((i + 1 for i, answer in enumerate(answers) if answer == expected), None)
+
+        result = {
+            "id": question["id"],
+            "question": question["question"],
+            "expected": question["expected"],
+            "retrieval_rank": rank,
+            "best_distance": docs_and_scores[0].distance if docs_and_scores else None,
+        }
+
+        if not self.generate:
+            return result
+
+        selection = select_context(docs_and_scores)
+        prompt = self.prompt_template.format(
+            question=question["question"],
+            context=selection.get_documents(),
+            chat_history=[]
+        )
+
+        cached = self.cache.get(prompt)
+        if cached is not None:
+            result.update(response=cached["response"], endpoint_seconds=0.0, cached=True)
+            return result
+
+        try:
+            call_start = time.perf_counter()
+            response = finalize_response(self.llm_manager.get_llm().invoke(prompt)).text
+            elapsed = time.perf_counter() - call_start
+        except Exception as e:
+            logger.warning(f"Generation failed for question {question['id']}: {str(e)}")
+            result.update(error=str(e))
+            return result
+
+        self.cache.put(prompt, {"response": response, "endpoint_seconds": elapsed})
+        result.update(response=response, endpoint_seconds=elapsed, cached=False)
+        return result
+
+    def build_report(self, wall_seconds: float, processed: int) -> Dict[str, Any]:
+        """Summarise the latest result of each question in the output file."""
+        rows = list(self.load_results().values())
+
+        total = len(rows) or 1
+        ranks = [row.get("retrieval_rank") for row in rows]
+        report = {
+            "questions": len(rows),
+            "processed_this_run": processed,
+            "hit_at_1": sum(1 for r in ranks if r == 1) / total,
+            f"hit_at_{self.k}": sum(1 for r in ranks if r) / total,
+            "mrr": sum(1 / r for r in ranks if r) / total,
+            "wall_seconds": wall_seconds,
+            "throughput_qps": processed / wall_seconds if wall_seconds > 0 else 0.0,
+        }
+
+        if self.generate:
+            generated = [row for row in rows if "response" in row]
+            report.update(
+                generated=len(generated),
+                errors=sum(1 for row in rows if "error" in row),
+                cache_hits=sum(1 for row in generated if row.get("cached")),
+                endpoint_seconds=sum(row.get("endpoint_seconds", 0.0) for row in generated),
+            )
+        return report
+
+
+def _normalize(text: str) -> str:
+    """Normalise an answer for exact-match comparison."""
+    return " ".join(str(text).lower().split())
+
+
+def load_questions(path: str, question_column: str, expected_column: str) -> List[Dict[str, Any]]:
+    """
+    Load evaluation questions from a CSV file.
+
+    Args:
+        path: Path to the CSV file
+        question_column: Column holding the question text
+        expected_column: Column holding the expected answer
+
+    Returns:
+        List of dicts with id, question and expected keys
+    """
+    df = pd.read_csv(path)
+    missing_columns = [col for col in (question_column, expected_column) if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"CSV file is missing required columns: {missing_columns}")
+
+    ids = df["id"].astype(str) if "id" in df.columns else df.index.astype(str)
+    return [
+        {"id": question_id, "question": str(question), "expected": str(expected)}
+        for question_id, question, expected in zip(ids, df[question_column], df[expected_column])
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline RAG evaluation runner")
+    parser.add_argument("--questions", required=True, help="CSV file with questions and expected answers")
+    parser.add_argument("--question-column", default="input", help="Column holding the question text")
+    parser.add_argument("--expected-column", default="output", help="Column holding the expected answer")
+    parser.add_argument("--output", default=os.path.join("logs", "eval_results.jsonl"), help="Results and checkpoint file")
+    parser.add_argument("--cache-dir", default=os.path.join("logs", "eval_cache"), help="Generation cache directory")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent LLM calls")
+    parser.add_argument("--k", type=int, default=CONTEXT_CANDIDATE_K, help="Documents retrieved per question")
+    parser.add_argument("--batch-size", type=int, default=256, help="Questions embedded and searched together")
+    parser.add_argument("--retrieval-only", action="store_true", help="Skip generation")
+    parser.add_argument("--limit", type=int, default=None, help="Only evaluate the first N questions")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    questions = load_questions(args.questions, args.question_column, args.expected_column)
+    if args.limit:
+        questions = questions[:args.limit]
+
+    runner = EvaluationRunner(
+        output_path=args.output,
+        cache_dir=args.cache_dir,
+        workers=args.workers,
+        k=args.k,
+        batch_size=args.batch_size,
+        generate=not args.retrieval_only,
+    )
+    report = runner.run(questions)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
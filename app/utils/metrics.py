@@ -0,0 +1,64 @@
+import threading
+from collections import defaultdict
+from typing import Any, Dict
+
+
+class MetricsRegistry:
+    """Thread-safe in-process registry of counters, gauges and timing summaries."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._summaries = {}
+
+    def increment(self, name: str, value: float = 1):
+        """Increase a counter by the given value."""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        """Set a gauge to the given value."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Record an observation (e.g. a latency in seconds) in a summary."""
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                self._summaries[name] = {"count": 1, "sum": value, "min": value, "max": value}
+            else:
+                summary["count"] += 1
+                summary["sum"] += value
+                summary["min"] = min(summary["min"], value)
+                summary["max"] = max(summary["max"], value)
+
+    def get_counter(self, name: str) -> float:
+        """Get the current value of a counter."""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def ratio(self, numerator: str, denominator: str) -> float:
+        """Get the ratio of two counters, 0 if the denominator is 0."""
+        with self._lock:
+            total = self._counters.get(denominator, 0)
+            return self._counters.get(numerator, 0) / total if total else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get a JSON-serialisable copy of all metrics."""
+        with self._lock:
+            summaries = {
+                name: dict(summary, mean=summary["sum"] / summary["count"])
+                for name, summary in self._summaries.items()
+            }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": summaries,
+            }
+
+
+# Create a global metrics registry
+metrics = MetricsRegistry()
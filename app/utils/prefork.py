@@ -0,0 +1,259 @@
+import gc
+import os
+import random
+import signal
+import socket
+import time
+from typing import Dict, Optional
+import logging
+
+import uvicorn
+from uvicorn.importer import import_from_string
+
+logger = logging.getLogger(__name__)
+
+# Pre-fork configuration from environment variables
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", 10000))  # Recycle a worker after this many requests (0 disables)
+WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", 1000))  # Spread recycling over time
+WORKER_GRACEFUL_TIMEOUT = int(os.getenv("WORKER_GRACEFUL_TIMEOUT", 30))  # Seconds to drain before SIGKILL
+MEMORY_REPORT_INTERVAL = int(os.getenv("MEMORY_REPORT_INTERVAL", 300))  # Seconds between memory reports (0 disables)
+
+
+def read_memory_usage(pid: int) -> Optional[Dict[str, int]]:
+    """
+    Read the memory breakdown of a process from /proc.
+
+    Args:
+        pid: The process ID
+
+    Returns:
+        Dict with rss, pss, shared and private sizes in kB, or None if unavailable
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _flush_worker_queues():
+    """
+    Write out the traces and interactions a worker still has queued.
+
+    Workers leave with os._exit, which skips atexit handlers, so the
+    background writers are flushed explicitly.
+    """
+    from app.db.interaction_store import get_interaction_store
+    from app.utils.tracing import trace_writer
+
+    flushers = [trace_writer.flush_on_exit]
+    store = get_interaction_store()
+    if store is not None:
+        flushers.append(store.flush_on_exit)
+    for flush in flushers:
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Worker {os.getpid()} could not flush its queued writes: {str(e)}", exc_info=True)
+
+
+class PreforkServer:
+    """
+    Pre-fork launcher that shares the loaded application between workers.
+
+    The master imports the application once, so the embedding model and the
+    read-only indexes are loaded before forking and their pages are shared
+    copy-on-write by every worker. The master then supervises the workers:
+    it respawns workers that exit (including those recycled after
+    WORKER_MAX_REQUESTS), performs a rolling restart on SIGHUP and drains
+    all workers on SIGTERM or SIGINT.
+
+    Model weights and index data may be loaded before the fork, but state
+    bound to the process must not be created in the master before the
+    workers are forked:
+    - torch intra-op threads (i.e. no embedding calls). Forked children do
+      not get the threads, and OpenMP can deadlock in them.
+    - Chroma clients used for writes (i.e. no ingestion), so the doc table
+      and BM25 index are built from the data the workers will serve.
+    - SQLite connections and background writer threads. The interaction
+      store and trace writer reset theirs in os.register_at_fork handlers.
+    """
+
+    def __init__(self, app_path: str = "app.main:app", host: str = "0.0.0.0", port: int = 8000, workers: int = 2):
+        """
+        Initialize the launcher.
+
+        Args:
+            app_path: Import string of the ASGI application
+            host: Host to bind to
+            port: Port to bind to
+            workers: Number of worker processes
+        """
+        self.app_path = app_path
+        self.host = host
+        self.port = port
+        self.num_workers = workers
+        self.workers: Dict[int, float] = {}  # pid -> start time
+        self.app = None
+        self.sock = None
+        self._stopping = False
+        self._reload_requested = False
+
+    def run(self):
+        """Load the application, fork the workers and supervise them until shutdown."""
+        logger.info(f"Loading application {self.app_path} in master process {os.getpid()}...")
+        self.app = import_from_string(self.app_path)
+
+        # Move everything loaded so far out of the collector's reach, so the
+        # collector does not write to (and un-share) those pages in the workers
+        gc.collect()
+        gc.freeze()
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+        logger.info(f"Listening on {self.host}:{self.port} with {self.num_workers} workers")
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        for _ in range(self.num_workers):
+            self._spawn_worker()
+
+        last_report = time.monotonic()
+        try:
+            while not self._stopping:
+                self._reap_workers()
+
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self._rolling_restart()
+
+                if MEMORY_REPORT_INTERVAL and time.monotonic() - last_report >= MEMORY_REPORT_INTERVAL:
+                    self.report_memory()
+                    last_report = time.monotonic()
+
+                time.sleep(1)
+        finally:
+            self._shutdown()
+
+    def _spawn_worker(self) -> int:
+        """Fork a new worker process serving the shared socket."""
+        pid = os.fork()
+        if pid != 0:
+            self.workers[pid] = time.time()
+            logger.info(f"Started worker {pid}")
+            return pid
+
+        # Worker process: let uvicorn install its own signal handling
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+        exit_code = 0
+        try:
+            max_requests = None
+            if WORKER_MAX_REQUESTS:
+                max_requests = WORKER_MAX_REQUESTS + random.randint(0, WORKER_MAX_REQUESTS_JITTER)
+            config = uvicorn.Config(
+                self.app,
+                limit_max_requests=max_requests,
+                timeout_graceful_shutdown=WORKER_GRACEFUL_TIMEOUT,
+                log_config=None,
+            )
+            uvicorn.Server(config).run(sockets=[self.sock])
+        except Exception as e:
+            logger.error(f"Worker {os.getpid()} failed: {str(e)}", exc_info=True)
+            exit_code = 1
+        finally:
+            _flush_worker_queues()
+            os._exit(exit_code)
+
+    def _reap_workers(self):
+        """Collect exited workers and replace them unless shutting down."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self.workers.pop(pid, None) is None:
+                continue
+
+            logger.info(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+            if not self._stopping and len(self.workers) < self.num_workers:
+                self._spawn_worker()
+
+    def _rolling_restart(self):
+        """Replace workers one at a time so capacity never drops to zero."""
+        logger.info("Rolling restart of all workers...")
+        for pid in list(self.workers):
+            self._spawn_worker()
+            self._stop_worker(pid)
+
+    def _stop_worker(self, pid: int):
+        """Ask a worker to drain and exit, killing it after the graceful timeout."""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.workers.pop(pid, None)
+            return
+
+        deadline = time.monotonic() + WORKER_GRACEFUL_TIMEOUT
+        while time.monotonic() < deadline:
+            done_pid, _ = os.waitpid(pid, os.WNOHANG)
+            if done_pid == pid:
+                self.workers.pop(pid, None)
+                logger.info(f"Worker {pid} stopped")
+                return
+            time.sleep(0.2)
+
+        logger.warning(f"Worker {pid} did not stop in {WORKER_GRACEFUL_TIMEOUT}s, killing it")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        self.workers.pop(pid, None)
+
+    def _shutdown(self):
+        """Drain and stop all workers."""
+        logger.info("Shutting down workers...")
+        for pid in list(self.workers):
+            self._stop_worker(pid)
+        if self.sock is not None:
+            self.sock.close()
+
+    def _handle_stop(self, signum, frame):
+        """Signal handler for SIGTERM and SIGINT."""
+        self._stopping = True
+
+    def _handle_reload(self, signum, frame):
+        """Signal handler for SIGHUP."""
+        self._reload_requested = True
+
+    def report_memory(self):
+        """Log resident versus shared memory for the master and every worker."""
+        processes = [("master", os.getpid())] + [("worker", pid) for pid in self.workers]
+        for role, pid in processes:
+            usage = read_memory_usage(pid)
+            if usage is None:
+                continue
+            logger.info(
+                f"{role} {pid}: rss {usage['rss_kb'] / 1024:.1f} MB, "
+                f"shared {usage['shared_kb'] / 1024:.1f} MB, "
+                f"private {usage['private_kb'] / 1024:.1f} MB, "
+                f"pss {usage['pss_kb'] / 1024:.1f} MB"
+            )
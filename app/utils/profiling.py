@@ -0,0 +1,226 @@
+import cProfile
+import contextvars
+import os
+import pstats
+import random
+import re
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+import logging
+
+from app.utils.security import ADMIN_TOKEN, ADMIN_TOKEN_HEADER, is_valid_admin_token
+
+logger = logging.getLogger(__name__)
+
+# Profiling configuration from environment variables
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("logs", "profiles"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))  # Fraction of requests profiled without a header
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))  # Oldest profiles are pruned beyond this
+PROFILE_HEADER = "X-Profile"
+
+# Profiling is only possible once an admin token is configured
+PROFILING_ENABLED = bool(ADMIN_TOKEN)
+
+_PROFILE_NAME_RE = re.compile(r"^[\w.-]+\.prof$")
+_SAFE_LABEL_RE = re.compile(r"[^\w-]")
+
+# Only one request is profiled at a time
+_profiler_lock = threading.Lock()
+
+
+class RequestProfile:
+    """
+    The profilers of one request.
+
+    cProfile only sees the thread it was enabled on, so the thread handling
+    the request and every thread its work fans out to (vector search, shard
+    search) get their own profiler, and their stats are merged when the
+    profile is saved.
+    """
+
+    def __init__(self):
+        self.profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add(self, profiler: cProfile.Profile):
+        """Add the profiler of one thread."""
+        with self._lock:
+            self.profilers.append(profiler)
+
+    def stats(self) -> pstats.Stats:
+        """Merge the stats of every thread."""
+        with self._lock:
+            profilers = list(self.profilers)
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        return stats
+
+
+_current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("current_profile", default=None)
+
+
+def should_profile(headers: Mapping[str, str]) -> bool:
+    """
+    Decide whether the current request should run under the profiler.
+
+    A request is profiled when it carries ``X-Profile: 1`` together with a
+    valid admin token, or when it is picked by the configured sample rate.
+
+    Args:
+        headers: The incoming request headers
+
+    Returns:
+        bool: True if the request should be profiled
+    """
+    if not PROFILING_ENABLED:
+        return False
+
+    if headers.get(PROFILE_HEADER) and is_valid_admin_token(headers.get(ADMIN_TOKEN_HEADER)):
+        return True
+
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def run_profiled(func: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Optional[RequestProfile]]:
+    """
+    Run a callable under the deterministic profiler.
+
+    Call this on the thread that does the work (e.g. inside
+    run_in_threadpool), not on the event loop. Work the callable hands to
+    other threads through app.utils.tracing.propagate is profiled too. If
+    another request is already being profiled the callable runs
+    unprofiled and no profile is returned.
+
+    Args:
+        func: The callable to run
+        *args: Positional arguments for the callable
+        **kwargs: Keyword arguments for the callable
+
+    Returns:
+        tuple: (result, profile or None)
+    """
+    if not _profiler_lock.acquire(blocking=False):
+        logger.info("Profiler busy, running request without profiling")
+        return func(*args, **kwargs), None
+
+    profile = RequestProfile()
+    token = _current_profile.set(profile)
+    try:
+        result = profile_thread(func, *args, **kwargs)
+    finally:
+        _current_profile.reset(token)
+        _profiler_lock.release()
+
+    return result, profile
+
+
+def profile_thread(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a callable, profiling this thread if the current request is being profiled.
+
+    Args:
+        func: The callable to run
+        *args: Positional arguments for the callable
+        **kwargs: Keyword arguments for the callable
+
+    Returns:
+        The result of the callable
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return func(*args, **kwargs)
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Python 3.12+ allows a single active profiler per interpreter
+        logger.debug(f"Could not profile thread {threading.current_thread().name}: {str(e)}")
+        return func(*args, **kwargs)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profile.add(profiler)
+
+
+def save_profile(profile: RequestProfile, session_id: str) -> str:
+    """
+    Write a profile to the profile directory as a pstats file.
+
+    This does file I/O, so call it off the event loop.
+
+    Args:
+        profile: The profile holding the collected stats
+        session_id: Session ID used to tag the artifact
+
+    Returns:
+        str: The file name of the saved profile
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    label = _SAFE_LABEL_RE.sub("", session_id or "anonymous")[:64] or "anonymous"
+    file_name = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}_{label}.prof"
+    profile.stats().dump_stats(os.path.join(PROFILE_DIR, file_name))
+    logger.info(f"Saved request profile {file_name}")
+
+    _prune_profiles()
+    return file_name
+
+
+def _prune_profiles():
+    """Delete the oldest profiles beyond PROFILE_MAX_FILES."""
+    profiles = list_profiles()
+    for entry in profiles[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, entry["name"]))
+        except OSError as e:
+            logger.warning(f"Could not prune profile {entry['name']}: {str(e)}")
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """
+    List saved profiles, newest first.
+
+    Returns:
+        List of dicts with name, session_id, size_bytes and created_at
+    """
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if not _PROFILE_NAME_RE.match(name):
+            continue
+        path = os.path.join(PROFILE_DIR, name)
+        stat = os.stat(path)
+        profiles.append({
+            "name": name,
+            "session_id": name[:-len(".prof")].split("_", 1)[-1],
+            "size_bytes": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "_mtime": stat.st_mtime,
+        })
+
+    profiles.sort(key=lambda p: p["_mtime"], reverse=True)
+    for entry in profiles:
+        del entry["_mtime"]
+    return profiles
+
+
+def get_profile_path(name: str) -> Optional[str]:
+    """
+    Resolve a profile name to a path inside the profile directory.
+
+    Args:
+        name: The profile file name as returned by list_profiles
+
+    Returns:
+        The file path, or None if the name is invalid or does not exist
+    """
+    if not _PROFILE_NAME_RE.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,23 @@
+import hmac
+import os
+from typing import Optional
+
+# Shared secret for operator-only features (profiling, admin endpoints).
+# When unset, every admin feature is disabled.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def is_valid_admin_token(token: Optional[str]) -> bool:
+    """
+    Check a token against the configured admin token.
+
+    Args:
+        token: The token supplied by the caller
+
+    Returns:
+        bool: True if admin features are enabled and the token matches
+    """
+    if not ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
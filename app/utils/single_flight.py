@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait for the leader's result (or exception)
+    instead of running the function themselves. Once the leader finishes the
+    key is forgotten, so later calls run again.
+    """
+
+    def __init__(self):
+        """Initialize with no calls in flight."""
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run func once per key among concurrent callers.
+
+        Args:
+            key: Identifies calls that may share a result
+            func: Zero-argument callable computing the result
+
+        Returns:
+            tuple: (result, shared) where shared is True if the result came
+            from another caller's execution
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+
+        if not leader:
+            return call.result(), True
+
+        try:
+            result = func()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+        return result, False
+
+    def in_flight(self) -> int:
+        """Get the number of keys currently being computed."""
+        with self._lock:
+            return len(self._calls)
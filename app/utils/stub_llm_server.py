@@ -0,0 +1,135 @@
+"""
+Local stand-in for a text-generation-inference endpoint, for exercising
+endpoint routing without a real model.
+
+Usage:
+    python -m app.utils.stub_llm_server --port 8081 --latency 0.2
+    python -m app.utils.stub_llm_server --port 8082 --latency 1.0 --error-rate 0.2
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+STUB_RESPONSE = "Thanks for reaching out! Could you DM us your account details so we can take a closer look?"
+
+
+class StubLLMServer:
+    """
+    HTTP server answering text-generation requests after a fixed latency.
+
+    Implements the parts of the text-generation-inference API the endpoint
+    client uses: a JSON response for plain requests, server-sent events
+    (one token per event) when the request asks to stream, and GET /health.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.1, token_latency: float = 0.005, error_rate: float = 0.0, response: str = STUB_RESPONSE):
+        """
+        Initialize the server.
+
+        Args:
+            port: Port to listen on (0 picks a free port)
+            latency: Seconds before the first token
+            token_latency: Seconds between streamed tokens
+            error_rate: Fraction of requests answered with HTTP 503
+            response: Text returned for every request
+        """
+        self.latency = latency
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.response = response
+        self.requests = 0
+        self.available = True
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self.send_response(200 if stub.available else 503)
+                self.end_headers()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub.requests += 1
+                time.sleep(stub.latency)
+                if not stub.available or random.random() < stub.error_rate:
+                    self.send_response(503)
+                    self.send_header("Content-Type", "application/json")
+                    self.end_headers()
+                    self.wfile.write(json.dumps({"error": "stub endpoint unavailable"}).encode())
+                    return
+
+                if body.get("stream"):
+                    self._stream(stub.response)
+                else:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.end_headers()
+                    self.wfile.write(json.dumps([{"generated_text": stub.response}]).encode())
+
+            def _stream(self, text):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                words = text.split(" ")
+                try:
+                    for i, word in enumerate(words):
+                        token = word if i == 0 else " " + word
+                        event = {
+                            "index": i + 1,
+                            "token": {"id": i, "text": token, "logprob": 0.0, "special": False},
+                            "generated_text": text if i == len(words) - 1 else None,
+                            "details": None,
+                        }
+                        self.wfile.write(f"data:{json.dumps(event)}\n\n".encode())
+                        self.wfile.flush()
+                        time.sleep(stub.token_latency)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading, as it does once the answer is complete
+                    pass
+
+        return Handler
+
+    def start(self) -> "StubLLMServer":
+        """Serve on a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub text-generation endpoint")
+    parser.add_argument("--port", type=int, default=8081, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail with 503")
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.port, args.latency, args.token_latency, args.error_rate)
+    print(f"Stub LLM endpoint listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
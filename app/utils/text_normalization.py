@@ -0,0 +1,71 @@
+import os
+import re
+import unicodedata
+from typing import Iterable, List
+
+# Normalization configuration from environment variables
+TEXT_NORMALIZATION_ENABLED = os.getenv("TEXT_NORMALIZATION_ENABLED", "false").lower() == "true"  # Rebuild the index after changing
+
+_HANDLE_RE = re.compile(r"@\w+")
+_URL_RE = re.compile(r"(?:https?://|www\.)\S+")
+# Runs of three or more of the same letter or punctuation mark ("meeeee", "!!!!!") are
+# cut to two; digits are left alone so amounts and order numbers survive
+_ELONGATION_RE = re.compile(r"([^\W\d_]|[!?.])\1{2,}")
+_WHITESPACE_RE = re.compile(r"\s+")
+# Emoji, pictographs, dingbats, variation selectors and zero-width joiners carry no
+# meaning for the embedding model, which maps them to [UNK]
+_EMOJI_RE = re.compile(
+    "["
+    "\U0001F000-\U0001FAFF"
+    "\U00002600-\U000027BF"
+    "\U0001F1E6-\U0001F1FF"
+    "\U0000FE00-\U0000FE0F"
+    "\U0000200B-\U0000200D"
+    "\U00002060"
+    "]+"
+)
+
+
+def normalize_tweet(text: str) -> str:
+    """
+    Normalize a tweet for embedding and cache keys.
+
+    Removes @handles, URLs and emoji, folds unicode (NFKC and case
+    folding), shortens letter elongations to two repeats and collapses
+    whitespace. ASCII text, the bulk of the corpus, skips the unicode steps.
+    The original text is what gets stored and displayed; only embeddings
+    and keys are computed from the normalized form.
+
+    Args:
+        text: The raw tweet
+
+    Returns:
+        str: The normalized text
+    """
+    if not text:
+        return ""
+    text = _URL_RE.sub(" ", text)
+    text = _HANDLE_RE.sub(" ", text)
+    if text.isascii():
+        text = text.lower()
+    else:
+        text = _EMOJI_RE.sub(" ", unicodedata.normalize("NFKC", text)).casefold()
+    text = _ELONGATION_RE.sub(r"\1\1", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def normalize_texts(texts: Iterable[str]) -> List[str]:
+    """Normalize many texts."""
+    return [normalize_tweet(text) for text in texts]
+
+
+def normalize_for_embedding(text: str) -> str:
+    """
+    Get the text the embedding model should see.
+
+    Falls back to the raw text when normalization is disabled or would
+    leave nothing (e.g. a tweet that is only a handle and a link).
+    """
+    if not TEXT_NORMALIZATION_ENABLED:
+        return text
+    return normalize_tweet(text) or text
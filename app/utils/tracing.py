@@ -0,0 +1,459 @@
+"""
+Per-request tracing: a span tree per chat request, written as JSON lines.
+
+Usage:
+    python -m app.utils.tracing report logs/requests.jsonl* --top 10
+"""
+import argparse
+import atexit
+import contextvars
+import fcntl
+import glob
+import itertools
+import json
+import os
+import queue
+import random
+import statistics
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import logging
+
+from app.utils.metrics import metrics
+from app.utils.profiling import profile_thread
+
+logger = logging.getLogger(__name__)
+
+# Tracing configuration from environment variables
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.1))  # Fraction of requests traced, decided at the start
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join("logs", "requests.jsonl"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", 50 * 1024 * 1024))  # Size at which the trace file is rotated
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", 5))  # Rotated files kept
+TRACE_FLUSH_SIZE = int(os.getenv("TRACE_FLUSH_SIZE", 100))  # Traces per write
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", 1.0))  # Max seconds a trace waits
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", 10000))  # Traces beyond this are dropped, never blocking requests
+TRACE_HEADER = "X-Trace"  # Forces a request to be traced
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed stage of a traced request."""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start", "end", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[int], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = next(trace.span_ids)
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = dict(attributes)
+        self.error: Optional[str] = None
+        trace.spans.append(self)
+
+    def set(self, **attributes):
+        """Add attributes to the span."""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the span with times in milliseconds from the start of the trace."""
+        end = self.end if self.end is not None else time.perf_counter()
+        record = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.start - self.trace.origin) * 1000, 3),
+            "end_ms": round((end - self.trace.origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+        }
+        if self.error is not None:
+            record["error"] = self.error
+        return record
+
+
+class _NoopSpan:
+    """Stands in for a span when the request is not sampled."""
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans recorded for one request."""
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = datetime.now().isoformat()
+        self.origin = time.perf_counter()
+        self.span_ids = itertools.count()
+        # Appended from several threads; list.append is atomic
+        self.spans: List[Span] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the trace as one JSON-serialisable record."""
+        return {
+            "trace_id": self.trace_id,
+            "timestamp": self.started_at,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+@contextmanager
+def start_trace(name: str, force: bool = False, sample_rate: float = TRACE_SAMPLE_RATE, **attributes) -> Iterator[Any]:
+    """
+    Trace a request, if it is sampled.
+
+    The sampling decision is made here, at the head of the request; spans
+    opened while it runs (in this context, or in threads given a copy of
+    it with ``propagate``) join the trace. The trace is queued for writing
+    when the block exits.
+
+    Args:
+        name: Name of the root span
+        force: Trace regardless of the sample rate
+        sample_rate: Fraction of requests traced
+        **attributes: Attributes of the root span
+
+    Yields:
+        The root span, or a no-op span if the request is not traced
+    """
+    if not TRACING_ENABLED or (not force and random.random() >= sample_rate):
+        yield NOOP_SPAN
+        return
+
+    trace = Trace()
+    root = Span(trace, name, None, attributes)
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        root.end = time.perf_counter()
+        _current_span.reset(token)
+        trace_writer.write(trace.to_dict())
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """
+    Time a stage of the current request as a child of the current span.
+
+    Does nothing, cheaply, when the request is not traced.
+
+    Yields:
+        The span, or a no-op span if the request is not traced
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def annotate(**attributes):
+    """Add attributes to the current span, if the request is traced."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def propagate(func: Callable) -> Callable:
+    """
+    Bind func to a copy of the current context for running on another thread.
+
+    Spans it opens join the trace, and if the request is being profiled the
+    thread it runs on is profiled too. Each call runs in its own copy, so
+    the result can be mapped over a pool.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(profile_thread, func, *args, **kwargs)
+
+
+class TraceWriter:
+    """
+    Writes traces as JSON lines from a background thread.
+
+    Traces are queued without blocking (and dropped if the queue is full),
+    written in batches of up to TRACE_FLUSH_SIZE or every
+    TRACE_FLUSH_INTERVAL seconds, and the file is rotated to ``.1``,
+    ``.2``, ... once it would exceed TRACE_MAX_BYTES. Workers of the
+    pre-fork launcher share the file, so the size check, rotation and
+    append are done under an exclusive lock on a hidden ``.lock`` file
+    next to it.
+    """
+
+    def __init__(
+        self,
+        path: str = TRACE_FILE,
+        max_bytes: int = TRACE_MAX_BYTES,
+        backup_count: int = TRACE_BACKUP_COUNT,
+        flush_size: int = TRACE_FLUSH_SIZE,
+        flush_interval: float = TRACE_FLUSH_INTERVAL,
+    ):
+        """
+        Initialize the writer; its thread is started on the first trace.
+
+        Args:
+            path: Trace file
+            max_bytes: Size at which the file is rotated
+            backup_count: Number of rotated files kept
+            flush_size: Maximum traces per write
+            flush_interval: Maximum seconds a queued trace waits
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._writer_lock = threading.Lock()
+        self._reset()
+
+        # The writer thread does not survive fork (e.g. the pre-fork launcher)
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush_on_exit)
+
+    def _reset(self):
+        """Drop per-process state; the writer thread is started on the next trace."""
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._writer = None
+        # A lock file inherited from the parent would share its lock, so each process opens its own
+        self._lock_file = None
+
+    def write(self, record: Dict[str, Any]):
+        """Queue a trace for the next batched write."""
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+                    self._writer.start()
+        try:
+            self._queue.put_nowait(record)
+            metrics.increment("traces_recorded")
+        except queue.Full:
+            metrics.increment("traces_dropped")
+
+    def flush(self):
+        """Block until every queued trace has been written."""
+        self._queue.join()
+
+    def flush_on_exit(self):
+        """Write queued traces before the process exits."""
+        if self._writer is not None and self._writer.is_alive():
+            self.flush()
+
+    def _write_loop(self):
+        """Drain the queue into batched appends."""
+        pending = self._queue
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._append("".join(json.dumps(record, default=str) + "\n" for record in batch))
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} traces: {str(e)}", exc_info=True)
+            finally:
+                for _ in batch:
+                    pending.task_done()
+
+    def _append(self, data: str):
+        """Append to the trace file, rotating it first if it would grow too large."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self._lock_file is None:
+            self._lock_file = open(os.path.join(directory, f".{os.path.basename(self.path)}.lock"), "a")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _rotate(self):
+        """Shift path.N to path.N+1, dropping the oldest, and move the current file to path.1."""
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+# Create the process-wide trace writer
+trace_writer = TraceWriter()
+
+
+def load_traces(paths: List[str]) -> List[Dict[str, Any]]:
+    """Read traces from JSON lines files, skipping malformed lines."""
+    traces = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    traces.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return traces
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return sorted_values[max(int(round(fraction * len(sorted_values))) - 1, 0)]
+
+
+def _stage_totals(trace: Dict[str, Any]) -> Dict[str, float]:
+    """Total milliseconds per stage name in a trace, excluding the root span."""
+    totals: Dict[str, float] = {}
+    for record in trace["spans"]:
+        if record["parent_id"] is not None:
+            totals[record["name"]] = totals.get(record["name"], 0.0) + record["duration_ms"]
+    return totals
+
+
+def summarize(traces: List[Dict[str, Any]], top: int = 10) -> Dict[str, Any]:
+    """
+    Aggregate traces into request latency, per-stage and slowest-request breakdowns.
+
+    The per-stage table includes each stage's mean in the slowest 5% of
+    requests, so stages that drive tail latency stand out against their
+    overall mean.
+
+    Args:
+        traces: Trace records
+        top: Number of slowest requests to list
+
+    Returns:
+        dict: {"requests", "latency_ms", "stages", "slowest"}
+    """
+    rooted = []
+    for trace in traces:
+        root = next((record for record in trace.get("spans", []) if record["parent_id"] is None), None)
+        if root is not None:
+            rooted.append((root, trace))
+    if not rooted:
+        return {"requests": 0, "latency_ms": {}, "stages": {}, "slowest": []}
+
+    durations = sorted(root["duration_ms"] for root, _ in rooted)
+    tail_cutoff = _percentile(durations, 0.95)
+    tail = [trace for root, trace in rooted if root["duration_ms"] >= tail_cutoff]
+
+    per_stage: Dict[str, List[float]] = {}
+    for _, trace in rooted:
+        for name, total in _stage_totals(trace).items():
+            per_stage.setdefault(name, []).append(total)
+    tail_stage: Dict[str, List[float]] = {}
+    for trace in tail:
+        for name, total in _stage_totals(trace).items():
+            tail_stage.setdefault(name, []).append(total)
+
+    stages = {}
+    for name, values in sorted(per_stage.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        stages[name] = {
+            "count": len(values),
+            "mean_ms": round(statistics.mean(values), 2),
+            "p50_ms": round(_percentile(values, 0.5), 2),
+            "p95_ms": round(_percentile(values, 0.95), 2),
+            "max_ms": round(values[-1], 2),
+            "tail_mean_ms": round(statistics.mean(tail_stage[name]), 2) if name in tail_stage else None,
+        }
+
+    slowest = []
+    for root, trace in sorted(rooted, key=lambda pair: -pair[0]["duration_ms"])[:top]:
+        slowest.append({
+            "trace_id": trace["trace_id"],
+            "timestamp": trace.get("timestamp"),
+            "duration_ms": root["duration_ms"],
+            "attributes": root.get("attributes", {}),
+            "stages": {name: round(total, 2) for name, total in _stage_totals(trace).items()},
+        })
+
+    return {
+        "requests": len(rooted),
+        "latency_ms": {
+            "mean": round(statistics.mean(durations), 2),
+            "p50": round(_percentile(durations, 0.5), 2),
+            "p95": round(_percentile(durations, 0.95), 2),
+            "p99": round(_percentile(durations, 0.99), 2),
+            "max": round(durations[-1], 2),
+        },
+        "stages": stages,
+        "slowest": slowest,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze request traces")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = subparsers.add_parser("report", help="Slowest requests and per-stage latency breakdown")
+    report_parser.add_argument("paths", nargs="*", help="Trace files (default: the trace file and its rotations)")
+    report_parser.add_argument("--top", type=int, default=10, help="Number of slowest requests to list")
+    report_parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+
+    args = parser.parse_args()
+    paths = args.paths or sorted(glob.glob(f"{TRACE_FILE}*"))
+    summary = summarize(load_traces(paths), top=args.top)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{summary['requests']} traced requests from {len(paths)} file(s)")
+    if not summary["requests"]:
+        return
+    latency = summary["latency_ms"]
+    print(f"Latency: mean {latency['mean']} ms, p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+          f"p99 {latency['p99']} ms, max {latency['max']} ms")
+
+    print("\n== Stages (ms) ==")
+    print(f"{'stage':<20}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'max':>10}{'p95+ mean':>12}")
+    for name, stage in summary["stages"].items():
+        tail_mean = stage["tail_mean_ms"] if stage["tail_mean_ms"] is not None else "-"
+        print(f"{name:<20}{stage['count']:>8}{stage['mean_ms']:>10}{stage['p50_ms']:>10}"
+              f"{stage['p95_ms']:>10}{stage['max_ms']:>10}{tail_mean:>12}")
+
+    print(f"\n== Slowest {len(summary['slowest'])} requests ==")
+    for request in summary["slowest"]:
+        breakdown = ", ".join(f"{name} {total}" for name, total in sorted(request["stages"].items(), key=lambda item: -item[1]))
+        print(f"{request['duration_ms']:>10} ms  {request['trace_id']}  {request['timestamp']}  {breakdown}")
+
+
+if __name__ == "__main__":
+    main()
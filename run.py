@@ -1,7 +1,23 @@
+"""
+Start the Twitter support chatbot.
+
+Usage:
+    python run.py                          # ingest, then serve with auto-reload
+    python run.py --ingest-only            # load data/final_data.csv into the vector store and exit
+    python run.py --production --workers 4 # serve with pre-forked workers (no ingestion)
+
+The application is only imported by the process that serves it. In
+production mode nothing is ingested, because the pre-fork master must not
+initialize per-process state before it forks (see PreforkServer). Run
+--ingest-only, or an index rebuild through the admin API, as a separate step.
+"""
+import argparse
+import atexit
+import subprocess
+import sys
 import uvicorn
-from app.main import app
-from app.db.vector_store import VectorStore
-from app.utils.data_loader import load_csv_data
+from app.db.embeddings import EMBEDDING_SERVER_SOCKET
+from app.utils.prefork import PreforkServer
 import os
 import logging
 
@@ -9,37 +25,108 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the Twitter support chatbot")
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        default=os.getenv("APP_ENV") == "production",
+        help="Serve with pre-forked workers instead of the auto-reloading development server"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_WORKERS", os.cpu_count() or 1)),
+        help="Number of worker processes in production mode"
+    )
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)), help="Port to listen on")
+    parser.add_argument("--skip-ingest", action="store_true", help="Do not load the CSV into the vector store on startup")
+    parser.add_argument("--ingest-only", action="store_true", help="Load the CSV into the vector store and exit")
+    parser.add_argument(
+        "--embedding-server",
+        action="store_true",
+        default=os.getenv("EMBEDDING_SERVER_AUTOSTART", "false").lower() == "true",
+        help="Start the shared embedding server on EMBEDDING_SERVER_SOCKET before serving"
+    )
+    return parser.parse_args()
+
+def start_embedding_server():
+    """Start the embedding server process and wait until it answers."""
+    from app.db.embedding_server import wait_for_server
+
+    logger.info(f"Starting embedding server on {EMBEDDING_SERVER_SOCKET}...")
+    process = subprocess.Popen([sys.executable, "-m", "app.db.embedding_server", "--socket", EMBEDDING_SERVER_SOCKET])
+    launcher_pid = os.getpid()
+
+    def stop():
+        # Forked workers inherit this handler; only the launcher owns the server
+        if os.getpid() == launcher_pid and process.poll() is None:
+            process.terminate()
+            process.wait()
+
+    atexit.register(stop)
+    if not wait_for_server(EMBEDDING_SERVER_SOCKET):
+        logger.warning("Embedding server did not start in time; workers will embed in-process until it answers")
+
+def ingest():
+    """Load the CSV into the vector store."""
+    from app.db.vector_store import VectorStore
+    from app.utils.data_loader import load_csv_data
+
+    # Initialize vector store
+    logger.info("Initializing vector store...")
+    vector_store = VectorStore()
+
+    # Load data from CSV
+    csv_path = os.path.join("data", "final_data.csv")
+    logger.info(f"Loading data from {csv_path}...")
+
+    if not os.path.exists(csv_path):
+        logger.error(f"CSV file not found at {csv_path}")
+        # Optionally create dummy data or handle this case
+        # For now, we proceed assuming the store might exist or be populated later
+    else:
+        documents = load_csv_data(csv_path)
+        logger.info(f"Loaded {len(documents)} documents from CSV.")
+        vector_store.add_documents(documents)
+
 def main():
+    args = parse_args()
     try:
-        # Initialize vector store
-        logger.info("Initializing vector store...")
-        vector_store = VectorStore()
-        
-        # Load data from CSV
-        csv_path = os.path.join("data", "final_data.csv")
-        logger.info(f"Loading data from {csv_path}...")
-        
-        if not os.path.exists(csv_path):
-            logger.error(f"CSV file not found at {csv_path}")
-            # Optionally create dummy data or handle this case
-            # For now, we proceed assuming the store might exist or be populated later
+        if args.ingest_only:
+            ingest()
+            return
+
+        if args.embedding_server:
+            if EMBEDDING_SERVER_SOCKET:
+                start_embedding_server()
+            else:
+                logger.warning("--embedding-server needs EMBEDDING_SERVER_SOCKET; embedding in-process")
+
+        if args.production:
+            # The master must not build models, clients or indexes before the application is loaded and forked
+            if not args.skip_ingest:
+                logger.warning("Production mode does not ingest; run `python run.py --ingest-only` first")
+        elif not args.skip_ingest:
+            ingest()
+
+        if args.production:
+            # Load the model and indexes once, then fork workers that share them copy-on-write
+            logger.info(f"Starting FastAPI server with {args.workers} pre-forked workers...")
+            PreforkServer("app.main:app", host="0.0.0.0", port=args.port, workers=args.workers).run()
         else:
-            documents = load_csv_data(csv_path)
-            logger.info(f"Loaded {len(documents)} documents from CSV.")
-            vector_store.add_documents(documents)
-        
-        # Start FastAPI server
-        logger.info("Starting FastAPI server...")
-        uvicorn.run(
-            "app.main:app",
-            host="0.0.0.0",
-            port=8000,
-            reload=True
-        )
-        
+            # Hot reload is for development only
+            logger.info("Starting FastAPI development server...")
+            uvicorn.run(
+                "app.main:app",
+                host="0.0.0.0",
+                port=args.port,
+                reload=True
+            )
+
     except Exception as e:
         logger.error(f"An error occurred: {str(e)}", exc_info=True)
         raise
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
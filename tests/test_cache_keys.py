@@ -0,0 +1,80 @@
+import pytest
+
+from app.utils import cache_keys
+
+
+class FakeRedis:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.values = {}
+        self.incr_calls = 0
+
+    def incr(self, key):
+        self.incr_calls += 1
+        if self.fail:
+            raise ConnectionError("connection refused")
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def get(self, key):
+        return self.values.get(key)
+
+
+@pytest.fixture(autouse=True)
+def reset_state(monkeypatch):
+    monkeypatch.setattr(cache_keys, "_redis_client", None)
+    monkeypatch.setattr(cache_keys, "_bump_client", None)
+    monkeypatch.setattr(cache_keys, "_bump_client_unavailable_until", 0.0)
+    monkeypatch.setattr(cache_keys, "_index_version", 0)
+    monkeypatch.setattr(cache_keys, "_index_version_checked_at", 0.0)
+
+
+def test_bump_changes_the_namespace_of_query_keys():
+    before = cache_keys.query_cache_key("response", "Where is my bag?")
+
+    cache_keys.bump_cache_version("test")
+
+    after = cache_keys.query_cache_key("response", "Where is my bag?")
+    assert before != after
+    assert after == cache_keys.query_cache_key("response", "@Delta where is my bag?")
+
+
+def test_bump_uses_the_initialized_client():
+    client = FakeRedis()
+    cache_keys.set_redis_client(client)
+
+    assert cache_keys.bump_cache_version() == 1
+    assert cache_keys.bump_cache_version() == 2
+    assert client.incr_calls == 2
+
+
+def test_fallback_client_is_reused_and_backs_off_after_a_failure(monkeypatch):
+    client = FakeRedis(fail=True)
+    monkeypatch.setattr(cache_keys, "_bump_client", client)
+
+    assert cache_keys.bump_cache_version() == 1
+    assert cache_keys.bump_cache_version() == 2
+
+    # The local version still moves on, but the unreachable server is not retried
+    assert client.incr_calls == 1
+
+
+def test_fallback_client_is_retried_after_the_backoff(monkeypatch):
+    client = FakeRedis(fail=True)
+    monkeypatch.setattr(cache_keys, "_bump_client", client)
+    cache_keys.bump_cache_version()
+
+    client.fail = False
+    monkeypatch.setattr(cache_keys, "_bump_client_unavailable_until", 0.0)
+    cache_keys.bump_cache_version()
+
+    assert client.incr_calls == 2
+
+
+def test_version_is_refreshed_from_redis(monkeypatch):
+    client = FakeRedis()
+    client.values[cache_keys.CACHE_VERSION_KEY] = "7"
+    cache_keys.set_redis_client(client)
+
+    assert cache_keys.get_index_version() == 7
+    assert ":i7:" in cache_keys.get_cache_namespace()
@@ -0,0 +1,168 @@
+import threading
+import time
+
+import pytest
+
+from app.core.prefetch import Prefetcher
+from app.core.response_cache import ResponseCache
+from app.db.doc_table import Hit, doc_table
+from app.utils.metrics import metrics
+from app.utils.single_flight import SingleFlight
+
+chat_service = pytest.importorskip("app.services.chat_service", reason="needs the application's model dependencies")
+
+CALLERS = 16
+ANSWER = "Please DM us your booking reference."
+
+
+class FakeLLM:
+    """Counts calls and holds each one until released, so concurrent callers pile up behind it."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def _generate(self):
+        with self._lock:
+            self.calls += 1
+        self.release.wait(timeout=5)
+        if self.error is not None:
+            raise self.error
+
+    def invoke(self, prompt):
+        self._generate()
+        return ANSWER
+
+    def stream(self, prompt):
+        self._generate()
+        yield from (word + " " for word in ANSWER.split())
+
+
+class FakeSessionManager:
+    def __init__(self):
+        self.writes = []
+        self._lock = threading.Lock()
+
+    def get_history(self, session_id):
+        return []
+
+    def add_interaction(self, session_id, query, response, documents, **kwargs):
+        with self._lock:
+            self.writes.append((session_id, query, response))
+
+
+class FakeVectorStore:
+    version_name = "v1"
+
+    def __init__(self):
+        self.doc_id = doc_table.intern("where is my bag", {"answer": ANSWER})
+
+    def search_with_score(self, query, k=5):
+        return [Hit(self.doc_id, 0.5)]
+
+
+class FakePromptTemplate:
+    def format(self, question, chat_history, context):
+        return f"{context}\n{question}"
+
+
+def make_service(llm):
+    service = chat_service.ChatService.__new__(chat_service.ChatService)
+    service.session_manager = FakeSessionManager()
+    service.vector_store = FakeVectorStore()
+    service.llm = llm
+    service.prompt_template = FakePromptTemplate()
+    service.fast_path_enabled = False
+    service.llm_latency_ewma = None
+    service.single_flight = SingleFlight()
+    service.prefetcher = Prefetcher(lambda text: [], lambda: "v1", enabled=False)
+    service.response_cache = ResponseCache(enabled=False)
+    return service
+
+
+def run_concurrently(service, llm, query="Where is my bag?"):
+    """Call handle_query from CALLERS threads at once; returns (results, errors) per thread."""
+    start = threading.Barrier(CALLERS)
+    results, errors = [None] * CALLERS, [None] * CALLERS
+
+    def call(index):
+        start.wait()
+        try:
+            results[index] = service.handle_query(query, session_id=f"session-{index}")
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    # Give every caller time to join the leader's flight before the LLM answers
+    time.sleep(0.3)
+    llm.release.set()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results, errors
+
+
+@pytest.fixture(autouse=True)
+def coalesce(monkeypatch):
+    monkeypatch.setattr(chat_service, "SINGLE_FLIGHT_ENABLED", True)
+
+
+def test_identical_concurrent_queries_call_the_llm_once():
+    llm = FakeLLM()
+    service = make_service(llm)
+
+    results, errors = run_concurrently(service, llm)
+
+    assert errors == [None] * CALLERS
+    assert llm.calls == 1
+    assert {response for _, response in results} == {ANSWER}
+    # Every caller records the interaction in its own session
+    assert sorted(session_id for session_id, _, _ in service.session_manager.writes) == sorted(
+        f"session-{i}" for i in range(CALLERS)
+    )
+
+
+def test_leader_exception_propagates_to_every_follower():
+    failure = RuntimeError("endpoint down")
+    llm = FakeLLM(error=failure)
+    service = make_service(llm)
+
+    results, errors = run_concurrently(service, llm)
+
+    assert llm.calls == 1
+    assert all(error is failure for error in errors)
+    assert service.session_manager.writes == []
+
+
+def test_later_queries_run_again():
+    llm = FakeLLM()
+    llm.release.set()
+    service = make_service(llm)
+
+    service.handle_query("Where is my bag?", session_id="a")
+    service.handle_query("Where is my bag?", session_id="b")
+
+    assert llm.calls == 2
+
+
+@pytest.mark.parametrize("fast_path", [False, True])
+def test_warm_ups_are_not_counted_as_chat_requests(fast_path):
+    llm = FakeLLM()
+    llm.release.set()
+    service = make_service(llm)
+    service.response_cache = ResponseCache(enabled=True)
+    service.fast_path_enabled = fast_path
+    if fast_path:
+        service.vector_store.search_with_score = lambda query, k=5: [Hit(service.vector_store.doc_id, 0.01)]
+    before = {name: metrics.get_counter(name) for name in ("chat_requests", "fast_path_hits", "cache_warm_answers")}
+
+    assert service.warm_answer("Where is my bag?")
+    assert not service.warm_answer("Where is my bag?")
+
+    assert metrics.get_counter("chat_requests") == before["chat_requests"]
+    assert metrics.get_counter("fast_path_hits") == before["fast_path_hits"]
+    assert metrics.get_counter("cache_warm_answers") == before["cache_warm_answers"] + 1
+    assert llm.calls == (0 if fast_path else 1)
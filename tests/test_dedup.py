@@ -0,0 +1,51 @@
+import zlib
+
+from langchain.schema import Document
+
+from app.utils.dedup import _MAX_HASH, _MERSENNE_PRIME, MinHasher, collapse_duplicates, find_duplicate_clusters, shingles
+
+
+def test_signature_matches_exact_arithmetic():
+    hasher = MinHasher(num_perm=32)
+    text = "my flight to boston was cancelled and nobody at the gate can help"
+
+    hashes = [zlib.crc32(s.encode()) for s in set(shingles(text))]
+    expected = [
+        min(((int(a) * h + int(b)) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in zip(hasher.a, hasher.b)
+    ]
+
+    assert hasher.signature(text).tolist() == expected
+
+
+def test_hash_parameters_do_not_overflow():
+    hasher = MinHasher(num_perm=256)
+
+    assert int(hasher.a.max()) <= _MAX_HASH
+    assert int(hasher.b.max()) < _MERSENNE_PRIME
+
+
+def test_near_duplicates_are_clustered():
+    texts = [
+        "@AirlineSupport my flight to Boston was cancelled and nobody at the gate can help me",
+        "@OtherHandle my flight to Boston was cancelled and nobody at the gate can help me",
+        "How do I change the name on my booking?",
+    ]
+
+    clusters = find_duplicate_clusters(texts, threshold=0.8)
+
+    assert sorted(clusters) == [[0, 1], [2]]
+
+
+def test_collapse_keeps_first_document_and_alternative_answers():
+    documents = [
+        Document(page_content="my package says delivered but it is not here", metadata={"answer": "DM us your order number"}),
+        Document(page_content="my package says delivered but it is not here!!", metadata={"answer": "Please check with neighbours"}),
+    ]
+
+    representatives, report = collapse_duplicates(documents, threshold=0.8)
+
+    assert len(representatives) == 1
+    assert representatives[0].metadata["duplicate_count"] == 1
+    assert representatives[0].metadata["alternative_answers"] == '["Please check with neighbours"]'
+    assert report.collapsed_clusters == 1
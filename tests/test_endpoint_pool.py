@@ -0,0 +1,191 @@
+import pytest
+
+from app.core import endpoint_pool
+from app.core.endpoint_pool import CLOSED, HALF_OPEN, OPEN, Endpoint, EndpointPool, PooledLLM
+
+
+class FakeLLM:
+    """Answers with a fixed text, or fails with ConnectionError once `fail_after` chunks were streamed."""
+
+    def __init__(self, text="ok", fail=False, fail_after=0):
+        self.text = text
+        self.fail = fail
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("endpoint down")
+        return self.text
+
+    def stream(self, prompt, **kwargs):
+        self.calls += 1
+        for i, word in enumerate(self.text.split()):
+            if self.fail and i >= self.fail_after:
+                raise ConnectionError("endpoint down")
+            yield word + " "
+        if self.fail:
+            raise ConnectionError("endpoint down")
+
+
+def make_pool(*endpoints, policy="ewma"):
+    return EndpointPool(list(endpoints), policy=policy)
+
+
+def test_ewma_prefers_lower_latency():
+    fast = Endpoint("fast", FakeLLM(), latency_ewma=0.1)
+    slow = Endpoint("slow", FakeLLM(), latency_ewma=0.5)
+    pool = make_pool(fast, slow)
+
+    assert pool.acquire() is fast
+
+
+def test_ewma_scales_latency_by_outstanding_and_weight():
+    fast = Endpoint("fast", FakeLLM(), latency_ewma=0.1, outstanding=5)
+    slow = Endpoint("slow", FakeLLM(), latency_ewma=0.5)
+    assert make_pool(fast, slow).acquire() is slow
+
+    light = Endpoint("light", FakeLLM(), latency_ewma=0.2)
+    heavy = Endpoint("heavy", FakeLLM(), latency_ewma=0.3, weight=2.0)
+    assert make_pool(light, heavy).acquire() is heavy
+
+
+def test_ewma_tries_unmeasured_endpoints_first():
+    measured = Endpoint("measured", FakeLLM(), latency_ewma=0.1)
+    new = Endpoint("new", FakeLLM())
+
+    assert make_pool(measured, new).acquire() is new
+
+
+def test_least_outstanding_ignores_latency_and_honours_weights():
+    busy = Endpoint("busy", FakeLLM(), latency_ewma=0.01, outstanding=2)
+    idle = Endpoint("idle", FakeLLM(), latency_ewma=5.0, outstanding=1)
+    assert make_pool(busy, idle, policy="least_outstanding").acquire() is idle
+
+    big = Endpoint("big", FakeLLM(), outstanding=2, weight=4.0)
+    small = Endpoint("small", FakeLLM(), outstanding=1)
+    assert make_pool(big, small, policy="least_outstanding").acquire() is big
+
+
+def test_release_updates_latency_ewma():
+    endpoint = Endpoint("a", FakeLLM())
+    pool = make_pool(endpoint)
+
+    pool.release(pool.acquire(), 1.0)
+    pool.release(pool.acquire(), 2.0)
+
+    assert endpoint.latency_ewma == pytest.approx(1.0 + endpoint_pool.LLM_LATENCY_ALPHA * 1.0)
+    assert endpoint.outstanding == 0
+
+
+def test_breaker_opens_after_consecutive_failures():
+    endpoint = Endpoint("a", FakeLLM(fail=True))
+    pool = make_pool(endpoint)
+
+    for attempt in range(endpoint_pool.LLM_BREAKER_FAILURES):
+        assert endpoint.state == CLOSED
+        with pytest.raises(ConnectionError):
+            pool.call(lambda llm: llm.invoke("hi"))
+
+    assert endpoint.state == OPEN
+    assert endpoint.consecutive_failures == endpoint_pool.LLM_BREAKER_FAILURES
+
+
+def test_success_resets_consecutive_failures():
+    endpoint = Endpoint("a", FakeLLM())
+    pool = make_pool(endpoint)
+
+    for _ in range(endpoint_pool.LLM_BREAKER_FAILURES - 1):
+        pool.release(pool.acquire(), 0.1, ConnectionError("down"))
+    pool.release(pool.acquire(), 0.1)
+    pool.release(pool.acquire(), 0.1, ConnectionError("down"))
+
+    assert endpoint.state == CLOSED
+
+
+def test_open_endpoint_is_skipped_until_cooldown():
+    ejected = Endpoint("ejected", FakeLLM(), state=OPEN, open_until=float("inf"))
+    healthy = Endpoint("healthy", FakeLLM(), latency_ewma=10.0)
+
+    assert make_pool(ejected, healthy).acquire() is healthy
+
+
+def test_half_open_probe_readmits_on_success():
+    ejected = Endpoint("ejected", FakeLLM(), state=OPEN, open_until=0.0)
+    healthy = Endpoint("healthy", FakeLLM(), latency_ewma=10.0)
+    pool = make_pool(ejected, healthy)
+
+    probe = pool.acquire()
+    assert probe is ejected and ejected.state == HALF_OPEN and ejected.probing
+    # Only one probe at a time
+    assert pool.acquire() is healthy
+
+    pool.release(probe, 0.2)
+
+    assert ejected.state == CLOSED
+    assert not ejected.probing
+    assert ejected.consecutive_failures == 0
+
+
+def test_half_open_probe_failure_ejects_again():
+    ejected = Endpoint("ejected", FakeLLM(), state=OPEN, open_until=0.0, consecutive_failures=3)
+    pool = make_pool(ejected, Endpoint("healthy", FakeLLM(), latency_ewma=10.0))
+
+    probe = pool.acquire()
+    pool.release(probe, 0.2, ConnectionError("still down"))
+
+    assert ejected.state == OPEN
+    assert ejected.open_until > 0.0
+
+
+def test_all_ejected_uses_longest_ejected():
+    older = Endpoint("older", FakeLLM(), state=OPEN, open_until=1e12)
+    newer = Endpoint("newer", FakeLLM(), state=OPEN, open_until=2e12)
+
+    assert make_pool(older, newer).acquire() is older
+
+
+def test_call_fails_over_to_another_endpoint():
+    down = Endpoint("down", FakeLLM(fail=True))
+    up = Endpoint("up", FakeLLM(text="answer"), latency_ewma=10.0)
+    pool = make_pool(down, up)
+
+    assert pool.call(lambda llm: llm.invoke("hi")) == "answer"
+    assert down.failures == 1 and up.requests == 1
+
+
+def test_stream_fails_over_before_first_chunk():
+    down = Endpoint("down", FakeLLM(fail=True))
+    up = Endpoint("up", FakeLLM(text="hello there"), latency_ewma=10.0)
+    pool = make_pool(down, up)
+
+    chunks = list(pool.stream(lambda llm: llm.stream("hi")))
+
+    assert "".join(chunks) == "hello there "
+    assert down.failures == 1
+    assert up.outstanding == 0 and up.latency_ewma is not None
+
+
+def test_stream_does_not_fail_over_after_first_chunk():
+    flaky = Endpoint("flaky", FakeLLM(text="hello there", fail=True, fail_after=1))
+    up = Endpoint("up", FakeLLM(), latency_ewma=10.0)
+    pool = make_pool(flaky, up)
+
+    chunks = []
+    with pytest.raises(ConnectionError):
+        for chunk in pool.stream(lambda llm: llm.stream("hi")):
+            chunks.append(chunk)
+
+    assert chunks == ["hello "]
+    assert up.llm.calls == 0
+    assert flaky.outstanding == 0
+
+
+def test_pooled_llm_routes_invoke_and_stream():
+    down = Endpoint("down", FakeLLM(fail=True))
+    up = Endpoint("up", FakeLLM(text="hello there"), latency_ewma=10.0)
+    llm = PooledLLM(pool=make_pool(down, up))
+
+    assert llm.invoke("hi") == "hello there"
+    assert "".join(llm.stream("hi")) == "hello there "
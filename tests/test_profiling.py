@@ -0,0 +1,157 @@
+import cProfile
+import os
+import threading
+
+import pytest
+
+from app.utils import profiling, security
+
+TOKEN = "s3cret"
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setattr(security, "ADMIN_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0.0)
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    sum(range(100))
+    profiler.disable()
+    profile = profiling.RequestProfile()
+    profile.add(profiler)
+    return profile
+
+
+def _work_on_search_thread():
+    return "searched"
+
+
+def test_should_profile_is_disabled_without_admin_token(monkeypatch):
+    monkeypatch.setattr(security, "ADMIN_TOKEN", None)
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+
+    assert not profiling.should_profile({"X-Profile": "1", "X-Admin-Token": TOKEN})
+    assert not profiling.should_profile({})
+
+
+def test_should_profile_rejects_bad_token(admin_token):
+    assert not profiling.should_profile({"X-Profile": "1", "X-Admin-Token": "wrong"})
+    assert not profiling.should_profile({"X-Profile": "1"})
+
+
+def test_should_profile_accepts_header_with_good_token(admin_token):
+    assert profiling.should_profile({"X-Profile": "1", "X-Admin-Token": TOKEN})
+    # The token alone does not opt a request in
+    assert not profiling.should_profile({"X-Admin-Token": TOKEN})
+
+
+def test_should_profile_samples_at_configured_rate(admin_token, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0.25)
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.1)
+    assert profiling.should_profile({})
+
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.5)
+    assert not profiling.should_profile({})
+
+
+def test_run_profiled_returns_result_and_profile():
+    result, profile = profiling.run_profiled(lambda x: x * 2, 21)
+
+    assert result == 42
+    assert isinstance(profile, profiling.RequestProfile)
+    assert len(profile.profilers) == 1
+
+
+def test_run_profiled_includes_threads_work_is_handed_to():
+    from app.utils.tracing import propagate
+
+    def handle_request():
+        results = []
+        task = propagate(_work_on_search_thread)
+        thread = threading.Thread(target=lambda: results.append(task()))
+        thread.start()
+        thread.join()
+        return results[0]
+
+    result, profile = profiling.run_profiled(handle_request)
+
+    assert result == "searched"
+    assert len(profile.profilers) == 2
+    functions = {name for _, _, name in profile.stats().stats}
+    assert "_work_on_search_thread" in functions
+
+
+def test_profile_thread_without_profiled_request():
+    assert profiling.profile_thread(lambda: "plain") == "plain"
+
+
+def test_run_profiled_runs_unprofiled_while_busy():
+    with profiling._profiler_lock:
+        result, profile = profiling.run_profiled(lambda: "done")
+
+    assert result == "done"
+    assert profile is None
+
+
+def test_save_and_list_profiles(profile_dir):
+    name = profiling.save_profile(_profile(), "session/../42")
+
+    assert name.endswith("_session42.prof")
+    profiles = profiling.list_profiles()
+    assert [entry["name"] for entry in profiles] == [name]
+    assert profiles[0]["session_id"] == "session42"
+    assert profiles[0]["size_bytes"] > 0
+    assert profiling.get_profile_path(name) == os.path.join(str(profile_dir), name)
+
+
+def test_save_profile_prunes_oldest(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MAX_FILES", 2)
+    names = []
+    for i in range(3):
+        names.append(profiling.save_profile(_profile(), f"s{i}"))
+        os.utime(profile_dir / names[-1], (1000 + i, 1000 + i))
+
+    remaining = {entry["name"] for entry in profiling.list_profiles()}
+    assert len(remaining) == 2
+    assert names[0] not in remaining
+
+
+def test_list_profiles_ignores_other_files(profile_dir):
+    (profile_dir / "notes.txt").write_text("not a profile")
+
+    assert profiling.list_profiles() == []
+
+
+def test_list_profiles_without_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "missing"))
+
+    assert profiling.list_profiles() == []
+
+
+@pytest.mark.parametrize("name", [
+    "../secret.prof",
+    "..%2Fsecret.prof",
+    "/etc/passwd",
+    "sub/dir.prof",
+    "profile.txt",
+    "",
+])
+def test_get_profile_path_rejects_traversal_and_invalid_names(profile_dir, name):
+    (profile_dir.parent / "secret.prof").write_bytes(b"")
+
+    assert profiling.get_profile_path(name) is None
+
+
+def test_get_profile_path_missing_file(profile_dir):
+    assert profiling.get_profile_path("20240101T000000000000_abc.prof") is None
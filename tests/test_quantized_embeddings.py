@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch", reason="needs torch")
+pytest.importorskip("sentence_transformers", reason="needs sentence-transformers")
+
+from app.db.embeddings import create_base_embedding_model
+
+MIN_COSINE = 0.99
+
+TEXTS = [
+    "@AirlineSupport my flight was cancelled and nobody at the gate can help",
+    "How do I change the name on my booking?",
+    "my package says delivered but it's not here 😡",
+    "Is there wifi on the 7am train to Boston?",
+    "I was charged twice for the same order, please refund",
+    "can't log in to the app after the update, keeps crashing",
+    "thanks for sorting out my seat so quickly!",
+    "Where can I find my boarding pass",
+]
+
+
+@pytest.fixture(scope="module")
+def backends():
+    try:
+        return create_base_embedding_model("default"), create_base_embedding_model("quantized")
+    except Exception as e:
+        pytest.skip(f"embedding model unavailable: {e}")
+
+
+def _normalized(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_quantized_documents_match_float32(backends):
+    reference, quantized = backends
+
+    cosines = (_normalized(reference.embed_documents(TEXTS)) * _normalized(quantized.embed_documents(TEXTS))).sum(axis=1)
+
+    assert cosines.min() >= MIN_COSINE
+
+
+def test_quantized_query_matches_float32(backends):
+    reference, quantized = backends
+
+    cosine = (_normalized([reference.embed_query(TEXTS[0])]) * _normalized([quantized.embed_query(TEXTS[0])])).sum()
+
+    assert cosine >= MIN_COSINE
@@ -0,0 +1,44 @@
+from app.core.response_cache import ResponseCache
+
+
+def test_answers_are_cached_by_normalized_query():
+    cache = ResponseCache(size=10, ttl=60, enabled=True)
+
+    cache.put("@AirlineSupport My flight was cancelled", {"response": "Sorry"})
+
+    assert cache.get("my flight was cancelled") == {"response": "Sorry"}
+    assert cache.contains("my flight was cancelled")
+
+
+def test_scope_change_hides_old_answers():
+    index_version = ["v0001"]
+    cache = ResponseCache(size=10, ttl=60, enabled=True, scope=lambda: index_version[0])
+    cache.put("where is my bag", {"response": "Old index"})
+
+    # Another worker swapped in a new index version
+    index_version[0] = "v0002"
+    assert cache.get("where is my bag") is None
+
+    cache.put("where is my bag", {"response": "New index"})
+    assert cache.get("where is my bag") == {"response": "New index"}
+
+
+def test_lru_evicts_oldest_and_ttl_expires():
+    cache = ResponseCache(size=2, ttl=60, enabled=True)
+    for query in ("one", "two", "three"):
+        cache.put(query, {"response": query})
+
+    assert cache.get("one") is None
+    assert len(cache) == 2
+
+    expired = ResponseCache(size=2, ttl=-1, enabled=True)
+    expired.put("one", {"response": "one"})
+    assert expired.get("one") is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResponseCache(size=10, ttl=60, enabled=False)
+    cache.put("hello", {"response": "hi"})
+
+    assert cache.get("hello") is None
+    assert not cache.contains("hello")
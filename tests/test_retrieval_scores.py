@@ -0,0 +1,64 @@
+import pytest
+
+from app.core.context_selection import select_context
+from app.core.fast_path import find_fast_path_answer
+from app.db.doc_table import Hit, doc_table
+
+
+@pytest.fixture
+def docs():
+    return {
+        "bag": doc_table.intern("where is my bag", {"answer": "Please DM us your booking reference."}),
+        "refund": doc_table.intern("how do I get a refund", {"answer": "Refunds are processed in 7 days."}),
+        "cancel": doc_table.intern("cancel my flight", {"answer": "You can cancel in the app."}),
+    }
+
+
+def test_lexical_only_hits_are_not_pruned_by_distance(docs):
+    hits = [
+        Hit(docs["bag"], 0.1, 0.033),
+        Hit(docs["refund"], None, 0.032),
+        Hit(docs["cancel"], 1.5, 0.016),
+    ]
+
+    selection = select_context(hits)
+
+    assert [hit.doc_id for hit in selection.documents] == [docs["bag"], docs["refund"]]
+    assert selection.dropped_by_distance == 1
+
+
+def test_score_gap_is_measured_from_best_real_distance(docs):
+    hits = [
+        Hit(docs["refund"], None, 0.033),
+        Hit(docs["bag"], 0.2, 0.032),
+        Hit(docs["cancel"], 0.9, 0.016),
+    ]
+
+    selection = select_context(hits, min_docs=0, max_score_gap=0.35)
+
+    assert [hit.doc_id for hit in selection.documents] == [docs["refund"], docs["bag"]]
+
+
+def test_lexical_mode_hits_are_selected_by_rank(docs):
+    hits = [Hit(doc_id, None, score) for doc_id, score in zip(docs.values(), (9.0, 4.0, 1.0))]
+
+    selection = select_context(hits, max_docs=2)
+
+    assert [hit.doc_id for hit in selection.documents] == list(docs.values())[:2]
+
+
+def test_fast_path_ignores_hits_without_distance(docs):
+    assert find_fast_path_answer([Hit(docs["bag"], None, 12.0)], max_distance=0.15) is None
+
+    doc_id, distance, answer = find_fast_path_answer(
+        [Hit(docs["refund"], None, 12.0), Hit(docs["bag"], 0.05, 0.01)], max_distance=0.15
+    )
+    assert (doc_id, distance) == (docs["bag"], 0.05)
+    assert answer == "Please DM us your booking reference."
+
+
+def test_score_records_keep_distance_and_relevance_apart(docs):
+    records = doc_table.score_records([Hit(docs["bag"], 0.1, 0.033), Hit(docs["refund"], None, 7.5)])
+
+    assert records[0]["score"] == 0.1 and records[0]["relevance"] == 0.033
+    assert records[1]["score"] is None and records[1]["relevance"] == 7.5
@@ -0,0 +1,80 @@
+import pytest
+
+from app.db.interaction_store import InteractionStore
+
+session_manager = pytest.importorskip("app.core.session_manager", reason="needs the application's storage dependencies")
+
+
+class FakeLogger:
+    def log_interaction(self, *args, **kwargs):
+        pass
+
+    def log_error(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture
+def store(tmp_path):
+    return InteractionStore(db_path=str(tmp_path / "interactions.db"), flush_interval=0.01)
+
+
+def make_manager(store, tmp_path, name="worker"):
+    """Build a SessionManager around a store without touching the default files."""
+    manager = session_manager.SessionManager.__new__(session_manager.SessionManager)
+    manager.sessions = {}
+    manager.csv_file = str(tmp_path / f"{name}.csv")
+    manager._initialize_csv()
+    manager.gcs_manager = None
+    manager.logger = FakeLogger()
+    manager.interaction_store = store
+    return manager
+
+
+def test_unknown_session_is_not_cached(store, tmp_path):
+    manager = make_manager(store, tmp_path)
+
+    assert manager.get_history("s1") == []
+    assert "s1" not in manager.sessions
+
+    # A turn stored later (e.g. by another worker) is found on the next lookup
+    store.add("s1", "hello", "hi there", "2026-01-01T10:00:00")
+    store.flush()
+    assert [turn["user"] for turn in manager.get_history("s1")] == ["hello"]
+
+
+def test_turns_from_another_worker_are_reloaded(store, tmp_path):
+    first = make_manager(store, tmp_path, "first")
+    second = make_manager(store, tmp_path, "second")
+
+    first.add_interaction("s1", "my flight was cancelled", "Sorry to hear that.")
+    store.flush()
+    second.add_interaction("s1", "can I get a refund?", "Yes, DM us.")
+    store.flush()
+
+    assert [turn["user"] for turn in first.get_history("s1")] == ["my flight was cancelled", "can I get a refund?"]
+
+
+def test_own_unflushed_turns_are_kept(store, tmp_path):
+    manager = make_manager(store, tmp_path)
+    store.add("s1", "older", "reply", "2000-01-01T00:00:00")
+    store.flush()
+
+    manager.add_interaction("s1", "newest", "reply")
+
+    assert [turn["user"] for turn in manager.get_history("s1")][-1] == "newest"
+
+
+def test_recording_a_turn_does_not_query_the_store(store, tmp_path, monkeypatch):
+    manager = make_manager(store, tmp_path)
+    manager.add_interaction("s1", "hello", "hi there")
+    store.flush()
+
+    queries = []
+    monkeypatch.setattr(store, "last_timestamp", lambda session_id: queries.append(session_id))
+    monkeypatch.setattr(store, "load_recent", lambda session_id, limit: queries.append(session_id))
+
+    manager.add_interaction("s1", "and my bags?", "They are on the way.")
+
+    assert queries == []
+    assert manager.get_last_turn("s1")["user"] == "and my bags?"
+    assert manager.get_last_turn("s2") is None
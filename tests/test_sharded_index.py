@@ -0,0 +1,38 @@
+import threading
+
+import numpy as np
+
+from app.db import sharded_index
+from app.db.sharded_index import ShardedIndex
+
+
+class FakeShard:
+    def __init__(self, name):
+        self.name = name
+
+    def query(self, query_embeddings, n_results, include):
+        rows = len(query_embeddings)
+        return {
+            "documents": [[f"{self.name} doc"]] * rows,
+            "metadatas": [[{"answer": self.name}]] * rows,
+            "distances": [[0.5]] * rows,
+        }
+
+
+def make_index(tmp_path):
+    """Build a two-shard index without a Chroma client."""
+    index = ShardedIndex(None, str(tmp_path), "tweets")
+    index.centroids = np.eye(2, dtype=np.float32)
+    index.sizes = [1, 1]
+    index.shards = [FakeShard("first"), FakeShard("second")]
+    return index
+
+
+def test_index_versions_share_one_search_pool(tmp_path):
+    # Each hot-swap loads a new index; none of them may start threads of its own
+    for _ in range(5):
+        hits = make_index(tmp_path).search_many([[1.0, 0.0]], k=2, n_probe=2)
+        assert len(hits[0]) == 2
+
+    search_threads = [t for t in threading.enumerate() if t.name.startswith("shard-search")]
+    assert len(search_threads) <= sharded_index.SHARD_SEARCH_THREADS
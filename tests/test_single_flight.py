@@ -0,0 +1,31 @@
+import threading
+import time
+
+from app.utils.single_flight import SingleFlight
+
+
+def test_single_flight_shares_result_and_exception():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return "done"
+
+    outcomes = []
+    leader = threading.Thread(target=lambda: outcomes.append(flight.do("key", work)))
+    leader.start()
+    started.wait(timeout=5)
+    followers = [threading.Thread(target=lambda: outcomes.append(flight.do("key", work))) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(timeout=5)
+
+    assert len(calls) == 1
+    assert sorted(outcomes) == [("done", False)] + [("done", True)] * 4
@@ -0,0 +1,58 @@
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.utils.tracing import TraceWriter, propagate
+
+PROCESSES = 4
+TRACES_PER_PROCESS = 200
+
+
+def _write_traces(path, worker):
+    writer = TraceWriter(path=path, max_bytes=4096, backup_count=1000, flush_size=5, flush_interval=0.01)
+    for i in range(TRACES_PER_PROCESS):
+        writer.write({"worker": worker, "i": i, "padding": "x" * 50})
+    writer.flush_on_exit()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_processes_share_trace_file_without_losing_traces(tmp_path):
+    path = str(tmp_path / "requests.jsonl")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_write_traces, args=(path, worker)) for worker in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    files = [name for name in os.listdir(tmp_path) if name.startswith("requests.jsonl")]
+    assert len(files) > 1  # rotated
+    seen = set()
+    for name in files:
+        assert os.path.getsize(tmp_path / name) <= 4096
+        with open(tmp_path / name, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                seen.add((record["worker"], record["i"]))
+
+    assert len(seen) == PROCESSES * TRACES_PER_PROCESS
+
+
+def test_flush_on_exit_without_traces_returns():
+    TraceWriter(path="unused.jsonl").flush_on_exit()
+
+
+def test_propagated_function_can_run_on_several_threads_at_once():
+    started = threading.Barrier(3, timeout=5)
+
+    def wait_for_others(item):
+        started.wait()
+        return item
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        assert list(executor.map(propagate(wait_for_others), range(3))) == [0, 1, 2]